@@ -3,7 +3,8 @@ from django.contrib.auth.models import AbstractUser
 from django.db.models import UniqueConstraint
 from django.db.models.functions import Lower
 
-from apps.accounts.utils.encryption import encrypt_value, decrypt_value
+from apps.accounts.utils.credentials import get_credentials, invalidate_credentials
+from apps.accounts.utils.encryption import encrypt_value
 
 
 class User(AbstractUser):
@@ -24,10 +25,12 @@ class UserKey(models.Model):
     _api_key = models.CharField(max_length=255, db_column="api_key")
     _api_secret = models.CharField(max_length=255, db_column="api_secret")
     is_active = models.BooleanField(default=True)
+    # Bumped on every save so cached credentials/clients can tell rows apart
+    version = models.PositiveIntegerField(default=1)
 
     @property
     def api_key(self):
-        return decrypt_value(self._api_key)
+        return get_credentials(self)[0]
 
     @api_key.setter
     def api_key(self, value):
@@ -35,7 +38,7 @@ class UserKey(models.Model):
 
     @property
     def api_secret(self):
-        return decrypt_value(self._api_secret)
+        return get_credentials(self)[1]
 
     @api_secret.setter
     def api_secret(self, value):
@@ -46,7 +49,28 @@ class UserKey(models.Model):
             self._api_key = encrypt_value(self._api_key)
         if self._api_secret and not self._api_secret.startswith("gAAAA"):
             self._api_secret = encrypt_value(self._api_secret)
+        if self.pk is not None:
+            self.version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
         super().save(*args, **kwargs)
+        self._invalidate_cached(self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        self._invalidate_cached(pk)
+        return result
+
+    @staticmethod
+    def _invalidate_cached(pk):
+        # Imported here: apps.trade depends on this module
+        from apps.trade.utils.common import invalidate_exchange_clients
+
+        invalidate_credentials(pk)
+        # Other processes notice the new ciphertext on their next pool lookup
+        invalidate_exchange_clients(pk)
 
     class Meta:
         db_table = "user_keys"
@@ -1,3 +1,321 @@
-from django.test import TestCase
+import json
+import random
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.trade.models import ArchivedOrderFile, DailyPnl, FutureOrder, FutureTakeProfit, SpotOrder
+from apps.trade.utils.archive import archive_horizon, archive_orders
+
+SYMBOLS = [f"C{i:02d}/USDT" for i in range(40)]
+
+
+def seed_orders(user, count, days=365):
+    """Bulk-insert ``count`` spot and futures orders spread over ``days`` and rebuild the rollup."""
+    rng = random.Random(7)
+    now = timezone.now()
+    statuses = ["CLOSED", "CLOSED", "CLOSED", "POSITION", "CANCELLED"]
+    spot, futures = [], []
+    for i in range(count):
+        closed_at = now - timedelta(days=rng.randint(0, days), hours=rng.randint(0, 23))
+        status = rng.choice(statuses)
+        pnl = Decimal(rng.randint(-5000, 5000)) / 100 if status == "CLOSED" else 0
+        common = {
+            "symbol": rng.choice(SYMBOLS),
+            "direction": "LONG",
+            "status": status,
+            "entry_price": Decimal("100"),
+            "order_quantity": Decimal("1.5"),
+            "pnl": pnl,
+            "user": user,
+            "closed_at": closed_at if status == "CLOSED" else None,
+        }
+        spot.append(SpotOrder(order_id=f"s{i}", total_cost=Decimal("150"), **common))
+        futures.append(FutureOrder(order_id=f"f{i}", stop_loss_order_id=f"sl{i}", **common))
+    SpotOrder.objects.bulk_create(spot, batch_size=1000)
+    FutureOrder.objects.bulk_create(futures, batch_size=1000)
+    call_command("backfill_daily_pnl", stdout=StringIO())
+
+
+class HomeViewTests(TestCase):
+    # session + user lookups, then per-symbol KPIs, open counts, 30-day series
+    HOME_QUERIES = 5
+    HOME_LATENCY_BUDGET = 0.5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="trader", email="trader@example.com")
+        seed_orders(cls.user, 5000)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_home_query_count_and_latency(self):
+        self.client.get(reverse("accounts:home"))  # warm up templates and URL resolver
+        started = time.perf_counter()
+        with self.assertNumQueries(self.HOME_QUERIES):
+            response = self.client.get(reverse("accounts:home"))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, self.HOME_LATENCY_BUDGET)
+
+    def test_home_matches_order_tables(self):
+        response = self.client.get(reverse("accounts:home"))
+        ctx = response.context
+        for model, prefix in ((SpotOrder, "spot"), (FutureOrder, "fut")):
+            closed = model.objects.filter(user=self.user, status="CLOSED")
+            pnl = sum(o.pnl for o in closed)
+            wins = sum(1 for o in closed if o.pnl > 0)
+            self.assertAlmostEqual(ctx[f"{prefix}_pnl"], float(pnl), places=4)
+            self.assertEqual(ctx[f"{prefix}_win_rate"], round(wins / len(closed) * 100, 2))
+            self.assertEqual(
+                ctx[f"{prefix}_open"],
+                model.objects.filter(user=self.user, status="POSITION").count(),
+            )
+        self.assertEqual(ctx["spot_volume"], 150.0 * 5000)
+        self.assertEqual(ctx["fut_volume"], 150.0 * 5000)
+        self.assertEqual(len(ctx["spot_by_symbol"]), 8)
+
+    def test_rollup_follows_order_close(self):
+        order = SpotOrder.objects.filter(user=self.user, status="POSITION").first()
+        order.status = SpotOrder.TradeStatus.CLOSED
+        order.pnl = Decimal("12.5")
+        order.closed_at = timezone.now()
+        order.save()
+        row = DailyPnl.objects.get(
+            user=self.user, market="spot", symbol=order.symbol, day=timezone.localdate()
+        )
+        before = row.realized_pnl
+        order.pnl = Decimal("2.5")
+        order.save()
+        row.refresh_from_db()
+        self.assertEqual(row.realized_pnl, before - Decimal("10"))
+
+
+class HistoryViewTests(TestCase):
+    # session + user lookups, merged page, TP legs
+    HISTORY_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="trader", email="trader@example.com")
+        seed_orders(cls.user, 300)
+        legs = [
+            FutureTakeProfit(order=order, price=Decimal("110"), percent=50, status=status)
+            for order in FutureOrder.objects.filter(user=cls.user)
+            for status in ("CLOSED", "POSITION")
+        ]
+        FutureTakeProfit.objects.bulk_create(legs)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_history_query_count_is_constant(self):
+        with self.assertNumQueries(self.HISTORY_QUERIES):
+            response = self.client.get(reverse("accounts:history"))
+        self.assertEqual(response.status_code, 200)
+        futures = [r for r in response.context["records"] if r["market"] == "Futures"]
+        self.assertTrue(futures)
+        for row in futures:
+            self.assertEqual((row["tp_closed"], row["tp_count"]), (1, 2))
+            self.assertEqual(len(json.loads(row["tps_json"])), 2)
+
+    def test_history_spot_only_skips_leg_query(self):
+        with self.assertNumQueries(self.HISTORY_QUERIES - 1):
+            response = self.client.get(reverse("accounts:history"), {"market": "spot"})
+        self.assertEqual({r["market"] for r in response.context["records"]}, {"Spot"})
+
+    @override_settings(HISTORY_PAGE_SIZE=45)
+    def test_history_cursor_walks_every_order_once(self):
+        # Same timestamp on both markets to exercise the (created_at, market, id) tie-break
+        stamp = timezone.now() - timedelta(days=3)
+        SpotOrder.objects.filter(user=self.user, id__lte=40).update(created_at=stamp)
+        FutureOrder.objects.filter(user=self.user, id__lte=40).update(created_at=stamp)
+
+        seen, params = [], {"market": "both"}
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("accounts:history"), params)
+            self.assertLessEqual(len(queries), self.HISTORY_QUERIES)
+            records = response.context["records"]
+            self.assertLessEqual(len(records), 45)
+            seen += [(r["created_at"], r["market"], r["id"]) for r in records]
+            if not response.context["next_query"]:
+                break
+            params = QueryDict(response.context["next_query"])
+
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), SpotOrder.objects.count() + FutureOrder.objects.count())
+
+
+class ExportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="trader", email="trader@example.com")
+        seed_orders(cls.user, 50)
+        for order in FutureOrder.objects.filter(user=cls.user)[:10]:
+            FutureTakeProfit.objects.create(order=order, price=Decimal("110"), percent=100, status="CLOSED")
+
+    async def test_export_streams_orders_with_their_legs(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse("accounts:history_export"), {"market": "futures", "format": "ndjson"}
+        )
+        self.assertTrue(response.streaming)
+        lines = [json.loads(line) async for chunk in response.streaming_content for line in chunk.splitlines()]
+        orders = [r for r in lines if r["market"] == "futures"]
+        legs = [r for r in lines if r["market"] == "futures_tp"]
+        self.assertEqual(len(orders), 50)
+        self.assertEqual(len(legs), 10)
+        for i, row in enumerate(lines):
+            if row["market"] == "futures_tp":
+                self.assertEqual(lines[i - 1]["id"], row["parent_id"])
+
+
+@override_settings(STATS_CACHE_TTL=3600)
+class StatsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="trader", email="trader@example.com")
+        seed_orders(cls.user, 200, days=20)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_repeat_views_hit_cache_until_an_order_changes(self):
+        url = reverse("accounts:stats")
+        first = self.client.get(url, {"market": "spot"})
+        # session + user lookups only
+        with self.assertNumQueries(2):
+            second = self.client.get(url, {"market": "spot"})
+        self.assertEqual(first.context["spot_series_json"], second.context["spot_series_json"])
+
+        order = SpotOrder.objects.filter(user=self.user, status="POSITION").first()
+        order.status = SpotOrder.TradeStatus.CLOSED
+        order.pnl = Decimal("1000")
+        order.closed_at = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+        third = self.client.get(url, {"market": "spot"})
+        before = json.loads(second.context["cum_spot_json"])
+        after = json.loads(third.context["cum_spot_json"])
+        self.assertAlmostEqual(after[-1] - before[-1], 1000, places=4)
+
+    @override_settings(STATS_CACHE_TTL=0)
+    def test_no_shared_cache_means_no_caching(self):
+        url = reverse("accounts:stats")
+        self.client.get(url, {"market": "spot"})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {"market": "spot"})
+        self.assertGreater(len(queries), 2)
+
+
+class ArchiveTests(TestCase):
+    """Closed orders moved to Parquet still show up in date-filtered history and exports."""
+
+    RANGE = {"market": "both", "from": "2000-01-01"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="trader", email="trader@example.com")
+        seed_orders(cls.user, 150, days=700)
+        for model in (SpotOrder, FutureOrder):
+            model.objects.filter(closed_at__isnull=False).update(created_at=F("closed_at") - timedelta(hours=1))
+        FutureTakeProfit.objects.bulk_create(
+            FutureTakeProfit(order=order, price=Decimal("110"), percent=50, status="CLOSED")
+            # Oldest first, so the legs go to the archive with their orders
+            for order in FutureOrder.objects.filter(user=cls.user).order_by("created_at")[:60]
+        )
+        call_command("backfill_daily_pnl", stdout=StringIO())
+
+    def setUp(self):
+        storage = tempfile.TemporaryDirectory()
+        self.addCleanup(storage.cleanup)
+        overrides = override_settings(
+            STORAGES={
+                "default": {
+                    "BACKEND": "django.core.files.storage.FileSystemStorage",
+                    "OPTIONS": {"location": storage.name},
+                },
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+            HISTORY_PAGE_SIZE=40,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_login(self.user)
+
+    def walk_history(self, params):
+        rows = []
+        while True:
+            response = self.client.get(reverse("accounts:history"), params)
+            rows += [
+                (r["created_at"], r["market"], r["id"], r["status"], r.get("tps_json"))
+                for r in response.context["records"]
+            ]
+            if not response.context["next_query"]:
+                return rows
+            params = QueryDict(response.context["next_query"])
+
+    def export(self, params):
+        with tempfile.NamedTemporaryFile("r", suffix=".ndjson") as out:
+            call_command(
+                "export_trades", self.user.username, "--format", "ndjson",
+                "--from", params["from"], "--output", out.name, stderr=StringIO(),
+            )
+            return [json.loads(line) for line in out]
+
+    def rollup(self):
+        columns = (
+            "user", "market", "symbol", "day", "realized_pnl", "wins", "closed_count", "opened_count", "volume",
+        )
+        return list(DailyPnl.objects.order_by("market", "symbol", "day").values_list(*columns))
+
+    def test_archived_orders_read_back_transparently(self):
+        history = self.walk_history(self.RANGE)
+        exported = self.export(self.RANGE)
+        rollup = self.rollup()
+        hot_before = len(self.walk_history({"market": "both"}))
+
+        archived = archive_orders()
+        self.assertGreater(archived["spot"], 0)
+        self.assertGreater(archived["futures"], 0)
+        old = {"created_at__lt": archive_horizon(), "status__in": ["CLOSED", "CANCELLED"]}
+        self.assertFalse(SpotOrder.objects.filter(**old).exists())
+        self.assertFalse(FutureOrder.objects.filter(**old).exists())
+        self.assertTrue(ArchivedOrderFile.objects.filter(user=self.user).exists())
+        self.assertLess(FutureTakeProfit.objects.count(), 60)
+
+        self.assertEqual(self.walk_history(self.RANGE), history)
+        after = self.export(self.RANGE)
+        key = lambda row: (row["market"], int(row["id"]))
+        self.assertEqual(sorted(after, key=key), sorted(exported, key=key))
+        for i, row in enumerate(after):
+            if row["market"] == "futures_tp":
+                self.assertEqual(after[i - 1]["id"], row["parent_id"])
+
+        # Without a date filter only the hot tables are read
+        self.assertEqual(
+            len(self.walk_history({"market": "both"})),
+            hot_before - archived["spot"] - archived["futures"],
+        )
+
+        call_command("backfill_daily_pnl", stdout=StringIO())
+        self.assertEqual(self.rollup(), rollup)
+        self.assertEqual(archive_orders(), {"spot": 0, "futures": 0})
@@ -0,0 +1,42 @@
+"""Per-process cache of decrypted UserKey credentials.
+
+Entries live only in process memory, keyed by UserKey id and checked
+against the row ``version`` and ciphertext, so a saved or re-keyed row is
+never served stale. ``UserKey.save()`` and ``delete()`` drop the entry
+eagerly and ``CREDENTIAL_CACHE_TTL`` bounds how long plaintext stays around.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from apps.accounts.utils.encryption import decrypt_value
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def get_credentials(user_key) -> tuple:
+    """Return ``(api_key, api_secret)``, decrypting at most once per TTL per row version."""
+    if user_key.pk is None:
+        return decrypt_value(user_key._api_key), decrypt_value(user_key._api_secret)
+    stamp = (user_key.version, user_key._api_key, user_key._api_secret)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_key.pk)
+    if entry is not None and entry[0] == stamp and entry[2] > now:
+        return entry[1]
+    credentials = (decrypt_value(user_key._api_key), decrypt_value(user_key._api_secret))
+    with _lock:
+        _cache[user_key.pk] = (stamp, credentials, now + settings.CREDENTIAL_CACHE_TTL)
+    return credentials
+
+
+def invalidate_credentials(pk=None):
+    """Forget one UserKey's cached credentials, or all of them."""
+    with _lock:
+        if pk is None:
+            _cache.clear()
+        else:
+            _cache.pop(pk, None)
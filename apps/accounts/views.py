@@ -1,121 +1,114 @@
 from django.shortcuts import render, redirect
+from django.http import StreamingHttpResponse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
 from .forms import RegistrationForm, LoginForm
+from .models import User
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, Q, F, DecimalField, ExpressionWrapper
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import timedelta, datetime
-from apps.trade.models import SpotOrder, FutureOrder
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from apps.trade.models import SpotOrder, FutureOrder, FutureTakeProfit, DailyPnl
+from apps.trade.utils.export import FORMATS, export_rows, render_rows, stream_async
+from apps.trade.utils.history import archived_history, decode_cursor, filter_history, history_page
+from apps.trade.utils.stats_cache import cached_stats
 import json
 
 
-@login_required
-def home(request):
-    user = request.user
+SPOT, FUTURES = DailyPnl.Market.SPOT, DailyPnl.Market.FUTURES
 
-    # Core aggregates
-    spot_closed = SpotOrder.objects.filter(
-        user=user, status=SpotOrder.TradeStatus.CLOSED
-    )
-    fut_closed = FutureOrder.objects.filter(
-        user=user, status=FutureOrder.TradeStatus.CLOSED
-    )
 
-    spot_pnl = spot_closed.aggregate(total=Sum("pnl"))["total"] or 0
-    fut_pnl = fut_closed.aggregate(total=Sum("pnl"))["total"] or 0
-
-    spot_wins = spot_closed.filter(pnl__gt=0).count()
-    spot_total = spot_closed.count()
-    fut_wins = fut_closed.filter(pnl__gt=0).count()
-    fut_total = fut_closed.count()
-    spot_win_rate = round((spot_wins / spot_total) * 100, 2) if spot_total else 0
-    fut_win_rate = round((fut_wins / fut_total) * 100, 2) if fut_total else 0
-
-    # Volume approximations
-    spot_volume = (
-        SpotOrder.objects.filter(user=user).aggregate(total=Sum("total_cost"))["total"]
-        or 0
-    )
-    fut_expr = ExpressionWrapper(
-        F("order_quantity") * F("entry_price"),
-        output_field=DecimalField(max_digits=20, decimal_places=10),
+def _daily_series(rollup):
+    """Chart labels plus spot/futures PnL per close day, in one grouped scan."""
+    daily = (
+        rollup.filter(closed_count__gt=0)
+        .values("day")
+        .annotate(
+            spot=Sum("realized_pnl", filter=Q(market=SPOT)),
+            fut=Sum("realized_pnl", filter=Q(market=FUTURES)),
+        )
+        .order_by("day")
     )
-    fut_volume = (
-        FutureOrder.objects.filter(user=user)
-        .annotate(val=fut_expr)
-        .aggregate(total=Sum("val"))["total"]
-        or 0
+    labels, spot_series, fut_series = [], [], []
+    for row in daily:
+        labels.append(row["day"].strftime("%Y-%m-%d"))
+        spot_series.append(float(row["spot"] or 0))
+        fut_series.append(float(row["fut"] or 0))
+    return labels, spot_series, fut_series
+
+
+def _open_positions(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(user=OuterRef("pk"), status=model.TradeStatus.POSITION)
+            .order_by()
+            .values("user")
+            .annotate(ct=Count("id"))
+            .values("ct")
+        ),
+        0,
     )
 
-    # Open positions count
-    spot_open = SpotOrder.objects.filter(
-        user=user, status=SpotOrder.TradeStatus.POSITION
-    ).count()
-    fut_open = FutureOrder.objects.filter(
-        user=user, status=FutureOrder.TradeStatus.POSITION
-    ).count()
-
-    # PnL over last 30 days (by closed_at date)
-    since = timezone.now() - timedelta(days=30)
-    spot_daily = (
-        spot_closed.filter(closed_at__gte=since)
-        .values("closed_at__date")
-        .annotate(total=Sum("pnl"))
-        .order_by("closed_at__date")
-    )
-    fut_daily = (
-        fut_closed.filter(closed_at__gte=since)
-        .values("closed_at__date")
-        .annotate(total=Sum("pnl"))
-        .order_by("closed_at__date")
-    )
 
-    # Normalize dates and combine series
-    date_set = sorted(
-        {
-            *(d["closed_at__date"] for d in spot_daily),
-            *(d["closed_at__date"] for d in fut_daily),
-        }
-    )
-    labels = [d.strftime("%Y-%m-%d") for d in date_set]
-    spot_map = {
-        d["closed_at__date"].strftime("%Y-%m-%d"): float(d["total"]) for d in spot_daily
-    }
-    fut_map = {
-        d["closed_at__date"].strftime("%Y-%m-%d"): float(d["total"]) for d in fut_daily
+@login_required
+def home(request):
+    user = request.user
+    rollup = DailyPnl.objects.filter(user=user)
+
+    # All KPIs and trades by symbol from one (market, symbol) grouping
+    kpis = {
+        market: {"pnl": 0, "wins": 0, "closed": 0, "volume": 0, "symbols": []}
+        for market in (SPOT, FUTURES)
     }
-    spot_series = [spot_map.get(day, 0) for day in labels]
-    fut_series = [fut_map.get(day, 0) for day in labels]
-
-    # Trades by symbol (top 8)
-    spot_by_symbol = (
-        SpotOrder.objects.filter(user=user)
-        .values("symbol")
-        .annotate(ct=Count("id"))
-        .order_by("-ct")[:8]
+    per_symbol = (
+        rollup.values("market", "symbol")
+        .annotate(
+            pnl=Sum("realized_pnl"),
+            wins=Sum("wins"),
+            closed=Sum("closed_count"),
+            volume=Sum("volume"),
+            ct=Sum("opened_count"),
+        )
+        .order_by("-ct")
     )
-    fut_by_symbol = (
-        FutureOrder.objects.filter(user=user)
-        .values("symbol")
-        .annotate(ct=Count("id"))
-        .order_by("-ct")[:8]
+    for row in per_symbol:
+        totals = kpis[row["market"]]
+        for field in ("pnl", "wins", "closed", "volume"):
+            totals[field] += row[field] or 0
+        totals["symbols"].append({"symbol": row["symbol"], "ct": row["ct"]})
+    spot, fut = kpis[SPOT], kpis[FUTURES]
+
+    spot_win_rate = round((spot["wins"] / spot["closed"]) * 100, 2) if spot["closed"] else 0
+    fut_win_rate = round((fut["wins"] / fut["closed"]) * 100, 2) if fut["closed"] else 0
+
+    # Open positions count, both markets in one round trip
+    open_counts = (
+        User.objects.filter(pk=user.pk)
+        .values(spot_open=_open_positions(SpotOrder), fut_open=_open_positions(FutureOrder))
+        .get()
     )
 
+    # PnL over last 30 days (by close date)
+    since = timezone.localdate() - timedelta(days=30)
+    labels, spot_series, fut_series = _daily_series(rollup.filter(day__gte=since))
+
     context = {
-        "spot_pnl": float(spot_pnl),
-        "fut_pnl": float(fut_pnl),
+        "spot_pnl": float(spot["pnl"]),
+        "fut_pnl": float(fut["pnl"]),
         "spot_win_rate": spot_win_rate,
         "fut_win_rate": fut_win_rate,
-        "spot_volume": float(spot_volume),
-        "fut_volume": float(fut_volume),
-        "spot_open": spot_open,
-        "fut_open": fut_open,
+        "spot_volume": float(spot["volume"]),
+        "fut_volume": float(fut["volume"]),
+        "spot_open": open_counts["spot_open"],
+        "fut_open": open_counts["fut_open"],
         "labels_json": json.dumps(labels),
         "spot_series_json": json.dumps(spot_series),
         "fut_series_json": json.dumps(fut_series),
-        "spot_by_symbol": list(spot_by_symbol),
-        "fut_by_symbol": list(fut_by_symbol),
+        "spot_by_symbol": spot["symbols"][:8],
+        "fut_by_symbol": fut["symbols"][:8],
     }
     return render(request, "dashboard.html", context)
 
@@ -160,55 +153,18 @@ def logout_view(request):
     return redirect("login")
 
 
-@login_required
-def stats_view(request):
-    user = request.user
-    market = request.GET.get("market", "both")  # spot | futures | both
-    symbol = request.GET.get("symbol") or None
-    days = int(request.GET.get("days", 30))
-    since = timezone.now() - timedelta(days=days)
+def _stats_data(user_id, market, symbol, days):
+    since = timezone.localdate() - timedelta(days=days)
 
-    # Select base querysets
-    spot_qs = SpotOrder.objects.filter(
-        user=user, status=SpotOrder.TradeStatus.CLOSED, closed_at__gte=since
-    )
-    fut_qs = FutureOrder.objects.filter(
-        user=user, status=FutureOrder.TradeStatus.CLOSED, closed_at__gte=since
-    )
+    # Closed-trade rows of the daily rollup
+    rollup = DailyPnl.objects.filter(user_id=user_id, day__gte=since, closed_count__gt=0)
     if symbol:
-        spot_qs = spot_qs.filter(symbol=symbol)
-        fut_qs = fut_qs.filter(symbol=symbol)
-    if market == "spot":
-        fut_qs = FutureOrder.objects.none()
-    elif market == "futures":
-        spot_qs = SpotOrder.objects.none()
+        rollup = rollup.filter(symbol=symbol)
+    if market in (SPOT, FUTURES):
+        rollup = rollup.filter(market=market)
 
     # Daily pnl
-    spot_daily = (
-        spot_qs.values("closed_at__date")
-        .annotate(total=Sum("pnl"))
-        .order_by("closed_at__date")
-    )
-    fut_daily = (
-        fut_qs.values("closed_at__date")
-        .annotate(total=Sum("pnl"))
-        .order_by("closed_at__date")
-    )
-    date_set = sorted(
-        {
-            *(d["closed_at__date"] for d in spot_daily),
-            *(d["closed_at__date"] for d in fut_daily),
-        }
-    )
-    labels = [d.strftime("%Y-%m-%d") for d in date_set]
-    spot_map = {
-        d["closed_at__date"].strftime("%Y-%m-%d"): float(d["total"]) for d in spot_daily
-    }
-    fut_map = {
-        d["closed_at__date"].strftime("%Y-%m-%d"): float(d["total"]) for d in fut_daily
-    }
-    spot_series = [spot_map.get(day, 0) for day in labels]
-    fut_series = [fut_map.get(day, 0) for day in labels]
+    labels, spot_series, fut_series = _daily_series(rollup)
 
     # Cumulative pnl
     cum_spot, cum_fut = [], []
@@ -222,18 +178,15 @@ def stats_view(request):
         cum_fut.append(run)
 
     # Performance by symbol
-    spot_by_symbol = (
-        spot_qs.values("symbol")
-        .annotate(pnl=Sum("pnl"), trades=Count("id"))
-        .order_by("-pnl")[:10]
-    )
-    fut_by_symbol = (
-        fut_qs.values("symbol")
-        .annotate(pnl=Sum("pnl"), trades=Count("id"))
-        .order_by("-pnl")[:10]
+    by_symbol = (
+        rollup.values("symbol")
+        .annotate(pnl=Sum("realized_pnl"), trades=Sum("closed_count"))
+        .order_by("-pnl")
     )
+    spot_by_symbol = by_symbol.filter(market=SPOT)[:10]
+    fut_by_symbol = by_symbol.filter(market=FUTURES)[:10]
 
-    context = {
+    return {
         "labels_json": json.dumps(labels),
         "spot_series_json": json.dumps(spot_series),
         "fut_series_json": json.dumps(fut_series),
@@ -241,6 +194,25 @@ def stats_view(request):
         "cum_fut_json": json.dumps(cum_fut),
         "spot_by_symbol": list(spot_by_symbol),
         "fut_by_symbol": list(fut_by_symbol),
+    }
+
+
+@login_required
+def stats_view(request):
+    user = request.user
+    market = request.GET.get("market", "both")  # spot | futures | both
+    symbol = request.GET.get("symbol") or None
+    days = int(request.GET.get("days", 30))
+
+    # Cached per user until one of their orders changes
+    data = cached_stats(
+        user.id,
+        (market, symbol or "", days),
+        lambda: _stats_data(user.id, market, symbol, days),
+    )
+
+    context = {
+        **data,
         "market": market,
         "symbol": symbol or "",
         "days": days,
@@ -256,99 +228,92 @@ def history_view(request):
     symbol = request.GET.get("symbol", "")
     date_from = request.GET.get("from", "")
     date_to = request.GET.get("to", "")
+    cursor = request.GET.get("cursor", "")
+
+    spot_qs, fut_qs = filter_history(user, request.GET)
+    rows, next_cursor = history_page(
+        spot_qs,
+        fut_qs,
+        decode_cursor(cursor),
+        settings.HISTORY_PAGE_SIZE,
+        archived=partial(archived_history, user, request.GET),
+    )
 
-    spot_qs = SpotOrder.objects.filter(user=user)
-    fut_qs = FutureOrder.objects.filter(user=user)
-
-    if market == "spot":
-        fut_qs = FutureOrder.objects.none()
-    elif market == "futures":
-        spot_qs = SpotOrder.objects.none()
-
-    if status_val:
-        spot_qs = spot_qs.filter(status=status_val)
-        fut_qs = fut_qs.filter(status=status_val)
-    if symbol:
-        spot_qs = spot_qs.filter(symbol=symbol)
-        fut_qs = fut_qs.filter(symbol=symbol)
-
-    if date_from:
-        try:
-            df = datetime.fromisoformat(date_from)
-            df = timezone.make_aware(df) if timezone.is_naive(df) else df
-            spot_qs = spot_qs.filter(created_at__gte=df)
-            fut_qs = fut_qs.filter(created_at__gte=df)
-        except Exception:
-            pass
-    if date_to:
-        try:
-            dt = datetime.fromisoformat(date_to)
-            dt = timezone.make_aware(dt) if timezone.is_naive(dt) else dt
-            spot_qs = spot_qs.filter(created_at__lte=dt)
-            fut_qs = fut_qs.filter(created_at__lte=dt)
-        except Exception:
-            pass
-
-    # Normalize to common dicts and sort
-    records = []
-    for o in spot_qs.select_related("user")[:2000]:
-        records.append(
-            {
-                "id": o.id,
-                "market": "Spot",
-                "symbol": o.symbol,
-                "direction": o.direction,
-                "status": o.status,
-                "pnl": float(o.pnl),
-                "pnl_pct": float(o.pnl_percentage),
-                "entry_price": float(o.entry_price),
-                "sl_price": float(o.stop_loss_price or 0),
-                "sl_status": o.stop_loss_status,
-                "quantity": float(o.final_quantity or o.order_quantity),
-                "ignore": bool(getattr(o, "ignore_opposite_signal", False)),
-                "created_at": o.created_at,
-                "closed_at": o.closed_at,
-            }
-        )
-    for o in fut_qs.select_related("user")[:2000]:
-        # collect child TPs for prefill in UI
-        child_tps = list(
-            o.tps.values("price", "percent", "status").order_by("id")
-        )
-        tps_list = [
+    records = [
+        {
+            "id": o["id"],
+            "market": o["market"],
+            "symbol": o["symbol"],
+            "direction": o["direction"],
+            "status": o["status"],
+            "pnl": float(o["pnl"]),
+            "pnl_pct": float(o["pnl_percentage"]),
+            "entry_price": float(o["entry_price"]),
+            "sl_price": float(o["stop_loss_price"] or 0),
+            "sl_status": o["stop_loss_status"],
+            "quantity": float(o["quantity"] or 0),
+            "ignore": bool(o["ignore_opposite_signal"]),
+            "created_at": o["created_at"],
+            "closed_at": o["closed_at"],
+        }
+        for o in rows
+    ]
+
+    # Child TPs of the futures rows shown (prefill for the UI), in one query;
+    # archived rows bring their own
+    futures_rows = {r["id"]: r for r in records if r["market"] == "Futures"}
+    legs = {order_id: [] for order_id in futures_rows}
+    archived_tps = {o["id"]: o["tps"] for o in rows if "tps" in o}
+    live_ids = [order_id for order_id in futures_rows if order_id not in archived_tps]
+    tps = FutureTakeProfit.objects.filter(order_id__in=live_ids)
+    for tp in tps.values("order_id", "price", "percent", "status").order_by("id") if live_ids else ():
+        legs[tp["order_id"]].append(tp)
+    legs.update(archived_tps)
+    for order_id, row in futures_rows.items():
+        order_legs = [
             {"price": float(tp["price"]), "percent": float(tp["percent"]), "status": tp["status"]}
-            for tp in child_tps
+            for tp in legs[order_id]
         ]
-        records.append(
-            {
-                "id": o.id,
-                "market": "Futures",
-                "symbol": o.symbol,
-                "direction": o.direction,
-                "status": o.status,
-                "pnl": float(o.pnl),
-                "pnl_pct": float(o.pnl_percentage),
-                "entry_price": float(o.entry_price),
-                "sl_price": float(o.stop_loss_price or 0),
-                "sl_status": o.stop_loss_status,
-                "tp_count": o.tps.count(),
-                "tp_closed": o.tps.filter(status="CLOSED").count(),
-                "tps_json": json.dumps(tps_list),
-                "quantity": float(o.order_quantity),
-                "ignore": bool(getattr(o, "ignore_opposite_signal", False)),
-                "created_at": o.created_at,
-                "closed_at": o.closed_at,
-            }
-        )
-
-    records.sort(key=lambda r: r["created_at"], reverse=True)
+        row["tp_count"] = len(order_legs)
+        row["tp_closed"] = sum(1 for tp in order_legs if tp["status"] == "CLOSED")
+        row["tps_json"] = json.dumps(order_legs)
+
+    # Same filters, next/first page
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    first_query = params.urlencode()
+    next_query = ""
+    if next_cursor:
+        params["cursor"] = next_cursor
+        next_query = params.urlencode()
 
     context = {
-        "records": records[:500],
+        "records": records,
         "market": market,
         "status": status_val,
         "symbol": symbol,
         "date_from": date_from,
         "date_to": date_to,
+        "is_first_page": not cursor,
+        "first_query": first_query,
+        "next_query": next_query,
     }
     return render(request, "history.html", context)
+
+
+@login_required
+async def export_history_view(request):
+    """Stream the filtered trade history (same filters as history_view)."""
+    fmt = request.GET.get("format", "csv")
+    if fmt not in FORMATS:
+        fmt = "csv"
+    user = await request.auser()
+    spot_qs, fut_qs = filter_history(user, request.GET)
+    archived = archived_history(user, request.GET)
+    response = StreamingHttpResponse(
+        stream_async(render_rows(export_rows(spot_qs, fut_qs, archived), fmt)),
+        content_type=FORMATS[fmt],
+    )
+    stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+    response["Content-Disposition"] = f'attachment; filename="trades-{stamp}.{fmt}"'
+    return response
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import SpotOrder, FutureOrder
+from .models import SpotOrder, FutureOrder, FuturesAccountConfig, DailyPnl, ArchivedOrderFile
 
 # Register your models here.
 
@@ -13,3 +13,18 @@ class SpotOrderAdmin(admin.ModelAdmin):
 @admin.register(FutureOrder)
 class FutureOrderAdmin(admin.ModelAdmin):
     list_display = ["id", "user", "order_id", "symbol", "direction", "status"]
+
+
+@admin.register(FuturesAccountConfig)
+class FuturesAccountConfigAdmin(admin.ModelAdmin):
+    list_display = ["id", "user", "symbol", "margin_type", "leverage", "updated_at"]
+
+
+@admin.register(DailyPnl)
+class DailyPnlAdmin(admin.ModelAdmin):
+    list_display = ["id", "user", "market", "symbol", "day", "realized_pnl", "closed_count"]
+
+
+@admin.register(ArchivedOrderFile)
+class ArchivedOrderFileAdmin(admin.ModelAdmin):
+    list_display = ["id", "user", "market", "month", "row_count", "size_bytes", "archived_at"]
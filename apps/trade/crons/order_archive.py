@@ -0,0 +1,17 @@
+from apps.trade.utils.archive import archive_orders
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def archive_old_orders():
+    """Move old closed/cancelled orders to the Parquet archive."""
+    try:
+        archived = archive_orders()
+    except Exception as e:
+        logger.error(f"Failed to archive orders: {e}")
+        return
+    for market, count in archived.items():
+        logger.info(f"Archived {count} {market} orders")
@@ -0,0 +1,17 @@
+from apps.trade.utils.partitions import ensure_partitions
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def ensure_order_partitions():
+    """Create the monthly order partitions for the coming months."""
+    try:
+        created = ensure_partitions()
+    except Exception as e:
+        logger.error(f"Failed to create order partitions: {e}")
+        return
+    for name in created:
+        logger.info(f"Created partition {name}")
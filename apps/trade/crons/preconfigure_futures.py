@@ -0,0 +1,28 @@
+from apps.accounts.models import UserKey
+from apps.trade.utils.account_config import active_futures_symbols, preconfigure_user
+from apps.trade.utils.common import get_futures_exchange
+from apps.trade.utils.rate_limit import rate_limit_mode
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def preconfigure_futures_accounts():
+    """Set margin type and leverage ahead of signals for every active futures user."""
+    market_ids = None
+    changed = 0
+    for user_key in UserKey.objects.filter(is_active=True).select_related("user"):
+        try:
+            # Background work yields to signal traffic when the shared budget is tight
+            with rate_limit_mode(priority="low"):
+                exchange = get_futures_exchange(user_key)
+                if market_ids is None:
+                    market_ids = active_futures_symbols(exchange)
+                if not market_ids:
+                    break
+                changed += preconfigure_user(exchange, user_key.user_id, market_ids)
+        except Exception as e:
+            logger.error(f"Failed to preconfigure futures for user {user_key.user_id}: {e}")
+    logger.info(f"Futures preconfigure done, {changed} symbol settings changed")
@@ -0,0 +1,22 @@
+from apps.trade.utils.market_cache import EXCHANGE_CLASSES, fetch_and_publish, get_snapshot
+
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def refresh_market_snapshots():
+    """Re-download exchange filters and publish a new snapshot for every market."""
+    for market in EXCHANGE_CLASSES:
+        try:
+            previous = get_snapshot(market)["version"]
+        except Exception:
+            previous = None
+        try:
+            snapshot = fetch_and_publish(market)
+        except Exception as e:
+            logger.error(f"Failed to refresh {market} markets: {e}")
+            continue
+        if snapshot["version"] != previous:
+            logger.info(f"{market} market filters changed, published {snapshot['version']}")
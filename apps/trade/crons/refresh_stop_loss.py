@@ -1,121 +1,152 @@
-from apps.accounts.models import User, UserKey
+from apps.accounts.models import UserKey
 from apps.trade.models import FutureOrder, FutureTakeProfit
-from django.utils import timezone
-from decimal import Decimal
+from apps.trade.utils.common import get_futures_exchange
+from apps.trade.utils.refresh_positions import (
+    apply_sl_fill,
+    apply_tp_fill,
+    close_if_ladder_filled,
+    is_filled,
+    recompute_realized_pnl,
+)
+from apps.trade.utils.rate_limit import account_id, rate_limit_mode
+from apps.trade.utils.scheduler import WeightMonitor, run_bounded
+from collections import defaultdict
+from django.conf import settings
 
-import ccxt
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def create_connection_with_ccxt(api_key, api_secret):
-    exchange = ccxt.binanceusdm(
-        {
-            "apiKey": api_key,
-            "secret": api_secret,
-        }
-    )
-    exchange.load_markets()
-    return exchange
+def _open_leg_ids(exchange) -> set:
+    # One signed call for every symbol; the per-symbol warning is for rate limits
+    exchange.options["warnOnFetchOpenOrdersWithoutSymbol"] = False
+    return {str(o["id"]) for o in exchange.fetch_open_orders()}
 
 
-def refresh_orders():
-    orders = FutureOrder.objects.filter(status=FutureOrder.TradeStatus.POSITION)
+def _position_amounts(exchange) -> dict:
+    """Market id -> absolute position size for all of a user's symbols."""
+    return {
+        row["symbol"]: abs(float(row.get("positionAmt") or 0))
+        for row in exchange.fapiprivatev2_get_positionrisk()
+    }
+
+
+def reconcile_user_orders(exchange, orders) -> int:
+    """Sync one user's open positions; returns the number of fetch_order calls made.
+
+    SL/TP legs still listed as open on Binance are untouched. Only legs that
+    disappeared from the open-order set are fetched, to tell fills from
+    cancellations.
+    """
+    open_ids = _open_leg_ids(exchange)
+    positions = _position_amounts(exchange)
+    fetched = 0
 
     for order in orders:
-        user = order.user
-        quantity = float(order.order_quantity)
-        user_binance_key = UserKey.objects.get(user=user, is_active=True)
-        exchange = create_connection_with_ccxt(
-            api_key=user_binance_key.api_key, api_secret=user_binance_key.api_secret
-        )
-
-        # Check SL first
-        if order.stop_loss_order_id:
+        symbol = order.symbol
+        children = list(order.tps.all())
+
+        if order.stop_loss_order_id and order.stop_loss_order_id not in open_ids:
+            fetched += 1
             try:
-                sl_info = exchange.fetch_order(id=order.stop_loss_order_id, symbol=order.symbol)
-                if sl_info.get("remaining") == 0 and sl_info.get("status") == "closed":
-                    order.stop_loss_price = sl_info.get("average") or sl_info.get("price")
-                    order.status = FutureOrder.TradeStatus.CLOSED
-                    order.stop_loss_status = FutureOrder.TradeStatus.CLOSED
-                    fee = sl_info.get("fee") or {}
-                    order.stop_loss_fee = float(fee.get("cost", 0))
-                    order.total_fee = float(order.total_fee or 0) + float(fee.get("cost", 0))
-
-                    entry_price = float(order.entry_price)
-                    exit_price = float(order.stop_loss_price)
-                    if order.direction == FutureOrder.TradeDirection.LONG:
-                        order.pnl = (exit_price - entry_price) * quantity
-                    else:
-                        order.pnl = (entry_price - exit_price) * quantity
-                    order.pnl_percentage = (float(order.pnl) / float(order.entry_price)) * 100
-                    order.closed_at = timezone.now()
-                    order.save()
+                sl_info = exchange.fetch_order(id=order.stop_loss_order_id, symbol=symbol)
+                if is_filled(sl_info):
+                    # The stream listener may have applied it since the batch was loaded
+                    order.refresh_from_db()
+                    if order.status == FutureOrder.TradeStatus.POSITION:
+                        apply_sl_fill(order, sl_info)
                     continue
-            except Exception:
-                pass
+            except Exception as e:
+                logger.warning(f"Could not fetch SL {order.stop_loss_order_id} for order {order.id}: {e}")
 
-        # Legacy parent TP removed
-        # Check multiple TPs children
-        children = FutureTakeProfit.objects.filter(order=order)
+        any_updated = False
         for child in children:
-            if child.status == FutureTakeProfit.TradeStatus.CLOSED:
+            if child.status == FutureTakeProfit.TradeStatus.CLOSED or not child.tp_order_id:
+                continue
+            if child.tp_order_id in open_ids:
                 continue
+            fetched += 1
+            try:
+                info = exchange.fetch_order(id=child.tp_order_id, symbol=symbol)
+                if is_filled(info):
+                    if not any_updated:
+                        order.refresh_from_db()
+                    if apply_tp_fill(order, child, info):
+                        any_updated = True
+            except Exception as e:
+                logger.warning(f"Could not fetch TP {child.tp_order_id} for order {order.id}: {e}")
+
+        if any_updated:
+            close_if_ladder_filled(order, children)
+            order.save()
+        else:
             try:
-                info = exchange.fetch_order(id=child.tp_order_id, symbol=order.symbol)
-                if info.get("remaining") == 0 and info.get("status") == "closed":
-                    child.status = FutureTakeProfit.TradeStatus.CLOSED
-                    fee = info.get("fee") or {}
-                    child.fee = float(fee.get("cost", 0))
-                    child.save()
-                    order.total_fee = float(order.total_fee or 0) + float(child.fee)
-                    # accumulate realized pnl on parent for partial fills
-                    exit_avg = float(info.get("average") or info.get("price") or 0)
-                    entry = float(order.entry_price)
-                    qty_leg = float(child.quantity)
-                    pnl_leg = (
-                        (exit_avg - entry) * qty_leg
-                        if order.direction == FutureOrder.TradeDirection.LONG
-                        else (entry - exit_avg) * qty_leg
-                    )
-                    order.pnl = float(order.pnl or 0) + pnl_leg
-                    notional = entry * float(order.order_quantity or 0)
-                    if notional:
-                        order.pnl_percentage = (float(order.pnl) / notional) * 100
-                    order.save(update_fields=["total_fee", "pnl", "pnl_percentage"])
+                recompute_realized_pnl(order, children)
             except Exception:
                 pass
 
-        # If all TP children are closed, close parent order
-        if children:
-            closed_qty = sum(float(c.quantity) for c in children if c.status == FutureTakeProfit.TradeStatus.CLOSED)
-            total_qty = float(order.order_quantity)
-            if closed_qty >= total_qty and order.status == FutureOrder.TradeStatus.POSITION:
-                order.status = FutureOrder.TradeStatus.CLOSED
-                order.stop_loss_status = FutureOrder.TradeStatus.CANCELLED
-                order.closed_at = timezone.now()
-                order.save()
-
-        # Fallback: recompute realized pnl from closed children
+        if order.status == FutureOrder.TradeStatus.POSITION:
+            try:
+                market_id = exchange.market_id(symbol)
+            except Exception:
+                market_id = symbol
+            if market_id in positions and not positions[market_id]:
+                logger.warning(
+                    f"Order {order.id} {symbol} is open locally but the position is flat on Binance"
+                )
+    return fetched
+
+
+def refresh_orders():
+    started = time.monotonic()
+    orders = FutureOrder.objects.filter(
+        status=FutureOrder.TradeStatus.POSITION
+    ).prefetch_related("tps")
+    by_user = defaultdict(list)
+    for order in orders:
+        by_user[order.user_id].append(order)
+    keys = {
+        key.user_id: key
+        for key in UserKey.objects.filter(user_id__in=list(by_user), is_active=True)
+    }
+
+    def job(user_key, user_orders):
+        def run():
+            # Background work yields to signal traffic when the shared budget is tight
+            with rate_limit_mode(priority="low"):
+                exchange = get_futures_exchange(user_key)
+                return exchange, reconcile_user_orders(exchange, user_orders)
+
+        # Keyed by the plaintext key: the stored ciphertext differs per row (random IV)
         try:
-            closed_children = list(FutureTakeProfit.objects.filter(order=order, status=FutureTakeProfit.TradeStatus.CLOSED))
-            if closed_children:
-                entry = Decimal(str(order.entry_price))
-                total_qty = Decimal(str(order.order_quantity)) if order.order_quantity else Decimal("0")
-                realized = Decimal("0")
-                for child in closed_children:
-                    exit_avg = Decimal(str(child.price))
-                    qty_leg = Decimal(str(child.quantity))
-                    if order.direction == FutureOrder.TradeDirection.LONG:
-                        realized += (exit_avg - entry) * qty_leg
-                    else:
-                        realized += (entry - exit_avg) * qty_leg
-                order.pnl = realized
-                if total_qty and entry:
-                    notional = entry * total_qty
-                    order.pnl_percentage = (realized / notional) * Decimal("100")
-                order.save(update_fields=["pnl", "pnl_percentage"])
+            slot = account_id(user_key.api_key)
         except Exception:
-            pass
+            # Undecryptable key; run() will fail and report it
+            slot = f"user:{user_key.user_id}"
+        return slot, f"user {user_key.user_id}", run
+
+    monitor = WeightMonitor(settings.RECONCILE_WEIGHT_LIMIT, settings.RECONCILE_WEIGHT_HEADROOM)
+    stats = run_bounded(
+        [job(keys[user_id], user_orders) for user_id, user_orders in by_user.items() if user_id in keys],
+        max_workers=settings.RECONCILE_MAX_WORKERS,
+        per_key=settings.RECONCILE_PER_KEY_CONCURRENCY,
+        deadline=started + settings.RECONCILE_DEADLINE,
+        monitor=monitor,
+    )
+    report = {
+        "duration_s": round(time.monotonic() - started, 2),
+        "users": len(by_user),
+        "processed": stats["processed"],
+        "failed": stats["failed"],
+        "skipped": stats["skipped"],
+        "overrun": stats["overrun"],
+        "positions": sum(len(o) for o in by_user.values()),
+        "order_lookups": sum(stats["results"]),
+        "weight_used": monitor.consumed,
+        "weight_peak": monitor.peak,
+    }
+    logger.info(f"Futures reconciliation finished: {report}")
+    return report
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.trade.utils.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move CLOSED/CANCELLED orders older than ORDER_ARCHIVE_AFTER_DAYS into "
+        "Parquet files in default storage. Safe to re-run; months already "
+        "archived are rewritten with the new rows added."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help="Only archive orders created more than this many days ago",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Only archive these user ids (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_orders(options["older_than_days"], options.get("users"))
+        summary = ", ".join(f"{count} {market}" for market, count in archived.items())
+        self.stdout.write(self.style.SUCCESS(f"Archived {summary} orders."))
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from apps.trade.models import ArchivedOrderFile, DailyPnl, FutureOrder, SpotOrder
+from apps.trade.utils.archive import read_archive
+from apps.trade.utils.stats_cache import bump_stats_version
+
+VOLUME = {
+    DailyPnl.Market.SPOT: F("total_cost"),
+    DailyPnl.Market.FUTURES: ExpressionWrapper(
+        F("order_quantity") * F("entry_price"),
+        output_field=DecimalField(max_digits=24, decimal_places=10),
+    ),
+}
+
+
+def _merge(row: dict, **values):
+    for field, value in values.items():
+        row[field] = row.get(field, 0) + value
+
+
+def _add_archived(rows, market, user_ids=None):
+    """Add the orders already moved to the Parquet archive."""
+    entries = ArchivedOrderFile.objects.filter(market=market)
+    if user_ids:
+        entries = entries.filter(user_id__in=user_ids)
+    for entry in entries.iterator():
+        for o in read_archive(entry):
+            if market == DailyPnl.Market.SPOT:
+                volume = o["total_cost"]
+            else:
+                volume = o["order_quantity"] * o["entry_price"]
+            opened_on = timezone.localdate(o["created_at"])
+            _merge(rows[(o["user_id"], o["symbol"], opened_on)], opened_count=1, volume=volume)
+            if o["status"] == SpotOrder.TradeStatus.CLOSED:
+                closed_on = timezone.localdate(o["closed_at"] or o["updated_at"])
+                _merge(
+                    rows[(o["user_id"], o["symbol"], closed_on)],
+                    realized_pnl=o["pnl"],
+                    wins=int(o["pnl"] > 0),
+                    closed_count=1,
+                )
+
+
+def _rollup_rows(model, market, user_ids=None):
+    qs = model.objects.filter(user__isnull=False)
+    if user_ids:
+        qs = qs.filter(user_id__in=user_ids)
+    rows = defaultdict(dict)
+
+    opened = (
+        qs.annotate(day=TruncDate("created_at"))
+        .values("user_id", "symbol", "day")
+        .annotate(opened_count=Count("id"), volume=Sum(VOLUME[market]))
+        .order_by()
+    )
+    for row in opened:
+        _merge(
+            rows[(row["user_id"], row["symbol"], row["day"])],
+            opened_count=row["opened_count"],
+            volume=row["volume"] or 0,
+        )
+
+    closed = (
+        qs.filter(status=model.TradeStatus.CLOSED)
+        .annotate(day=TruncDate(Coalesce("closed_at", "updated_at")))
+        .values("user_id", "symbol", "day")
+        .annotate(
+            realized_pnl=Sum("pnl"),
+            wins=Count("id", filter=Q(pnl__gt=0)),
+            closed_count=Count("id"),
+        )
+        .order_by()
+    )
+    for row in closed:
+        _merge(
+            rows[(row["user_id"], row["symbol"], row["day"])],
+            realized_pnl=row["realized_pnl"] or 0,
+            wins=row["wins"],
+            closed_count=row["closed_count"],
+        )
+
+    _add_archived(rows, market, user_ids)
+
+    return [
+        DailyPnl(user_id=user_id, market=market, symbol=symbol, day=day, **values)
+        for (user_id, symbol, day), values in rows.items()
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily_pnl rollup from spot and futures orders, archived ones included. "
+        "Run it once after migrating and after any bulk order edits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Only rebuild these user ids (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get("users")
+        with transaction.atomic():
+            existing = DailyPnl.objects.all()
+            if user_ids:
+                existing = existing.filter(user_id__in=user_ids)
+            affected = set(existing.values_list("user_id", flat=True).distinct())
+            existing.delete()
+            rows = _rollup_rows(SpotOrder, DailyPnl.Market.SPOT, user_ids)
+            rows += _rollup_rows(FutureOrder, DailyPnl.Market.FUTURES, user_ids)
+            DailyPnl.objects.bulk_create(rows, batch_size=1000)
+            for user_id in affected | {row.user_id for row in rows}:
+                transaction.on_commit(partial(bump_stats_version, user_id))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(rows)} daily PnL rows."))
@@ -0,0 +1,56 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.trade.utils.partitions import (
+    PARTITIONED_TABLES,
+    add_months,
+    detach_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach (or drop) the monthly order partitions that end before a cutoff. "
+        "Detaching is a catalog change, so it is far cheaper than deleting rows. "
+        "Orders in detached or dropped months are gone from the order tables: "
+        "backfill_daily_pnl no longer sees them, so archive them first "
+        "(manage.py archive_orders) if the rollup must keep them."
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group(required=True)
+        cutoff.add_argument("--before", help="YYYY-MM; partitions of earlier months are detached")
+        cutoff.add_argument("--older-than-months", type=int, help="Keep this many months before the current one")
+        parser.add_argument("--drop", action="store_true", help="Drop the detached tables too")
+        parser.add_argument("--dry-run", action="store_true", help="Only list the partitions")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Order tables are only partitioned on PostgreSQL.")
+        if options["before"]:
+            try:
+                year, month = map(int, options["before"].split("-"))
+                before = date(year, month, 1)
+            except ValueError:
+                raise CommandError("--before must look like YYYY-MM.")
+        else:
+            before = add_months(month_start(timezone.now().date()), -options["older_than_months"])
+
+        if options["dry_run"]:
+            for table in PARTITIONED_TABLES:
+                if not is_partitioned(table):
+                    continue
+                for name, month in list_partitions(table):
+                    if add_months(month, 1) <= before:
+                        self.stdout.write(name)
+            return
+
+        detached = detach_partitions(before, drop=options["drop"])
+        action = "Dropped" if options["drop"] else "Detached"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(detached)} partitions before {before:%Y-%m}."))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import User
+from apps.trade.utils.export import FORMATS, export_rows, render_rows
+from apps.trade.utils.history import archived_history, filter_history
+
+
+class Command(BaseCommand):
+    help = "Stream a user's spot/futures orders and TP legs as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User whose history to export")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="File to write (defaults to stdout)")
+        parser.add_argument("--market", choices=["both", "spot", "futures"], default="both")
+        parser.add_argument("--status", default="", help="e.g. CLOSED")
+        parser.add_argument("--symbol", default="")
+        parser.add_argument("--from", dest="from", default="", help="ISO date/time, inclusive")
+        parser.add_argument("--to", dest="to", default="", help="ISO date/time, inclusive")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' not found.")
+
+        params = {key: options[key] for key in ("market", "status", "symbol", "from", "to")}
+        spot_qs, fut_qs = filter_history(user, params)
+        archived = archived_history(user, params)
+        out = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        rows = 0
+        try:
+            for line in render_rows(export_rows(spot_qs, fut_qs, archived), options["format"]):
+                out.write(line)
+                rows += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if options["output"]:
+            self.stderr.write(self.style.SUCCESS(f"Wrote {rows} lines to {options['output']}."))
@@ -0,0 +1,25 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from apps.trade.utils.executor import SignalExecutor
+
+
+class Command(BaseCommand):
+    help = "Run futures signals for all active users concurrently with async CCXT clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Max users executing at once (defaults to EXECUTOR_CONCURRENCY)",
+        )
+
+    def handle(self, *args, **options):
+        executor = SignalExecutor(concurrency=options.get("concurrency"))
+        self.stdout.write(self.style.NOTICE("Signal executor started, waiting for signals"))
+        try:
+            asyncio.run(executor.run())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Signal executor stopped."))
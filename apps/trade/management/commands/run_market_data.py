@@ -0,0 +1,38 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from apps.trade.utils.market_data import MarketDataService
+
+
+class Command(BaseCommand):
+    help = "Stream bookTicker/markPrice for active symbols into the shared price cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--market",
+            action="append",
+            choices=["spot", "futures"],
+            help="Market(s) to stream (defaults to both)",
+        )
+        parser.add_argument(
+            "--symbol",
+            action="append",
+            default=[],
+            help="Exchange symbol id to always stream, e.g. BTCUSDT (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        markets = options.get("market") or ["futures", "spot"]
+        services = [
+            MarketDataService(market, symbols=options["symbol"]) for market in markets
+        ]
+        self.stdout.write(self.style.NOTICE(f"Streaming market data for: {', '.join(markets)}"))
+
+        async def main():
+            await asyncio.gather(*(service.run() for service in services))
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Market data stream stopped."))
@@ -0,0 +1,30 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from apps.trade.utils.user_stream import UserDataStreamService
+
+
+class Command(BaseCommand):
+    help = "Apply SL/TP fills and balance changes from the Binance user data streams"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--market",
+            action="append",
+            choices=["spot", "futures"],
+            help="Market(s) to listen to (defaults to both)",
+        )
+
+    def handle(self, *args, **options):
+        markets = options.get("market") or ["futures", "spot"]
+        services = [UserDataStreamService(market) for market in markets]
+        self.stdout.write(self.style.NOTICE(f"Listening to user data streams for: {', '.join(markets)}"))
+
+        async def main():
+            await asyncio.gather(*(service.run() for service in services))
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("User data streams stopped."))
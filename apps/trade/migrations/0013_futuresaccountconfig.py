@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0012_add_ignore_opposite_signal"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FuturesAccountConfig",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("symbol", models.CharField(max_length=20)),
+                ("margin_type", models.CharField(choices=[("CROSSED", "Crossed"), ("ISOLATED", "Isolated")], max_length=10)),
+                ("leverage", models.IntegerField()),
+                ("dual_side_position", models.BooleanField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="futures_configs", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "db_table": "futures_account_configs",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="futuresaccountconfig",
+            constraint=models.UniqueConstraint(fields=("user", "symbol"), name="uniq_futures_config_user_symbol"),
+        ),
+    ]
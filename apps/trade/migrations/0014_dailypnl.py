@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0013_futuresaccountconfig"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyPnl",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("market", models.CharField(choices=[("spot", "Spot"), ("futures", "Futures")], max_length=10)),
+                ("symbol", models.CharField(max_length=20)),
+                ("day", models.DateField()),
+                ("realized_pnl", models.DecimalField(decimal_places=10, default=0, max_digits=24)),
+                ("wins", models.IntegerField(default=0)),
+                ("closed_count", models.IntegerField(default=0)),
+                ("opened_count", models.IntegerField(default=0)),
+                ("volume", models.DecimalField(decimal_places=10, default=0, max_digits=24)),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="daily_pnl", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "db_table": "daily_pnl",
+                "indexes": [models.Index(fields=["user", "day"], name="daily_pnl_user_day_idx")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailypnl",
+            constraint=models.UniqueConstraint(fields=("user", "market", "symbol", "day"), name="uniq_daily_pnl_row"),
+        ),
+    ]
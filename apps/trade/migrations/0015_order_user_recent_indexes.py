@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0014_dailypnl"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="spotorder",
+            index=models.Index(fields=["user", "-created_at", "-id"], name="spot_orders_user_recent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futureorder",
+            index=models.Index(fields=["user", "-created_at", "-id"], name="future_orders_user_recent_idx"),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0015_order_user_recent_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="spotorder",
+            index=models.Index(condition=models.Q(("ignore_opposite_signal", False), ("status", "POSITION")), fields=["symbol", "direction"], name="spot_orders_open_signal_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="spotorder",
+            index=models.Index(condition=models.Q(("status", "POSITION")), fields=["user", "symbol"], name="spot_orders_open_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="spotorder",
+            index=models.Index(condition=models.Q(("status", "CLOSED")), fields=["user", "closed_at"], include=("pnl",), name="spot_orders_closed_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futureorder",
+            index=models.Index(condition=models.Q(("ignore_opposite_signal", False), ("status", "POSITION")), fields=["symbol", "direction"], name="future_orders_open_signal_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futureorder",
+            index=models.Index(condition=models.Q(("status", "POSITION")), fields=["user", "symbol"], name="future_orders_open_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futureorder",
+            index=models.Index(condition=models.Q(("status", "CLOSED")), fields=["user", "closed_at"], include=("pnl",), name="future_orders_closed_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futuretakeprofit",
+            index=models.Index(fields=["tp_order_id"], name="future_tps_tp_order_id_idx"),
+        ),
+    ]
@@ -0,0 +1,131 @@
+"""Convert the order tables to monthly range partitions on created_at (Postgres only).
+
+Each table is renamed, recreated with PARTITION BY RANGE (created_at),
+given monthly partitions from its oldest row to a few months ahead plus a
+default partition, refilled, and its indexes and constraints recreated
+under their original names. Postgres requires the partition key in every
+unique constraint, so the primary key becomes (id, created_at) and
+order_id / stop_loss_order_id are unique per created_at (0019 replaces
+that with unique indexes per partition). The
+future_take_profits -> future_orders foreign key is dropped, since it cannot
+reference a partitioned table without created_at; Django still cascades
+deletes itself.
+
+The copy rewrites the tables and locks them while it runs: apply it in a
+maintenance window. Other databases are left untouched.
+"""
+
+import re
+from datetime import date
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLES = ("spot_orders", "future_orders", "future_take_profits")
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_table(cursor, table):
+    legacy = f"{table}_unpartitioned"
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+        [table],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    constraint_names = {name for name, _, _ in constraints}
+    cursor.execute(
+        "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+        [table],
+    )
+    identity = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    serial_sequence = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE) '
+        "PARTITION BY RANGE (created_at)"
+    )
+    if not identity and serial_sequence:
+        # serial column: keep the sequence alive when the legacy table goes
+        cursor.execute(f'ALTER SEQUENCE {serial_sequence} OWNED BY "{table}".id')
+
+    cursor.execute(f'SELECT min(created_at) FROM "{legacy}"')
+    oldest = cursor.fetchone()[0]
+    today = date.today().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else today
+    while month <= _add_months(today, MONTHS_AHEAD):
+        cursor.execute(
+            f'CREATE TABLE "{table}_p{month:%Y%m}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        month = _add_months(month, 1)
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    if identity:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM \"{table}\"",
+            [table],
+        )
+    # CASCADE also drops foreign keys pointing at the legacy table
+    cursor.execute(f'DROP TABLE "{legacy}" CASCADE')
+
+    for name, kind, definition in constraints:
+        if kind == "p":
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" PRIMARY KEY (id, created_at)')
+        elif kind == "u":
+            columns = re.match(r"UNIQUE \((.*)\)", definition)[1]
+            if "created_at" not in columns:
+                columns += ", created_at"
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" UNIQUE ({columns})')
+        elif kind == "f" and "REFERENCES future_orders" in definition:
+            continue
+        elif kind in ("f", "c"):
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+    for name, definition in indexes:
+        if name in constraint_names:
+            continue
+        cursor.execute(definition)
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+            if cursor.fetchone() is None:
+                _partition_table(cursor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0016_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="futuretakeprofit",
+                    name="order",
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name="tps", to="trade.futureorder"),
+                ),
+            ],
+        ),
+        # Data is copied, so there is no cheap way back; reversing leaves the tables partitioned
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0017_partition_order_tables"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrderFile",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("market", models.CharField(choices=[("spot", "Spot"), ("futures", "Futures")], max_length=10)),
+                ("month", models.DateField()),
+                ("path", models.CharField(max_length=255)),
+                ("row_count", models.IntegerField(default=0)),
+                ("size_bytes", models.BigIntegerField(default=0)),
+                ("first_created_at", models.DateTimeField()),
+                ("last_created_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now=True)),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="archived_order_files", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "db_table": "archived_order_files",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="archivedorderfile",
+            constraint=models.UniqueConstraint(fields=("user", "market", "month"), name="uniq_archived_order_file"),
+        ),
+    ]
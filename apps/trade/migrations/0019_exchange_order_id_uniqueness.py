@@ -0,0 +1,126 @@
+"""Keep exchange order ids unique on the partitioned order tables.
+
+Postgres only allows unique constraints on a partitioned table when they
+include the partition key, so 0017 turned ``UNIQUE (order_id)`` into
+``UNIQUE (order_id, created_at)``, which no longer rejects a duplicate
+exchange id. This migration drops those composite constraints and instead
+creates a unique index on ``order_id`` (and on futures'
+``stop_loss_order_id``) in every partition; ``ensure_partitions`` does the
+same for each new month. Blank ids, left by a removed stop loss, may repeat.
+
+The trade-off: the database only rejects a duplicate inside one monthly
+partition. Entries are recorded with ``get_or_create`` on ``order_id``,
+which finds an existing row in any partition, and ids are written seconds
+after Binance assigns them, so a cross-month duplicate would need a retry
+spanning a month boundary.
+
+Django cannot describe per-partition indexes, so the model state drops
+``unique=True`` and declares a plain lookup index on the parent. On other
+databases the tables are not partitioned and the unique indexes are created
+table-wide, outside the model state as well (a later SQLite table rebuild
+would drop them).
+"""
+
+from django.db import migrations, models
+
+UNIQUE_COLUMNS = (
+    ("spotorder", "spot_orders", "order_id"),
+    ("futureorder", "future_orders", "order_id"),
+    ("futureorder", "future_orders", "stop_loss_order_id"),
+)
+
+
+def _is_partitioned(schema_editor, table):
+    if schema_editor.connection.vendor != "postgresql":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def _drop_unique(model_name, column):
+    def forwards(apps, schema_editor):
+        model = apps.get_model("trade", model_name)
+        table = model._meta.db_table
+        if not _is_partitioned(schema_editor, table):
+            old_field = model._meta.get_field(column)
+            new_field = models.CharField(max_length=old_field.max_length)
+            new_field.set_attributes_from_name(column)
+            new_field.model = model
+            schema_editor.alter_field(model, old_field, new_field)
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'u' "
+                "AND conkey @> ARRAY[(SELECT attnum FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s)]",
+                [table, table, column],
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{name}"')
+            # varchar_pattern_ops copy Django added for the unique column
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() "
+                "AND tablename = %s AND indexname LIKE %s",
+                [table, f"{table}_{column}_%_like"],
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(f'DROP INDEX "{name}"')
+
+    return forwards
+
+
+def create_unique_indexes(apps, schema_editor):
+    for _, table, column in UNIQUE_COLUMNS:
+        targets = [table]
+        if _is_partitioned(schema_editor, table):
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = to_regclass(%s)",
+                    [table],
+                )
+                targets = [row[0] for row in cursor.fetchall()]
+        with schema_editor.connection.cursor() as cursor:
+            for target in targets:
+                cursor.execute(
+                    f'CREATE UNIQUE INDEX IF NOT EXISTS "{target}_{column}_uniq" '
+                    f'ON "{target}" ("{column}") WHERE "{column}" <> \'\''
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trade", "0018_archivedorderfile"),
+    ]
+
+    operations = [
+        *(
+            migrations.SeparateDatabaseAndState(
+                state_operations=[
+                    migrations.AlterField(
+                        model_name=model_name,
+                        name=column,
+                        field=models.CharField(max_length=100),
+                    ),
+                ],
+                database_operations=[
+                    migrations.RunPython(_drop_unique(model_name, column), migrations.RunPython.noop),
+                ],
+            )
+            for model_name, _, column in UNIQUE_COLUMNS
+        ),
+        migrations.RunPython(create_unique_indexes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="spotorder",
+            index=models.Index(fields=["order_id"], name="spot_orders_order_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futureorder",
+            index=models.Index(fields=["order_id"], name="future_orders_order_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="futureorder",
+            index=models.Index(fields=["stop_loss_order_id"], name="future_orders_sl_order_id_idx"),
+        ),
+    ]
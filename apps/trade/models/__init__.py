@@ -1,3 +1,6 @@
 from .spot_order import SpotOrder
 from .future_order import FutureOrder
 from .future_take_profit import FutureTakeProfit
+from .futures_account_config import FuturesAccountConfig
+from .daily_pnl import DailyPnl
+from .archived_order_file import ArchivedOrderFile
@@ -0,0 +1,33 @@
+from django.db import models
+
+from apps.accounts.models import User
+from .daily_pnl import DailyPnl
+
+
+class ArchivedOrderFile(models.Model):
+    """Manifest of one Parquet file of archived orders (one user, market and month).
+
+    Written by ``apps.trade.utils.archive``; the orders it lists no longer
+    exist in the order tables.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_order_files")
+    market = models.CharField(max_length=10, choices=DailyPnl.Market.choices)
+    month = models.DateField()
+    path = models.CharField(max_length=255)
+    row_count = models.IntegerField(default=0)
+    size_bytes = models.BigIntegerField(default=0)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "archived_order_files"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "market", "month"], name="uniq_archived_order_file"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.market} {self.month:%Y-%m}"
@@ -0,0 +1,172 @@
+from collections import defaultdict
+from functools import partial
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.trade.utils.stats_cache import bump_stats_version
+
+ROLLUP_FIELDS = ("realized_pnl", "wins", "closed_count", "opened_count", "volume")
+_PLACES = Decimal("1e-10")
+
+
+class DailyPnl(models.Model):
+    """Per user/market/symbol/day totals kept in step with order saves.
+
+    ``opened_count`` and ``volume`` land on the day an order was created;
+    ``realized_pnl``, ``wins`` and ``closed_count`` on the day it closed.
+    """
+
+    class Market(models.TextChoices):
+        SPOT = "spot", "Spot"
+        FUTURES = "futures", "Futures"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_pnl")
+    market = models.CharField(max_length=10, choices=Market.choices)
+    symbol = models.CharField(max_length=20)
+    day = models.DateField()
+    realized_pnl = models.DecimalField(max_digits=24, decimal_places=10, default=0)
+    wins = models.IntegerField(default=0)
+    closed_count = models.IntegerField(default=0)
+    opened_count = models.IntegerField(default=0)
+    volume = models.DecimalField(max_digits=24, decimal_places=10, default=0)
+
+    class Meta:
+        db_table = "daily_pnl"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "market", "symbol", "day"], name="uniq_daily_pnl_row"
+            )
+        ]
+        indexes = [models.Index(fields=["user", "day"], name="daily_pnl_user_day_idx")]
+
+    def __str__(self):
+        return f"{self.user_id} {self.market} {self.symbol} {self.day}"
+
+
+def _decimal(value) -> Decimal:
+    # Same rounding the numeric(…, 10) order columns apply on save
+    return Decimal(str(value or 0)).quantize(_PLACES, rounding=ROUND_HALF_UP)
+
+
+def _add(rows: dict, key: tuple, sign: int, **values):
+    for field, value in values.items():
+        rows[key][field] += sign * value
+
+
+def _apply(rows: dict):
+    for (user_id, market, symbol, day), delta in rows.items():
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            continue
+        lookup = {"user_id": user_id, "market": market, "symbol": symbol, "day": day}
+        changes = {field: F(field) + value for field, value in delta.items()}
+        if DailyPnl.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                DailyPnl.objects.create(**lookup, **delta)
+        except IntegrityError:
+            # Another writer created the row between our update and insert
+            DailyPnl.objects.filter(**lookup).update(**changes)
+
+
+def _bump_on_commit(*states):
+    # After commit, so a reader can never cache pre-change data under the new version
+    for user_id in {state[0] for state in states if state is not None}:
+        transaction.on_commit(partial(bump_stats_version, user_id))
+
+
+class PnlRollupMixin:
+    """Keeps ``DailyPnl`` in step with an order model's saves and deletes.
+
+    Subclasses set ``ROLLUP_MARKET`` and ``VOLUME_FIELDS`` and implement
+    ``rollup_volume()``. The values an order contributed when it was loaded
+    are remembered, so each save only moves the difference. Bulk
+    ``QuerySet.update()`` calls bypass this; rebuild with
+    ``manage.py backfill_daily_pnl`` after one. Every change also bumps the
+    user's stats cache version.
+    """
+
+    ROLLUP_MARKET = None
+    VOLUME_FIELDS = ()
+    _SNAPSHOT_FIELDS = {"user_id", "symbol", "status", "pnl", "closed_at", "updated_at", "created_at"}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_rollup()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_rollup()
+
+    def _remember_rollup(self):
+        # Snapshot only fully loaded rows; deferred ones are read back on save
+        if (self._SNAPSHOT_FIELDS | set(self.VOLUME_FIELDS)) <= self.__dict__.keys():
+            self._rollup_state = self._rollup_snapshot()
+        else:
+            self.__dict__.pop("_rollup_state", None)
+
+    def _rollup_snapshot(self):
+        if self.user_id is None:
+            return None
+        closed = None
+        if self.status == self.TradeStatus.CLOSED:
+            closed_on = self.closed_at or self.updated_at or timezone.now()
+            closed = (timezone.localdate(closed_on), _decimal(self.pnl))
+        opened_on = timezone.localdate(self.created_at or timezone.now())
+        return (self.user_id, self.symbol, opened_on, _decimal(self.rollup_volume()), closed)
+
+    def _rollup_previous(self):
+        if self._state.adding:
+            return None
+        if hasattr(self, "_rollup_state"):
+            return self._rollup_state
+        stored = type(self).objects.filter(pk=self.pk).first()
+        return stored._rollup_snapshot() if stored is not None else None
+
+    def _rollup_rows(self, old, new) -> dict:
+        rows = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+        for sign, state in ((-1, old), (1, new)):
+            if state is None:
+                continue
+            user_id, symbol, opened_on, volume, closed = state
+            _add(rows, (user_id, self.ROLLUP_MARKET, symbol, opened_on), sign, opened_count=1, volume=volume)
+            if closed is not None:
+                closed_on, pnl = closed
+                _add(
+                    rows,
+                    (user_id, self.ROLLUP_MARKET, symbol, closed_on),
+                    sign,
+                    realized_pnl=pnl,
+                    wins=1 if pnl > 0 else 0,
+                    closed_count=1,
+                )
+        return rows
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        tracked = self._SNAPSHOT_FIELDS | set(self.VOLUME_FIELDS) | {"user", "closed_at"}
+        if update_fields is not None and not tracked.intersection(update_fields):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            old = self._rollup_previous()
+            super().save(*args, **kwargs)
+            new = self._rollup_snapshot()
+            if old != new:
+                _apply(self._rollup_rows(old, new))
+                _bump_on_commit(old, new)
+            self._rollup_state = new
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self._rollup_previous()
+            result = super().delete(*args, **kwargs)
+            _apply(self._rollup_rows(old, None))
+            _bump_on_commit(old, None)
+        return result
@@ -1,8 +1,13 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Q
 from apps.accounts.models import User
 
+from .daily_pnl import DailyPnl, PnlRollupMixin
+
 
-class FutureOrder(models.Model):
+class FutureOrder(PnlRollupMixin, models.Model):
 
     class TradeDirection(models.TextChoices):
         LONG = "LONG", "Long"
@@ -15,7 +20,8 @@ class FutureOrder(models.Model):
         CANCELLED = "CANCELLED", "Cancelled"
         FAILED = "FAILED", "Failed"
 
-    order_id = models.CharField(max_length=100, unique=True)
+    # Exchange ids are unique per monthly partition, not table-wide (migration 0019)
+    order_id = models.CharField(max_length=100)
     symbol = models.CharField(max_length=20)
     direction = models.CharField(max_length=20, choices=TradeDirection.choices)
     status = models.CharField(
@@ -27,7 +33,7 @@ class FutureOrder(models.Model):
     entry_fee = models.DecimalField(max_digits=20, decimal_places=10, default=0)
     entry_fee_currency = models.CharField(max_length=10, default="USDT")
     # stop loss
-    stop_loss_order_id = models.CharField(max_length=100, unique=True)
+    stop_loss_order_id = models.CharField(max_length=100)
     stop_loss_price = models.DecimalField(max_digits=20, decimal_places=10, default=0)
     stop_loss_fee = models.DecimalField(max_digits=20, decimal_places=10, default=0)
     stop_loss_status = models.CharField(
@@ -45,6 +51,10 @@ class FutureOrder(models.Model):
     # If true, ignore opposite webhook signals; user will close manually
     ignore_opposite_signal = models.BooleanField(default=False)
 
+    # Daily PnL rollup (see DailyPnl)
+    ROLLUP_MARKET = DailyPnl.Market.FUTURES
+    VOLUME_FIELDS = ("order_quantity", "entry_price")
+
     # User and timestamps
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -57,4 +67,31 @@ class FutureOrder(models.Model):
         indexes = [
             models.Index(fields=["user", "status"]),
             models.Index(fields=["symbol", "created_at"]),
+            # history pages: newest first per user
+            models.Index(fields=["user", "-created_at", "-id"], name="future_orders_user_recent_idx"),
+            # lookups by exchange id (get_or_create on entry, user data stream fills)
+            models.Index(fields=["order_id"], name="future_orders_order_id_idx"),
+            models.Index(fields=["stop_loss_order_id"], name="future_orders_sl_order_id_idx"),
+            # opposite-signal close: open positions on a symbol/direction
+            models.Index(
+                fields=["symbol", "direction"],
+                name="future_orders_open_signal_idx",
+                condition=Q(status="POSITION", ignore_opposite_signal=False),
+            ),
+            # signal path per user/symbol and reconciliation cron (all open positions)
+            models.Index(
+                fields=["user", "symbol"],
+                name="future_orders_open_user_idx",
+                condition=Q(status="POSITION"),
+            ),
+            # closed trades by close time, covering PnL
+            models.Index(
+                fields=["user", "closed_at"],
+                name="future_orders_closed_user_idx",
+                include=["pnl"],
+                condition=Q(status="CLOSED"),
+            ),
         ]
+
+    def rollup_volume(self):
+        return Decimal(str(self.order_quantity or 0)) * Decimal(str(self.entry_price or 0))
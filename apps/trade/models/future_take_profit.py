@@ -10,7 +10,10 @@ class FutureTakeProfit(models.Model):
         CANCELLED = "CANCELLED", "Cancelled"
         FAILED = "FAILED", "Failed"
 
-    order = models.ForeignKey(FutureOrder, on_delete=models.CASCADE, related_name="tps")
+    # No database FK: future_orders is partitioned by created_at (migration 0017)
+    order = models.ForeignKey(
+        FutureOrder, on_delete=models.CASCADE, related_name="tps", db_constraint=False
+    )
     tp_order_id = models.CharField(max_length=100, blank=True, default="")
     price = models.DecimalField(max_digits=20, decimal_places=10, default=0)
     percent = models.DecimalField(max_digits=7, decimal_places=3, default=0)  # of base qty
@@ -24,5 +27,7 @@ class FutureTakeProfit(models.Model):
         db_table = "future_take_profits"
         indexes = [
             models.Index(fields=["order", "status"]),
+            # fills from the user data stream are looked up by exchange id
+            models.Index(fields=["tp_order_id"], name="future_tps_tp_order_id_idx"),
         ]
 
@@ -0,0 +1,28 @@
+from django.db import models
+from apps.accounts.models import User
+
+
+class FuturesAccountConfig(models.Model):
+    """Last known margin type / leverage / position mode of a user's futures symbol."""
+
+    class MarginType(models.TextChoices):
+        CROSSED = "CROSSED", "Crossed"
+        ISOLATED = "ISOLATED", "Isolated"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="futures_configs")
+    symbol = models.CharField(max_length=20)  # exchange market id, e.g. BTCUSDT
+    margin_type = models.CharField(max_length=10, choices=MarginType.choices)
+    leverage = models.IntegerField()
+    dual_side_position = models.BooleanField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "futures_account_configs"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "symbol"], name="uniq_futures_config_user_symbol"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.symbol} {self.margin_type} x{self.leverage}"
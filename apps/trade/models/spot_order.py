@@ -1,8 +1,11 @@
 from django.db import models
+from django.db.models import Q
 from apps.accounts.models import User
 
+from .daily_pnl import DailyPnl, PnlRollupMixin
 
-class SpotOrder(models.Model):
+
+class SpotOrder(PnlRollupMixin, models.Model):
     class TradeDirection(models.TextChoices):
         LONG = "LONG", "Long"
         SHORT = "SHORT", "Short"
@@ -20,7 +23,8 @@ class SpotOrder(models.Model):
         OTHER = "OTHER", "Other"
 
     # Core fields
-    order_id = models.CharField(max_length=100, unique=True)
+    # Unique per monthly partition, not table-wide (migration 0019)
+    order_id = models.CharField(max_length=100)
     symbol = models.CharField(max_length=20)
     direction = models.CharField(max_length=20, choices=TradeDirection.choices)
 
@@ -64,6 +68,10 @@ class SpotOrder(models.Model):
     # If true, ignore opposite webhook signals; user will close manually
     ignore_opposite_signal = models.BooleanField(default=False)
 
+    # Daily PnL rollup (see DailyPnl)
+    ROLLUP_MARKET = DailyPnl.Market.SPOT
+    VOLUME_FIELDS = ("total_cost",)
+
     # User and timestamps
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -76,6 +84,29 @@ class SpotOrder(models.Model):
         indexes = [
             models.Index(fields=["user", "status"]),
             models.Index(fields=["symbol", "created_at"]),
+            # history pages: newest first per user
+            models.Index(fields=["user", "-created_at", "-id"], name="spot_orders_user_recent_idx"),
+            # lookups by exchange id (get_or_create on entry)
+            models.Index(fields=["order_id"], name="spot_orders_order_id_idx"),
+            # opposite-signal close: open positions on a symbol/direction
+            models.Index(
+                fields=["symbol", "direction"],
+                name="spot_orders_open_signal_idx",
+                condition=Q(status="POSITION", ignore_opposite_signal=False),
+            ),
+            # signal path per user/symbol and reconciliation cron (all open positions)
+            models.Index(
+                fields=["user", "symbol"],
+                name="spot_orders_open_user_idx",
+                condition=Q(status="POSITION"),
+            ),
+            # closed trades by close time, covering PnL
+            models.Index(
+                fields=["user", "closed_at"],
+                name="spot_orders_closed_user_idx",
+                include=["pnl"],
+                condition=Q(status="CLOSED"),
+            ),
         ]
 
     def __str__(self):
@@ -86,3 +117,6 @@ class SpotOrder(models.Model):
     #         price_diff = (self.exit_price) - self.entry_price
     #         self.pnl_percentage = (price_diff / self.entry_price) * 100
     #     super().save(*args, **kwargs)
+
+    def rollup_volume(self):
+        return self.total_cost
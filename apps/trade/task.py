@@ -1,5 +1,8 @@
 from config import celery_app
-from django.db import transaction
+from celery import group
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
 
 from apps.accounts.models import UserKey, User
 from apps.trade.models import SpotOrder, FutureOrder
@@ -10,21 +13,105 @@ from apps.trade.utils.close_market_order_spot import quick_close_spot_position
 from apps.trade.utils.create_market_binance_spot_order import create_binance_spot_order
 
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
+def _active_user_ids():
+    """User ids with an active key, projected in a single query (no UserKey/User rows)."""
+    return list(
+        UserKey.objects.filter(is_active=True)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+
+
+def _chunked(items, size):
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _publish_chunked(task, args, user_ids):
+    """Publish one chunk task per SIGNAL_FANOUT_CHUNK_SIZE users as a single group,
+    reusing one broker producer for every message. Returns publish stats."""
+    started = time.perf_counter()
+    chunks = _chunked(user_ids, settings.SIGNAL_FANOUT_CHUNK_SIZE)
+    if chunks:
+        with celery_app.producer_or_acquire() as producer:
+            group(task.s(*args, chunk) for chunk in chunks).apply_async(producer=producer)
+    stats = {
+        "users": len(user_ids),
+        "chunks": len(chunks),
+        "publish_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info(f"Published {task.name} fan-out: {stats}")
+    return stats
+
+
+def _run_chunk(fn, user_ids):
+    """Call ``fn(user_id)`` for every user of a chunk concurrently.
+
+    A chunk then takes about as long as its slowest user rather than the sum
+    of all of them. Returns ``{user_id: result}``; a raised exception counts
+    as False.
+    """
+
+    def run(user_id):
+        try:
+            return fn(user_id)
+        except Exception as e:
+            logger.error(f"Chunk job for user {user_id} failed: {e}", exc_info=True)
+            return False
+        finally:
+            # Each worker thread (greenlet) holds its own DB connection
+            connection.close()
+
+    workers = max(1, min(len(user_ids), settings.SIGNAL_FANOUT_CHUNK_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk") as pool:
+        return dict(zip(user_ids, pool.map(run, user_ids)))
+
+
 @celery_app.task(bind=True)
 def create_order_of_user_controller(self, side, symbol, market, sl=None, tp=None, tps=None):
     try:
-        users_key = UserKey.objects.filter(is_active=True)
-
-        for user_key in users_key:
-            create_order_of_user.delay(side, symbol, market, user_key.user.id, sl, tp, tps)
+        user_ids = _active_user_ids()
+        if settings.SIGNAL_FANOUT_MODE == "chunked":
+            return _publish_chunked(
+                create_order_of_users_chunk, (side, symbol, market, sl, tp, tps), user_ids
+            )
+        started = time.perf_counter()
+        for user_id in user_ids:
+            create_order_of_user.delay(side, symbol, market, user_id, sl, tp, tps)
+        logger.info(
+            f"Published {len(user_ids)} order tasks in "
+            f"{(time.perf_counter() - started) * 1000:.2f}ms"
+        )
     except Exception as e:
         print(f"Error dispatching  order create: {str(e)}")
 
 
+@celery_app.task(bind=True)
+def create_order_of_users_chunk(self, side, symbol, market, sl, tp, tps, user_ids):
+    """Open orders for a chunk of users in one task, all users at once.
+
+    Orders are not retried: a failed entry may have partly reached Binance.
+    Returns how many users got an order and how many did not.
+    """
+    users = User.objects.in_bulk(user_ids)
+
+    def open_for(user_id):
+        user = users[user_id]
+        if market == "futures":
+            return create_binance_future_order(side, symbol, user, sl=sl, tp=tp, tps=tps)
+        return create_binance_spot_order(side, symbol, user, sl=sl)
+
+    results = _run_chunk(open_for, [user_id for user_id in user_ids if user_id in users])
+    failed = [user_id for user_id, ok in results.items() if not ok]
+    if failed:
+        logger.warning(f"{market} {side} {symbol} was not opened for users {failed}")
+    return {"opened": len(results) - len(failed), "failed": len(failed)}
+
+
 @celery_app.task(
     bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3
 )
@@ -96,47 +183,103 @@ def quick_close_user_order(self, order_id, market):
 @celery_app.task(bind=True)
 def handle_futures_signal_controller(self, side, symbol, sl=None, tp=None, tps=None):
     try:
-        users_key = UserKey.objects.filter(is_active=True)
-        for user_key in users_key:
-            handle_futures_signal.delay(side, symbol, user_key.user.id, sl, tp, tps)
+        user_ids = _active_user_ids()
+        if settings.SIGNAL_FANOUT_MODE == "chunked":
+            return _publish_chunked(
+                handle_futures_signal_chunk, (side, symbol, sl, tp, tps), user_ids
+            )
+        started = time.perf_counter()
+        for user_id in user_ids:
+            handle_futures_signal.delay(side, symbol, user_id, sl, tp, tps)
+        logger.info(
+            f"Published {len(user_ids)} futures signal tasks in "
+            f"{(time.perf_counter() - started) * 1000:.2f}ms"
+        )
     except Exception as e:
         logger.error(f"Error dispatching futures signal: {e}")
 
 
+def decide_futures_signal(side, open_orders):
+    """Decide what a signal means for a user's open positions on its symbol.
+
+    ``open_orders`` are the user's POSITION orders for the symbol, newest
+    first. Returns "open" (no position), "ignore" (same direction, or the user
+    pinned a position) or "flip" (close the newest position, then open).
+    """
+    if not open_orders:
+        return "open"
+    existing = open_orders[0]
+    if (side == "buy" and existing.direction == FutureOrder.TradeDirection.LONG) or (
+        side == "sell" and existing.direction == FutureOrder.TradeDirection.SHORT
+    ):
+        # Same signal: ignore
+        return "ignore"
+    # If user marked to ignore opposite signals on any open position, do nothing
+    if any(o.ignore_opposite_signal for o in open_orders):
+        return "ignore"
+    return "flip"
+
+
+def execute_futures_signal(side, symbol, user, open_orders, sl=None, tp=None, tps=None):
+    """Act on a signal for one user; returns the action taken, or "failed"."""
+    side = side.lower()
+    action = decide_futures_signal(side, open_orders)
+    if action == "open":
+        # No open trade: open new
+        opened = create_binance_future_order(side, symbol, user, sl=sl, tp=tp, tps=tps)
+    elif action == "flip":
+        # Opposite signal: close then open new
+        quick_close_position(order=open_orders[0], user=user)
+        opened = create_binance_future_order(side, symbol, user, sl=sl, tp=tp, tps=tps)
+    else:
+        opened = True
+    return action if opened else "failed"
+
+
 @celery_app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
 def handle_futures_signal(self, side, symbol, user_id, sl=None, tp=None, tps=None):
     try:
         user = User.objects.get(id=user_id)
-        side = side.lower()
         # find any open positions for user+symbol
-        open_orders = FutureOrder.objects.filter(
-            user=user,
-            symbol=symbol,
-            status=FutureOrder.TradeStatus.POSITION,
-        ).order_by("-created_at")
+        open_orders = list(
+            FutureOrder.objects.filter(
+                user=user,
+                symbol=symbol,
+                status=FutureOrder.TradeStatus.POSITION,
+            ).order_by("-created_at")
+        )
+        execute_futures_signal(side, symbol, user, open_orders, sl=sl, tp=tp, tps=tps)
+    except Exception as e:
+        print("Caught exception:", e)
+        raise self.retry(exc=e)
 
-        if not open_orders.exists():
-            # No open trade: open new
-            create_binance_future_order(side, symbol, user, sl=sl, tp=tp, tps=tps)
-            return
 
-        existing = open_orders.first()
-        if (side == "buy" and existing.direction == FutureOrder.TradeDirection.LONG) or (
-            side == "sell" and existing.direction == FutureOrder.TradeDirection.SHORT
-        ):
-            # Same signal: ignore
-            return
+@celery_app.task(bind=True)
+def handle_futures_signal_chunk(self, side, symbol, sl, tp, tps, user_ids):
+    """Run a futures signal for a chunk of users, all users at once, with one
+    query for users and one for their open positions on the symbol.
 
-        # If user marked to ignore opposite signals on any open position, do nothing
-        if open_orders.filter(ignore_opposite_signal=True).exists():
-            return
+    Returns how many users ended in each action (open/flip/ignore/failed).
+    """
+    users = User.objects.in_bulk(user_ids)
+    open_by_user = {}
+    for order in FutureOrder.objects.filter(
+        user_id__in=user_ids,
+        symbol=symbol,
+        status=FutureOrder.TradeStatus.POSITION,
+    ).order_by("-created_at"):
+        open_by_user.setdefault(order.user_id, []).append(order)
 
-        # Opposite signal: close then open new
-        quick_close_position(order=existing, user=user)
-        create_binance_future_order(side, symbol, user, sl=sl, tp=tp, tps=tps)
-    except Exception as e:
-        print("Caught exception:", e)
-        raise self.retry(exc=e)
+    def run(user_id):
+        return execute_futures_signal(
+            side, symbol, users[user_id], open_by_user.get(user_id, []), sl=sl, tp=tp, tps=tps
+        )
+
+    results = _run_chunk(run, [user_id for user_id in user_ids if user_id in users])
+    actions = [action or "failed" for action in results.values()]
+    summary = {action: actions.count(action) for action in set(actions)}
+    logger.info(f"Futures {side} {symbol} chunk of {len(results)} users: {summary}")
+    return summary
 
 
 # --- Legacy compatibility tasks -------------------------------------------------
@@ -1,3 +1,1229 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import ccxt
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from apps.accounts.models import User, UserKey
+from apps.accounts.utils.encryption import encrypt_value
+from apps.trade import task
+from apps.trade.models import DailyPnl, FutureOrder, FuturesAccountConfig, FutureTakeProfit, SpotOrder
+from apps.trade.crons import refresh_stop_loss
+from apps.trade.crons.preconfigure_futures import preconfigure_futures_accounts
+from apps.trade.utils import account_config, balances, common, market_cache, rate_limit, scheduler, webhook
+from apps.trade.utils.create_market_order import create_binance_future_order, record_futures_entry
+from apps.trade.utils.executor import AsyncClientPool, SignalExecutor
+from apps.trade.utils.filters import compile_filters
+from apps.trade.utils.history import filter_history
+from apps.trade.utils.market_data import MarketDataService, PriceCache
+from apps.trade.utils.partitions import is_partitioned, partition_name
+from apps.trade.utils.refresh_positions import apply_spot_exit
+from apps.trade.utils.user_stream import UserDataStreamService
+from apps.trade.utils.ws import LocalTransport
+
+try:
+    import lupa
+except ImportError:  # the rate limiter tests run its Lua script in process
+    lupa = None
+
+
+def partition_indexes(index_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [index_name],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class HotQueryIndexTests(TestCase):
+    """EXPLAIN the signal, cron and stats queries against a skewed data set.
+
+    Most rows are CLOSED, as in production, so each query only stays cheap
+    while it is answered from its (partial) index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f"u{i}", email=f"u{i}@example.com") for i in range(20)]
+        now = timezone.now()
+        for model, prefix in ((SpotOrder, "s"), (FutureOrder, "f")):
+            rows = []
+            for i in range(4000):
+                status = "POSITION" if i % 50 == 0 else "CLOSED"
+                rows.append(
+                    model(
+                        order_id=f"{prefix}{i}",
+                        stop_loss_order_id=f"{prefix}sl{i}",
+                        symbol=f"C{i % 30}USDT",
+                        direction="LONG" if i % 2 else "SHORT",
+                        status=status,
+                        user=cls.users[i % 20],
+                        closed_at=now - timedelta(days=i % 365) if status == "CLOSED" else None,
+                    )
+                )
+            model.objects.bulk_create(rows, batch_size=1000)
+        FutureTakeProfit.objects.bulk_create(
+            FutureTakeProfit(order=order, tp_order_id=f"tp{order.id}")
+            for order in FutureOrder.objects.all()[:2000]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Table sizes here are tiny; ask whether the index can serve the query
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertIndexScan(self, qs, index_name):
+        plan = qs.explain()
+        if connection.vendor == "postgresql":
+            # On partitioned tables the plan names the per-partition copies
+            names = {index_name} | set(partition_indexes(index_name))
+            self.assertTrue(any(name in plan for name in names), plan)
+            self.assertNotIn("Seq Scan", plan, plan)
+        else:
+            # Other planners ignore partial-index selectivity; only require an index
+            self.assertRegex(plan, r"USING (COVERING )?INDEX", plan)
+
+    def test_opposite_signal_close(self):
+        for model, table in ((SpotOrder, "spot_orders"), (FutureOrder, "future_orders")):
+            qs = model.objects.filter(
+                symbol="C1USDT", status="POSITION", direction="LONG", ignore_opposite_signal=False
+            )
+            self.assertIndexScan(qs, f"{table}_open_signal_idx")
+
+    def test_open_positions_for_signal_users(self):
+        user_ids = [u.id for u in self.users[:5]]
+        qs = FutureOrder.objects.filter(user_id__in=user_ids, symbol="C1USDT", status="POSITION")
+        self.assertIndexScan(qs, "future_orders_open_user_idx")
+
+    def test_reconciliation_open_positions(self):
+        self.assertIndexScan(FutureOrder.objects.filter(status="POSITION"), "future_orders_open_user_idx")
+
+    def test_closed_trades_by_close_time(self):
+        since = timezone.now() - timedelta(days=7)
+        for model, table in ((SpotOrder, "spot_orders"), (FutureOrder, "future_orders")):
+            qs = model.objects.filter(user=self.users[0], status="CLOSED", closed_at__gte=since)
+            self.assertIndexScan(qs, f"{table}_closed_user_idx")
+
+    def test_take_profit_fill_lookup(self):
+        qs = FutureTakeProfit.objects.filter(tp_order_id="tp1")
+        self.assertIndexScan(qs, "future_tps_tp_order_id_idx")
+
+
+@skipUnless(connection.vendor == "postgresql", "order tables are only partitioned on PostgreSQL")
+class PartitionPruningTests(TestCase):
+    """A date-filtered history query only touches the partitions of that range."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="pruned", email="pruned@example.com")
+        for month in (date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1)):
+            for model, prefix in ((SpotOrder, "s"), (FutureOrder, "f")):
+                order = model.objects.create(
+                    order_id=f"{prefix}{month:%Y%m}",
+                    stop_loss_order_id=f"{prefix}sl{month:%Y%m}",
+                    symbol="BTCUSDT",
+                    user=cls.user,
+                )
+                # auto_now_add ignores explicit values on create
+                created = datetime(month.year, month.month, 15, tzinfo=dt_timezone.utc)
+                model.objects.filter(pk=order.pk).update(created_at=created)
+
+    def test_history_date_filter_prunes_months(self):
+        spot_qs, fut_qs = filter_history(self.user, {"from": "2026-02-01", "to": "2026-02-28"})
+        for qs, table in ((spot_qs, "spot_orders"), (fut_qs, "future_orders")):
+            self.assertTrue(is_partitioned(table))
+            plan = qs.explain()
+            self.assertIn(partition_name(table, date(2026, 2, 1)), plan, plan)
+            self.assertNotIn(partition_name(table, date(2026, 1, 1)), plan, plan)
+            self.assertNotIn(partition_name(table, date(2026, 3, 1)), plan, plan)
+            self.assertEqual(qs.count(), 1)
+
+
+@override_settings(REDIS_URL="", SIGNAL_DEDUP_WINDOW=15)
+class SignalDedupTests(SimpleTestCase):
+    def test_failed_publish_releases_the_claim(self):
+        payload = {"id": "dedup-release", "symbol": "BTCUSDT", "side": "buy", "market": "spot"}
+        task = "apps.trade.utils.webhook.create_order_of_user_controller.delay"
+        with mock.patch(task, side_effect=ConnectionError("broker down")):
+            with self.assertRaises(ConnectionError):
+                webhook.dispatch_signal(payload)
+        with mock.patch(task) as delay:
+            self.assertTrue(webhook.dispatch_signal(payload))
+            self.assertFalse(webhook.dispatch_signal(payload))
+        delay.assert_called_once()
+
+
+@override_settings(REDIS_URL="", MARKET_DATA_MAX_AGE=60)
+class MarketDataStreamTests(SimpleTestCase):
+    def test_book_ticker_and_mark_frames_update_the_price_cache(self):
+        transport, cache = LocalTransport(), PriceCache()
+        service = MarketDataService("futures", transport, cache=cache, symbols=["BTCUSDT"])
+        transport.push({"stream": "btcusdt@bookTicker", "data": {"s": "BTCUSDT", "b": "100.0", "a": "102.0"}})
+        transport.push({"stream": "btcusdt@markPrice@1s", "data": {"e": "markPriceUpdate", "s": "BTCUSDT", "p": "101.5"}})
+        transport.push("not json")
+        transport.push({"result": None, "id": 1})
+        transport.disconnect()
+
+        asyncio.run(service._consume(service.stream_url(service.static_symbols)))
+        self.assertIsNone(cache.get("futures", "BTCUSDT"))
+        service.flush()
+
+        quote = cache.get("futures", "BTCUSDT")
+        self.assertEqual((quote["bid"], quote["ask"], quote["last"], quote["mark"]), (100.0, 102.0, 101.0, 101.5))
+        self.assertEqual(transport.urls, ["wss://fstream.binance.com/stream?streams=btcusdt@bookTicker/btcusdt@markPrice@1s"])
+
+
+class UserStreamFillTests(TransactionTestCase):
+    """Replay user data stream frames; fills are applied once however often they arrive."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="streamer", email="streamer@example.com")
+
+    def replay(self, market, frames):
+        transport = LocalTransport()
+        service = UserDataStreamService(market, transport)
+        for frame in frames:
+            transport.push(frame)
+        transport.disconnect()
+        # Frames are applied on worker threads, as in the daemon
+        asyncio.run(service._consume(self.user.id, None, "wss://local/ws/listen-key"))
+        return service
+
+    def test_futures_stop_loss_fill(self):
+        order = FutureOrder.objects.create(
+            order_id="f1", stop_loss_order_id="555", symbol="BTCUSDT", direction="LONG",
+            status="POSITION", order_quantity=2, entry_price=100, user=self.user,
+        )
+        fill = {"i": 555, "x": "TRADE", "X": "FILLED", "n": "0.2", "N": "USDT", "ap": "90", "L": "90"}
+        service = self.replay("futures", [
+            {"e": "ORDER_TRADE_UPDATE", "o": {**fill, "X": "PARTIALLY_FILLED", "n": "0.1"}},
+            {"e": "ORDER_TRADE_UPDATE", "o": fill},
+            # Binance may redeliver after a reconnect
+            {"e": "ORDER_TRADE_UPDATE", "o": fill},
+        ])
+        order.refresh_from_db()
+        self.assertEqual(order.status, "CLOSED")
+        self.assertAlmostEqual(float(order.stop_loss_fee), 0.3)
+        self.assertAlmostEqual(float(order.pnl), -20)
+        self.assertEqual(service.applied["sl"], 1)
+
+    def test_spot_stop_loss_fill_is_claimed_once(self):
+        order = SpotOrder.objects.create(
+            order_id="s1", stop_loss_order_id="777", symbol="BTCUSDT", direction="LONG",
+            status="POSITION", order_quantity=2, entry_price=100, user=self.user,
+        )
+        report = {"e": "executionReport", "i": 777, "x": "TRADE", "X": "FILLED",
+                  "n": "0.05", "N": "USDT", "z": "2", "Z": "180", "L": "90"}
+        stale = SpotOrder.objects.get(pk=order.pk)
+        service = self.replay("spot", [report, report])
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.stop_loss_status), ("CLOSED", "CLOSED"))
+        self.assertAlmostEqual(float(order.exit_price), 90)
+        self.assertAlmostEqual(float(order.total_fee), 0.05)
+        self.assertEqual(service.applied["sl"], 1)
+
+        # The refresh cron holding an older copy must not apply it again
+        self.assertFalse(apply_spot_exit(stale, {"average": 90, "fee": {"cost": 0.05}}))
+        order.refresh_from_db()
+        self.assertAlmostEqual(float(order.total_fee), 0.05)
+
+
+# exchangeInfo entry as CCXT keeps it under market["info"]
+BTCUSDT_INFO = {
+    "symbol": "BTCUSDT",
+    "filters": [
+        {"filterType": "PRICE_FILTER", "minPrice": "556.80", "maxPrice": "4529764", "tickSize": "0.10"},
+        {"filterType": "LOT_SIZE", "stepSize": "0.001", "maxQty": "1000", "minQty": "0.001"},
+        {"filterType": "MARKET_LOT_SIZE", "stepSize": "0.01", "maxQty": "120", "minQty": "0.01"},
+        {"filterType": "MIN_NOTIONAL", "notional": "100"},
+        {"filterType": "PERCENT_PRICE", "multiplierUp": "1.0500", "multiplierDown": "0.9500"},
+    ],
+}
+
+
+class FakeFuturesExchange:
+    """Synchronous stand-in for a binanceusdm client that records every call.
+
+    ``fail`` names the calls that raise: order types ("STOP_MARKET"), "close"
+    for reduce-only market orders, or method names such as "fetch_order". As
+    a dict it maps those names to the exception to raise. ``open_ids`` are
+    listed by ``fetch_open_orders`` and ``filled`` maps ids to the order
+    ``fetch_order`` returns; any other id is not found.
+    """
+
+    id = "binanceusdm"
+
+    def __init__(self, price=60000.0, free_usdt=1000.0, fail=(), positions=()):
+        self.price = price
+        self.free_usdt = free_usdt
+        self.fail = fail if isinstance(fail, dict) else dict.fromkeys(fail)
+        self.positions = list(positions)
+        self.open_ids = set()
+        self.filled = {}
+        self.calls = []
+        self.options = {}
+        self.last_response_headers = {}
+        self._ids = itertools.count(1)
+
+    def _call(self, name, *args):
+        self.calls.append((name, *args))
+        if name in self.fail:
+            raise self.fail[name] or ccxt.ExchangeError(f"{name} failed")
+
+    def called(self, name) -> list:
+        return [call[1:] for call in self.calls if call[0] == name]
+
+    def market_id(self, symbol):
+        return symbol.split(":")[0].replace("/", "")
+
+    def market(self, symbol):
+        return {"symbol": symbol, "info": BTCUSDT_INFO}
+
+    def fetch_ticker(self, symbol):
+        self._call("fetch_ticker", symbol)
+        return {"last": self.price}
+
+    def fapiprivatev3_get_balance(self, params=None):
+        self._call("balance")
+        return [{"asset": "USDT", "availableBalance": str(self.free_usdt)}]
+
+    def fapiprivate_get_positionside_dual(self, params=None):
+        self._call("position_mode")
+        return {"dualSidePosition": False}
+
+    def fapiprivatev2_get_positionrisk(self, params=None):
+        self._call("position_risk")
+        return self.positions
+
+    def fapiPrivatePostMarginType(self, params):
+        self._call("margin_type", params["symbol"], params["marginType"])
+
+    def fapiprivate_post_leverage(self, params):
+        self._call("leverage", params["symbol"], params["leverage"])
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        name = "close" if type == "market" and params.get("reduceOnly") else type
+        self._call(name, side, amount)
+        return {
+            "id": str(next(self._ids)),
+            "clientOrderId": params.get("clientOrderId"),
+            "average": self.price,
+            "price": params.get("stopPrice"),
+            "fee": {"cost": 0.1, "currency": "USDT"},
+        }
+
+    def create_orders(self, orders):
+        self._call("batch", len(orders))
+        placed = []
+        for order in orders:
+            try:
+                placed.append(self.create_order(**order))
+            except ccxt.ExchangeError as e:
+                placed.append({"info": {"code": -2021, "msg": str(e)}})
+        return placed
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._call("open_orders")
+        return [{"id": order_id} for order_id in sorted(self.open_ids)]
+
+    def fetch_order(self, id=None, symbol=None, params=None):
+        self._call("fetch_order", id)
+        if id in self.filled:
+            return {"id": id, "status": "closed", "remaining": 0, **self.filled[id]}
+        raise ccxt.OrderNotFound(f"order {id} not found")
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._call("cancel", id)
+        return {"id": id}
+
+
+class AsyncFuturesExchange:
+    """Async view of a FakeFuturesExchange, like ``ccxt.async_support`` clients."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def __getattr__(self, name):
+        attr = getattr(self.exchange, name)
+        if name in ("market_id", "market", "called") or not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return call
+
+
+class SymbolFiltersTests(SimpleTestCase):
+    def setUp(self):
+        self.filters = compile_filters({"symbol": "BTC/USDT:USDT", "info": BTCUSDT_INFO})
+
+    def test_price_rounds_to_nearest_tick(self):
+        self.assertEqual(self.filters.round_price(60000.04), 60000.0)
+        self.assertEqual(self.filters.round_price(60000.06), 60000.1)
+        self.assertEqual(self.filters.round_price("60000.15"), 60000.2)
+
+    def test_quantity_truncates_to_lot_step(self):
+        self.assertEqual(self.filters.round_qty(0.0129), 0.012)
+        self.assertEqual(self.filters.round_qty(0.0129, market=True), 0.01)
+        self.assertEqual(self.filters.round_qty(0.0009), 0.0)
+
+    def test_check_reports_exchange_rejections(self):
+        f = self.filters
+        self.assertIsNone(f.check(0.002, 60000))
+        self.assertIn("zero", f.check(0, 60000))
+        self.assertIn("below min", f.check(0.005, 60000, market=True))
+        self.assertIn("above max", f.check(2000, 60000))
+        self.assertIn("price", f.check(0.002, 500))
+        self.assertIn("notional", f.check(0.001, 60000))
+        self.assertIn("percent-price", f.check(0.002, 64000, reference_price=60000))
+        self.assertIsNone(f.check(0.002, 62000, reference_price=60000))
+
+    def test_ladder_drops_legs_the_exchange_would_reject(self):
+        legs = [
+            {"price": "61000.04", "percent": 50},
+            {"price": 62000, "percent": 49},
+            {"price": 63000, "percent": 1},  # 0.0001 BTC rounds to zero
+            {"price": "bad", "percent": 10},
+            {"price": 64000, "percent": 0},
+        ]
+        accepted, rejected = self.filters.round_ladder(0.01, legs)
+        self.assertEqual(
+            accepted,
+            [{"price": 61000.0, "percent": 50.0, "qty": 0.005}, {"price": 62000.0, "percent": 49.0, "qty": 0.004}],
+        )
+        self.assertEqual(
+            [reason for _, reason in rejected],
+            ["quantity is zero after rounding", "invalid price/percent", "non-positive percent"],
+        )
+
+    def test_batch_sizing_uses_market_lot(self):
+        self.assertEqual(self.filters.size_batch([0.0239, 0.001, 0.5], 60000), [0.02, None, 0.5])
+
+    def test_percent_price_by_side_keeps_each_band(self):
+        # Spot symbols carry per-side bands instead of PERCENT_PRICE
+        filters = [f for f in BTCUSDT_INFO["filters"] if f["filterType"] != "PERCENT_PRICE"]
+        filters.append({
+            "filterType": "PERCENT_PRICE_BY_SIDE",
+            "bidMultiplierUp": "1.2", "bidMultiplierDown": "0.2",
+            "askMultiplierUp": "5", "askMultiplierDown": "0.8",
+        })
+        f = compile_filters({"symbol": "BTC/USDT", "info": {"symbol": "BTCUSDT", "filters": filters}})
+        self.assertIsNone(f.check(0.002, 70000, reference_price=60000, side="buy"))
+        self.assertIn("buy percent-price", f.check(0.002, 75000, reference_price=60000, side="buy"))
+        self.assertIsNone(f.check(0.002, 75000, reference_price=60000, side="sell"))
+        self.assertIn("sell percent-price", f.check(0.01, 45000, reference_price=60000, side="sell"))
+        self.assertIsNone(f.check(0.01, 45000, reference_price=60000, side="buy"))
+        # Side unknown: the price has to pass both bands
+        self.assertIsNotNone(f.check(0.002, 75000, reference_price=60000))
+        self.assertIsNotNone(f.check(0.01, 45000, reference_price=60000))
+
+        self.assertEqual(f.round_price(60000.06, "buy"), 60000.0)
+        self.assertEqual(f.round_price(60000.01, "sell"), 60000.1)
+        accepted, rejected = f.round_ladder(0.01, [{"price": 75000, "percent": 100}], 60000, limit=True, side="sell")
+        self.assertEqual((len(accepted), rejected), (1, []))
+
+
+class DailyPnlRollupTests(TestCase):
+    """Save/close/delete deltas must leave daily_pnl exactly as a full backfill would."""
+
+    def rollup(self):
+        rows = DailyPnl.objects.order_by("market", "symbol", "day").values_list(
+            "user", "market", "symbol", "day", "realized_pnl", "wins", "closed_count", "opened_count", "volume"
+        )
+        # Deltas can leave all-zero rows behind; the backfill never writes those
+        return [row for row in rows if any(row[4:])]
+
+    def test_write_path_matches_backfill(self):
+        user = User.objects.create(username="roller", email="roller@example.com")
+        common = {"direction": "LONG", "status": "POSITION", "entry_price": 100, "order_quantity": 2, "user": user}
+        spot = SpotOrder.objects.create(order_id="s1", symbol="BTCUSDT", total_cost=200, **common)
+        kept = FutureOrder.objects.create(order_id="f1", stop_loss_order_id="sl1", symbol="ETHUSDT", **common)
+        deleted = FutureOrder.objects.create(order_id="f2", stop_loss_order_id="sl2", symbol="ETHUSDT", **common)
+        closed_on = timezone.now() - timedelta(days=2)
+
+        spot.status, spot.pnl, spot.closed_at = "CLOSED", Decimal("12.5"), closed_on
+        spot.save()
+        kept.status, kept.pnl, kept.closed_at = "CLOSED", Decimal("-3"), closed_on
+        kept.save()
+        # Re-saving with a corrected PnL moves only the difference
+        kept.pnl = Decimal("-4")
+        kept.save(update_fields=["pnl"])
+        deleted.delete()
+
+        spot_closed = DailyPnl.objects.get(market="spot", day=timezone.localdate(closed_on))
+        self.assertEqual((spot_closed.realized_pnl, spot_closed.wins, spot_closed.closed_count), (Decimal("12.5"), 1, 1))
+        futures_opened = DailyPnl.objects.get(market="futures", day=timezone.localdate())
+        self.assertEqual((futures_opened.opened_count, futures_opened.volume), (1, Decimal("200")))
+        live = self.rollup()
+
+        call_command("backfill_daily_pnl", stdout=StringIO())
+        self.assertEqual(self.rollup(), live)
+
+
+@override_settings(REDIS_URL="", RATE_LIMIT_ENABLED=False)
+class FuturesEntryProtectionTests(TestCase):
+    """An entry whose stop loss cannot be placed is unwound, or recorded as unprotected."""
+
+    LADDER = [{"price": 61000, "percent": 50}, {"price": 62000, "percent": 50}]
+
+    def setUp(self):
+        self.user = User.objects.create(username="guarded", email="guarded@example.com")
+        UserKey.objects.create(user=self.user, _api_key="key", _api_secret="secret")
+
+    def enter(self, exchange):
+        with mock.patch("apps.trade.utils.create_market_order.get_futures_exchange", return_value=exchange):
+            return create_binance_future_order("buy", "BTC/USDT:USDT", self.user, tps=self.LADDER)
+
+    def test_failed_stop_loss_unwinds_the_entry(self):
+        exchange = FakeFuturesExchange(fail={"STOP_MARKET", "fetch_order"})
+        self.assertFalse(self.enter(exchange))
+
+        placed_tps = [call for call in exchange.calls if call[0] == "TAKE_PROFIT_MARKET"]
+        self.assertEqual(len(placed_tps), 2)
+        # Both TP legs from the batch are cancelled, then the entry is closed reduce-only
+        self.assertEqual(len(exchange.called("cancel")), 2)
+        self.assertEqual(exchange.called("close"), [("sell", 0.07)])
+        self.assertLess(
+            max(i for i, call in enumerate(exchange.calls) if call[0] == "cancel"),
+            [call[0] for call in exchange.calls].index("close"),
+        )
+        self.assertFalse(FutureOrder.objects.exists())
+
+    def test_unflattened_entry_is_recorded_as_unprotected(self):
+        exchange = FakeFuturesExchange(fail={"STOP_MARKET", "fetch_order", "close"})
+        self.assertTrue(self.enter(exchange))
+
+        order = FutureOrder.objects.get(user=self.user)
+        self.assertEqual((order.status, order.stop_loss_status), ("POSITION", "FAILED"))
+        self.assertTrue(order.stop_loss_order_id.startswith("sl-"))
+        self.assertFalse(order.tps.exists())
+
+    def test_protected_entry_records_stop_and_ladder(self):
+        exchange = FakeFuturesExchange()
+        self.assertTrue(self.enter(exchange))
+
+        order = FutureOrder.objects.get(user=self.user)
+        self.assertEqual(order.stop_loss_status, "POSITION")
+        self.assertEqual(order.tps.count(), 2)
+        # SL and both TP legs go out in one batch
+        self.assertEqual(exchange.called("batch"), [(3,)])
+        self.assertEqual(exchange.called("close"), [])
+
+
+@override_settings(SIGNAL_FANOUT_CHUNK_SIZE=2, SIGNAL_FANOUT_CHUNK_CONCURRENCY=25)
+class SignalChunkTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"c{i}", email=f"c{i}@example.com") for i in range(3)]
+        self.user_ids = [u.id for u in self.users]
+
+    def test_users_are_published_in_chunks(self):
+        with mock.patch.object(task, "group") as group, mock.patch.object(task.celery_app, "producer_or_acquire"):
+            stats = task._publish_chunked(task.create_order_of_users_chunk, ("buy", "BTCUSDT", "futures"), [1, 2, 3, 4, 5])
+        signatures = list(group.call_args.args[0])
+        self.assertEqual([sig.args[-1] for sig in signatures], [[1, 2], [3, 4], [5]])
+        group.return_value.apply_async.assert_called_once()
+        self.assertEqual((stats["users"], stats["chunks"]), (5, 3))
+
+    def test_chunk_users_run_concurrently(self):
+        # Every user waits for the others; run one after another this would time out
+        barrier = threading.Barrier(len(self.users), timeout=5)
+
+        def create(side, symbol, user, **kwargs):
+            barrier.wait()
+            return True
+
+        with mock.patch.object(task, "create_binance_future_order", side_effect=create):
+            result = task.create_order_of_users_chunk("buy", "BTCUSDT", "futures", None, None, None, self.user_ids)
+        self.assertEqual(result, {"opened": 3, "failed": 0})
+
+    def test_failed_users_are_reported_not_retried(self):
+        outcomes = {self.users[0].id: True, self.users[1].id: False, self.users[2].id: RuntimeError("boom")}
+
+        def create(side, symbol, user, **kwargs):
+            outcome = outcomes[user.id]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with mock.patch.object(task, "create_binance_spot_order", side_effect=create) as create_spot, mock.patch.object(
+            task.create_order_of_user, "delay"
+        ) as retry:
+            result = task.create_order_of_users_chunk("buy", "BTCUSDT", "spot", None, None, None, self.user_ids + [0])
+        self.assertEqual(result, {"opened": 1, "failed": 2})
+        self.assertEqual(create_spot.call_count, 3)
+        retry.assert_not_called()
+
+    def test_futures_chunk_summarizes_actions(self):
+        FutureOrder.objects.create(
+            order_id="held", stop_loss_order_id="held-sl", symbol="BTCUSDT", direction="LONG", user=self.users[0]
+        )
+        FutureOrder.objects.create(
+            order_id="flip", stop_loss_order_id="flip-sl", symbol="BTCUSDT", direction="SHORT", user=self.users[1]
+        )
+        with mock.patch.object(task, "create_binance_future_order", side_effect=[True, False]) as create, mock.patch.object(
+            task, "quick_close_position"
+        ) as close:
+            summary = task.handle_futures_signal_chunk("buy", "BTCUSDT", None, None, None, self.user_ids)
+        self.assertEqual(create.call_count, 2)
+        close.assert_called_once()
+        self.assertEqual(sum(summary.values()), 3)
+        self.assertEqual(summary["ignore"], 1)
+        self.assertEqual(summary.get("failed"), 1)
+
+
+@override_settings(REDIS_URL="", RATE_LIMIT_ENABLED=False)
+class FuturesAccountConfigTests(TestCase):
+    def setUp(self):
+        account_config._memory.clear()
+        self.addCleanup(account_config._memory.clear)
+        self.user = User.objects.create(username="configured", email="configured@example.com")
+
+    def test_known_state_makes_no_calls(self):
+        exchange = FakeFuturesExchange()
+        self.assertTrue(account_config.ensure_futures_config(exchange, self.user.id, "BTC/USDT:USDT"))
+        self.assertEqual(exchange.called("margin_type"), [("BTCUSDT", "CROSSED")])
+        self.assertEqual(exchange.called("leverage"), [("BTCUSDT", 5)])
+
+        exchange.calls.clear()
+        self.assertTrue(account_config.ensure_futures_config(exchange, self.user.id, "BTC/USDT:USDT"))
+        # A fresh process finds the state in FuturesAccountConfig
+        account_config._memory.clear()
+        self.assertTrue(account_config.ensure_futures_config(exchange, self.user.id, "BTC/USDT:USDT"))
+        self.assertEqual(exchange.calls, [])
+
+        # A different leverage is applied and remembered
+        self.assertTrue(account_config.ensure_futures_config(exchange, self.user.id, "BTC/USDT:USDT", leverage=10))
+        self.assertEqual(exchange.called("leverage"), [("BTCUSDT", 10)])
+
+    def test_failed_call_is_not_remembered(self):
+        exchange = FakeFuturesExchange(fail={"leverage"})
+        self.assertFalse(account_config.ensure_futures_config(exchange, self.user.id, "BTC/USDT:USDT"))
+        self.assertFalse(FuturesAccountConfig.objects.exists())
+
+    def test_preconfigure_changes_only_mismatched_symbols(self):
+        exchange = FakeFuturesExchange(
+            positions=[
+                {"symbol": "BTCUSDT", "marginType": "cross", "leverage": "5"},
+                {"symbol": "ETHUSDT", "marginType": "isolated", "leverage": "5"},
+            ]
+        )
+        changed = account_config.preconfigure_user(exchange, self.user.id, ["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+        self.assertEqual(changed, 2)
+        self.assertEqual(len(exchange.called("position_risk")), 1)
+        self.assertEqual(exchange.called("margin_type"), [("ETHUSDT", "CROSSED"), ("SOLUSDT", "CROSSED")])
+        # ETHUSDT already had the right leverage
+        self.assertEqual(exchange.called("leverage"), [("SOLUSDT", 5)])
+        self.assertEqual(
+            set(FuturesAccountConfig.objects.values_list("symbol", "margin_type", "leverage")),
+            {("BTCUSDT", "CROSSED", 5), ("ETHUSDT", "CROSSED", 5), ("SOLUSDT", "CROSSED", 5)},
+        )
+
+    def test_preconfigure_cron_without_symbols_still_reports(self):
+        UserKey.objects.create(user=self.user, _api_key="key", _api_secret="secret")
+        with mock.patch(
+            "apps.trade.crons.preconfigure_futures.get_futures_exchange", return_value=FakeFuturesExchange()
+        ), self.assertLogs("apps.trade.crons.preconfigure_futures", "INFO") as logs:
+            preconfigure_futures_accounts()
+        self.assertIn("Futures preconfigure done, 0 symbol settings changed", logs.output[-1])
+
+    def test_leverage_rejection_forgets_only_that_symbol(self):
+        UserKey.objects.create(user=self.user, _api_key="key", _api_secret="secret")
+        for market_id in ("BTCUSDT", "ETHUSDT"):
+            account_config.record_config(self.user.id, market_id, "CROSSED", 5)
+
+        rejected = ccxt.InsufficientFunds('binanceusdm {"code":-2019,"msg":"Margin is insufficient."}')
+        exchange = FakeFuturesExchange(fail={"market": rejected})
+        with mock.patch("apps.trade.utils.create_market_order.get_futures_exchange", return_value=exchange):
+            self.assertFalse(create_binance_future_order("buy", "BTC/USDT:USDT", self.user))
+        self.assertEqual(FuturesAccountConfig.objects.count(), 2)
+
+        rejected = ccxt.ExchangeError('binanceusdm {"code":-2027,"msg":"Exceeded the maximum allowable position at current leverage."}')
+        exchange = FakeFuturesExchange(fail={"market": rejected})
+        with mock.patch("apps.trade.utils.create_market_order.get_futures_exchange", return_value=exchange):
+            self.assertFalse(create_binance_future_order("buy", "BTC/USDT:USDT", self.user))
+        self.assertEqual(list(FuturesAccountConfig.objects.values_list("symbol", flat=True)), ["ETHUSDT"])
+        self.assertIsNone(account_config.cached_config(self.user.id, "BTCUSDT"))
+        self.assertEqual(account_config.cached_config(self.user.id, "ETHUSDT"), ("CROSSED", 5))
+
+
+@override_settings(REDIS_URL="", RATE_LIMIT_ENABLED=False)
+class SignalExecutorTests(TransactionTestCase):
+    """The asyncio executor against a stubbed async exchange."""
+
+    def setUp(self):
+        account_config._memory.clear()
+        self.addCleanup(account_config._memory.clear)
+        self.user = User.objects.create(username="async", email="async@example.com")
+        self.exchange = FakeFuturesExchange()
+        pool = AsyncClientPool()
+        pool.clients[self.user.id] = AsyncFuturesExchange(self.exchange)
+        pool.users[self.user.id] = self.user
+        self.executor = SignalExecutor(concurrency=5, pool=pool)
+
+    def execute(self, side):
+        tp = 61000 if side == "buy" else 59000
+        return asyncio.run(
+            self.executor.execute({"side": side, "symbol": "BTC/USDT:USDT", "tps": [{"price": tp, "percent": 100}]})
+        )
+
+    def test_open_then_flip(self):
+        self.assertEqual(self.execute("buy"), {"open": 1})
+        order = FutureOrder.objects.get(user=self.user)
+        self.assertEqual((order.direction, float(order.order_quantity), order.stop_loss_status), ("LONG", 0.07, "POSITION"))
+        self.assertEqual(order.tps.count(), 1)
+        self.assertEqual(account_config.cached_config(self.user.id, "BTCUSDT"), ("CROSSED", 5))
+        self.assertEqual(self.exchange.called("batch"), [(2,)])
+
+        self.assertEqual(self.execute("buy"), {"ignore": 1})
+
+        self.exchange.calls.clear()
+        self.assertEqual(self.execute("sell"), {"flip": 1})
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.stop_loss_status), ("CLOSED", "CANCELLED"))
+        self.assertEqual(self.exchange.called("cancel"), [(order.stop_loss_order_id,)])
+        self.assertEqual(self.exchange.called("close"), [("sell", Decimal("0.0700000000"))])
+        # Margin and leverage are known by now
+        self.assertEqual(self.exchange.called("margin_type"), [])
+        self.assertEqual(FutureOrder.objects.get(user=self.user, status="POSITION").direction, "SHORT")
+
+    def test_failed_stop_loss_unwinds(self):
+        self.exchange.fail = dict.fromkeys(["STOP_MARKET", "fetch_order"])
+        self.assertEqual(self.execute("buy"), {"failed": 1})
+        self.assertEqual(self.exchange.called("close"), [("sell", 0.07)])
+        self.assertEqual(len(self.exchange.called("cancel")), 1)
+        self.assertFalse(FutureOrder.objects.exists())
+
+
+class ExchangeOrderIdTests(TestCase):
+    """Exchange ids stay unique without a table-wide constraint (migration 0019)."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="unique", email="unique@example.com")
+
+    def test_database_rejects_duplicate_ids(self):
+        FutureOrder.objects.create(order_id="1", stop_loss_order_id="sl1", symbol="BTCUSDT", user=self.user)
+        for fields in ({"order_id": "1", "stop_loss_order_id": "sl2"}, {"order_id": "2", "stop_loss_order_id": "sl1"}):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                FutureOrder.objects.create(symbol="BTCUSDT", user=self.user, **fields)
+        SpotOrder.objects.create(order_id="1", symbol="BTCUSDT", user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SpotOrder.objects.create(order_id="1", symbol="BTCUSDT", user=self.user)
+
+    def test_removed_stop_losses_may_repeat(self):
+        for order_id in ("1", "2"):
+            FutureOrder.objects.create(order_id=order_id, stop_loss_order_id="", symbol="BTCUSDT", user=self.user)
+        self.assertEqual(FutureOrder.objects.filter(stop_loss_order_id="").count(), 2)
+
+    def test_recording_an_entry_twice_keeps_one_row(self):
+        entry = {"id": "42", "average": 60000, "fee": {"cost": 0.1, "currency": "USDT"}}
+        legs = [{"id": "tp1", "price": 61000, "percent": 100, "qty": 0.01}]
+        first = record_futures_entry(self.user, "BTCUSDT", "buy", 0.01, entry, {"id": "sl42", "stopPrice": 59000}, legs)
+        again = record_futures_entry(self.user, "BTCUSDT", "buy", 0.01, entry, {"id": "sl42", "stopPrice": 59000}, legs)
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(FutureOrder.objects.count(), 1)
+        self.assertEqual(FutureTakeProfit.objects.count(), 1)
+
+
+class ReconcileTests(TransactionTestCase):
+    """The reconciliation cron against fake exchanges, one per user."""
+
+    def setUp(self):
+        self.users = [User.objects.create(username=f"r{i}", email=f"r{i}@example.com") for i in range(2)]
+        for i, user in enumerate(self.users):
+            UserKey.objects.create(user=user, _api_key=f"key{i}", _api_secret="secret")
+        self.exchanges = {user.id: FakeFuturesExchange() for user in self.users}
+
+    def position(self, user, order_id, sl_id, tp_ids=()):
+        order = FutureOrder.objects.create(
+            order_id=order_id, stop_loss_order_id=sl_id, symbol="BTC/USDT:USDT", direction="LONG",
+            status="POSITION", order_quantity=2, entry_price=100, user=user,
+        )
+        for tp_id in tp_ids:
+            FutureTakeProfit.objects.create(order=order, tp_order_id=tp_id, price=110, percent=50, quantity=1)
+        return order
+
+    def reconcile(self):
+        with mock.patch.object(
+            refresh_stop_loss, "get_futures_exchange", side_effect=lambda key: self.exchanges[key.user_id]
+        ):
+            return refresh_stop_loss.refresh_orders()
+
+    def test_each_user_is_reconciled_with_their_own_client(self):
+        first, second = self.users
+        self.position(first, "1", "sl1", ["tp1", "tp2"])
+        self.position(second, "2", "sl2")
+        self.exchanges[first.id].open_ids = {"sl1", "tp2"}
+        self.exchanges[second.id].open_ids = {"sl2"}
+
+        report = self.reconcile()
+
+        self.assertEqual((report["processed"], report["failed"], report["overrun"]), (2, 0, 0))
+        self.assertEqual(report["order_lookups"], 1)
+        for exchange in self.exchanges.values():
+            self.assertEqual(len(exchange.called("open_orders")), 1)
+            self.assertEqual(len(exchange.called("position_risk")), 1)
+        # Only the leg missing from the open-order set is fetched, on its owner's client
+        self.assertEqual(self.exchanges[first.id].called("fetch_order"), [("tp1",)])
+        self.assertEqual(self.exchanges[second.id].called("fetch_order"), [])
+
+    def test_fills_are_claimed_exactly_once(self):
+        user = self.users[0]
+        closed = self.position(user, "1", "sl1")
+        laddered = self.position(user, "2", "sl2", ["tp1", "tp2"])
+        exchange = self.exchanges[user.id]
+        exchange.open_ids = {"sl2", "tp2"}
+        exchange.filled = {
+            "sl1": {"average": 90, "fee": {"cost": 0.2}},
+            "tp1": {"average": 110, "fee": {"cost": 0.1}},
+        }
+        # The second pass holds the same stale rows, like a run overlapping the stream listener
+        orders = list(FutureOrder.objects.filter(user=user).prefetch_related("tps"))
+
+        claims = []
+
+        def recorder(apply):
+            def wrapper(*args):
+                claims.append((apply.__name__, apply(*args)))
+                return claims[-1][1]
+            return wrapper
+
+        with mock.patch.object(refresh_stop_loss, "apply_sl_fill", recorder(refresh_stop_loss.apply_sl_fill)), \
+                mock.patch.object(refresh_stop_loss, "apply_tp_fill", recorder(refresh_stop_loss.apply_tp_fill)):
+            refresh_stop_loss.reconcile_user_orders(exchange, orders)
+            refresh_stop_loss.reconcile_user_orders(exchange, orders)
+
+        self.assertEqual(claims.count(("apply_sl_fill", True)), 1)
+        self.assertEqual(claims.count(("apply_tp_fill", True)), 1)
+        self.assertNotIn(("apply_sl_fill", False), claims)
+        closed.refresh_from_db()
+        self.assertEqual(closed.status, "CLOSED")
+        self.assertAlmostEqual(float(closed.total_fee), 0.2)
+        laddered.refresh_from_db()
+        self.assertEqual(laddered.status, "POSITION")
+        self.assertAlmostEqual(float(laddered.total_fee), 0.1)
+        self.assertAlmostEqual(float(laddered.pnl), 10)
+
+
+class BoundedSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.monitor = scheduler.WeightMonitor(2400)
+
+    def job(self, key, label, body):
+        def run():
+            return None, body()
+        return key, label, run
+
+    def test_jobs_for_one_account_never_overlap(self):
+        active = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+        lock = threading.Lock()
+
+        def body(key):
+            def run():
+                with lock:
+                    active[key] += 1
+                    peak[key] = max(peak[key], active[key])
+                time.sleep(0.02)
+                with lock:
+                    active[key] -= 1
+                return 1
+            return run
+
+        jobs = [self.job(key, f"{key}{i}", body(key)) for i in range(4) for key in ("a", "b")]
+        stats = scheduler.run_bounded(
+            jobs, max_workers=8, per_key=1, deadline=time.monotonic() + 30, monitor=self.monitor
+        )
+        self.assertEqual((stats["processed"], stats["skipped"], stats["overrun"]), (8, 0, 0))
+        self.assertEqual(peak, {"a": 1, "b": 1})
+
+    def test_hung_job_is_reported_at_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        jobs = [
+            self.job("a", "hung", lambda: release.wait(30)),
+            # Waits for the hung job's slot until the deadline
+            self.job("a", "queued", lambda: 1),
+            self.job("b", "quick", lambda: 1),
+        ]
+        started = time.monotonic()
+        with mock.patch.object(scheduler, "DEADLINE_GRACE", 0.2):
+            stats = scheduler.run_bounded(
+                jobs, max_workers=3, per_key=1, deadline=started + 0.3, monitor=self.monitor
+            )
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(
+            (stats["processed"], stats["skipped"], stats["overrun"], stats["failed"]), (1, 1, 1, 0)
+        )
+        self.assertEqual(stats["results"], [1])
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.queued]
+
+
+class FakeRedis:
+    """Just enough of redis-py, including Lua scripts (via lupa), to run in process.
+
+    Time is ``now_ms`` and only moves when a test advances it.
+    """
+
+    def __init__(self):
+        self.now_ms = 1_700_000_000_000
+        self.values = {}
+        self.expiry = {}
+        self.lock = threading.Lock()
+        self.lua = lupa.LuaRuntime() if lupa else None
+
+    def advance(self, ms):
+        self.now_ms += ms
+
+    def _live(self, key):
+        if key in self.expiry and self.expiry[key] <= self.now_ms:
+            self.values.pop(key, None)
+            self.expiry.pop(key)
+        return key in self.values
+
+    def set(self, key, value, ex=None, px=None):
+        self.values[key] = value
+        self.expiry.pop(key, None)
+        if ex or px:
+            self.expiry[key] = self.now_ms + (px or ex * 1000)
+
+    def exists(self, key):
+        return int(self._live(key))
+
+    def delete(self, *keys):
+        return sum(self.values.pop(key, None) is not None for key in keys)
+
+    def expire(self, key, seconds):
+        self.expiry[key] = self.now_ms + seconds * 1000
+
+    def hset(self, key, mapping):
+        if not self._live(key):
+            self.values[key] = {}
+        self.values[key].update(mapping)
+
+    def hgetall(self, key):
+        state = self.values[key] if self._live(key) else {}
+        return {str(k).encode(): str(v).encode() for k, v in state.items()}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def call(self, command, key=None, *args):
+        command = command.upper()
+        if command == "TIME":
+            return self.lua.table(str(self.now_ms // 1000), str(self.now_ms % 1000 * 1000))
+        if command == "PTTL":
+            if not self._live(key):
+                return -2
+            return self.expiry[key] - self.now_ms if key in self.expiry else -1
+        if command == "HMGET":
+            state = self.values.get(key, {}) if self._live(key) else {}
+            return self.lua.table_from({i + 1: state[field] for i, field in enumerate(args) if field in state})
+        if command == "HSET":
+            self.hset(key, dict(zip(args[::2], args[1::2])))
+            return 0
+        if command == "PEXPIRE":
+            self.expiry[key] = self.now_ms + int(args[0])
+            return 1
+        raise NotImplementedError(command)
+
+    def register_script(self, source):
+        script = self.lua.eval(f"function(redis, KEYS, ARGV) {source} end")
+        redis = self.lua.table_from({"call": self.call})
+
+        def run(keys, args):
+            with self.lock:
+                return script(redis, self.lua.table_from(keys), self.lua.table_from([str(a) for a in args]))
+
+        return run
+
+
+class FakeRestClient:
+    """A CCXT client reduced to what the limiter wraps: 1000 weight a minute at full headroom."""
+
+    rateLimit = 60
+
+    def __init__(self, error=None):
+        self.error = error
+        self.last_response_headers = {}
+
+    def calculate_rate_limiter_cost(self, api, method, path, params, config):
+        return config.get("cost", 1)
+
+    def fetch2(self, path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+        if self.error:
+            raise self.error
+        return {"path": path}
+
+
+@skipUnless(lupa, "lupa is not installed")
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMIT_HEADROOM=1.0, RATE_LIMIT_MAX_WAIT=10.0,
+                   RATE_LIMIT_LOW_PRIORITY_RESERVE=0.3)
+class RateLimiterTests(SimpleTestCase):
+    """Token buckets driven through the real Lua script against an in-process Redis."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patches = [
+            mock.patch.object(rate_limit, "get_redis", return_value=self.redis),
+            mock.patch.object(rate_limit, "_script", None),
+            mock.patch.object(rate_limit, "_stats", dict.fromkeys(rate_limit._stats, 0)),
+            # Sleeping moves the fake Redis clock instead
+            mock.patch.object(rate_limit.time, "sleep", side_effect=lambda s: self.redis.advance(int(s * 1000))),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = FakeRestClient()
+
+    def acquire(self, cost, mode="shed", priority="normal"):
+        with rate_limit.rate_limit_mode(mode, priority):
+            rate_limit.acquire(self.client, "futures", "acct", cost)
+
+    def test_bucket_refills_over_time(self):
+        self.acquire(1000)
+        with self.assertRaises(rate_limit.RateLimitShed):
+            self.acquire(10)
+        self.redis.advance(600)
+        self.acquire(10)
+
+        # Waiting callers sleep exactly until the bucket holds their cost
+        self.acquire(10, mode="wait")
+        stats = rate_limit.rate_limit_stats()
+        self.assertEqual((stats["acquired"], stats["shed"], stats["waited_ms"]), (3, 1, 600))
+
+    def test_rate_limit_answer_blocks_the_market(self):
+        self.client.error = ccxt.DDoSProtection("429 Too Many Requests")
+        self.client.last_response_headers = {"Retry-After": "2"}
+        rate_limit.install_rate_limiter(self.client, "futures", "key")
+        with self.assertRaises(ccxt.DDoSProtection):
+            self.client.fetch2("ticker/price")
+        self.assertEqual(rate_limit.rate_limit_stats()["blocked"], 1)
+
+        # Every caller is held back until Retry-After passes, whatever its bucket holds
+        with self.assertRaises(rate_limit.RateLimitShed):
+            self.acquire(1)
+        self.redis.advance(2000)
+        self.acquire(1)
+
+    def test_low_priority_leaves_the_reserve_to_normal_traffic(self):
+        self.acquire(500)
+        with self.assertRaises(rate_limit.RateLimitShed):
+            self.acquire(250, priority="low")
+        self.acquire(200, priority="low")
+        # Only normal priority may spend the last 30%
+        with self.assertRaises(rate_limit.RateLimitShed):
+            self.acquire(1, priority="low")
+        self.acquire(300)
+        self.assertEqual(rate_limit.rate_limit_stats()["shed"], 2)
+
+    def test_stats_count_every_call_across_threads(self):
+        threads = [threading.Thread(target=lambda: [self.acquire(1) for _ in range(50)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(rate_limit.rate_limit_stats()["acquired"], 400)
+
+
+@override_settings(REDIS_URL="")
+class ExchangeClientPoolTests(TestCase):
+    def setUp(self):
+        self.pool = common.ExchangeClientPool(max_size=2, ttl=900)
+        self.built = []
+
+        def build(api_key, api_secret):
+            self.built.append(api_key)
+            return mock.Mock(name=api_key)
+
+        self.pool.builders = {common.FUTURES: build}
+        for patch in (
+            mock.patch.object(common, "_client_pool", self.pool),
+            mock.patch.object(common, "refresh_if_stale", side_effect=lambda exchange, market: exchange),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.keys = []
+        for i in range(3):
+            user = User.objects.create(username=f"pool{i}", email=f"pool{i}@example.com")
+            self.keys.append(UserKey.objects.create(user=user, _api_key=f"key{i}", _api_secret="secret"))
+
+    def test_lookups_reuse_the_warm_client(self):
+        first = common.get_futures_exchange(self.keys[0])
+        self.assertIs(common.get_futures_exchange(self.keys[0]), first)
+        self.assertEqual(self.built, ["key0"])
+        stats = common.exchange_pool_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 1, 1))
+
+    def test_saving_or_deleting_a_key_drops_its_clients(self):
+        key = self.keys[0]
+        stale = common.get_futures_exchange(key)
+        common.get_futures_exchange(self.keys[1])
+        key.api_key = "rotated"
+        key.save()
+        self.assertEqual(self.pool.stats()["size"], 1)
+        self.assertIsNot(common.get_futures_exchange(key), stale)
+        self.assertEqual(self.built, ["key0", "key1", "rotated"])
+
+        key.delete()
+        self.assertEqual(self.pool.stats()["size"], 1)
+
+    def test_key_changed_elsewhere_is_refreshed_on_lookup(self):
+        stale = common.get_futures_exchange(self.keys[0])
+        # Another process saved the row: only the ciphertext tells
+        UserKey.objects.filter(pk=self.keys[0].pk).update(_api_key=encrypt_value("rotated"))
+        fresh = UserKey.objects.get(pk=self.keys[0].pk)
+        self.assertIsNot(common.get_futures_exchange(fresh), stale)
+        self.assertEqual(self.pool.stats()["refreshes"], 1)
+
+    def test_least_recently_used_client_is_evicted(self):
+        clients = [common.get_futures_exchange(key) for key in self.keys[:2]]
+        common.get_futures_exchange(self.keys[0])
+        common.get_futures_exchange(self.keys[2])
+        stats = self.pool.stats()
+        self.assertEqual((stats["size"], stats["evictions"]), (2, 1))
+        self.assertIs(common.get_futures_exchange(self.keys[0]), clients[0])
+        self.assertIsNot(common.get_futures_exchange(self.keys[1]), clients[1])
+
+
+def market_filters(tick):
+    return {"BTC/USDT:USDT": {"id": "BTCUSDT", "active": True, "precision": {"price": tick}, "limits": {}}}
+
+
+@override_settings(REDIS_URL="", MARKET_CACHE_CHECK_INTERVAL=0)
+class MarketCacheTests(SimpleTestCase):
+    """The shared markets snapshot, published to the local-file fallback."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache_dir = override_settings(MARKET_CACHE_DIR=directory.name)
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+        for patch in (
+            mock.patch.dict(market_cache._snapshots, clear=True),
+            mock.patch.dict(market_cache._last_checked, clear=True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_version_follows_trading_filters_only(self):
+        base = market_filters(0.1)
+        renamed = {symbol: {**m, "id": "other"} for symbol, m in base.items()}
+        self.assertEqual(market_cache.markets_version(base), market_cache.markets_version(renamed))
+        self.assertNotEqual(market_cache.markets_version(base), market_cache.markets_version(market_filters(0.01)))
+
+    def test_clients_are_injected_and_follow_version_bumps(self):
+        first = market_cache.publish_snapshot("futures", market_filters(0.1))
+        exchange = mock.Mock(spec=["set_markets"])
+        market_cache.inject_markets(exchange, "futures")
+        exchange.set_markets.assert_called_once_with(first["markets"], None)
+        self.assertEqual(exchange.market_snapshot_version, first["version"])
+
+        market_cache.refresh_if_stale(exchange, "futures")
+        self.assertEqual(exchange.set_markets.call_count, 1)
+
+        # The cron publishes new filters from another process; this one still holds the old copy
+        second = market_cache.publish_snapshot("futures", market_filters(0.01))
+        market_cache._snapshots["futures"] = first
+        market_cache.refresh_if_stale(exchange, "futures")
+        exchange.set_markets.assert_called_with(second["markets"], None)
+        self.assertEqual(exchange.market_snapshot_version, second["version"])
+
+    def test_cold_cache_downloads_once(self):
+        def download(market):
+            time.sleep(0.05)
+            return market_cache.publish_snapshot(market, market_filters(0.1))
+
+        with mock.patch.object(market_cache, "fetch_and_publish", side_effect=download) as fetch:
+            threads = [threading.Thread(target=market_cache.get_snapshot, args=("futures",)) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        fetch.assert_called_once_with("futures")
+
+
+@override_settings(BALANCE_CACHE_MAX_AGE=30, BALANCE_STREAM_MAX_AGE=900, USER_STREAM_HEARTBEAT_INTERVAL=15)
+class BalanceCacheTests(SimpleTestCase):
+    """Free-balance snapshots shared through Redis by the stream and order sizing."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        for patch in (
+            mock.patch.object(balances, "get_redis", return_value=self.redis),
+            mock.patch.dict(balances._local, clear=True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.exchange = FakeFuturesExchange(free_usdt=1000)
+
+    def snapshot_from_stream(self, age):
+        """A snapshot another process stored ``age`` seconds ago."""
+        balances.store_balances(7, "futures", {"USDT": 250})
+        balances._local.clear()
+        self.redis.values["bal:futures:7"]["ts"] -= age
+
+    def free(self):
+        return balances.get_free_balance(self.exchange, 7, "futures")
+
+    def test_stream_snapshot_is_trusted_while_the_stream_is_alive(self):
+        balances.mark_stream_alive(7, "futures")
+        self.snapshot_from_stream(age=300)
+        self.assertEqual(self.free(), 250)
+        self.assertEqual(self.exchange.called("balance"), [])
+
+    def test_expired_heartbeat_falls_back_to_rest(self):
+        balances.mark_stream_alive(7, "futures")
+        self.snapshot_from_stream(age=300)
+        self.redis.advance(45_000)
+        self.assertEqual(self.free(), 1000)
+        self.assertEqual(len(self.exchange.called("balance")), 1)
+        # The refreshed snapshot serves the next lookup
+        self.assertEqual(self.free(), 1000)
+        self.assertEqual(len(self.exchange.called("balance")), 1)
+
+    def test_order_invalidates_unless_the_stream_will_push_the_change(self):
+        self.snapshot_from_stream(age=0)
+        balances.invalidate_balance(7, "futures")
+        self.assertEqual(self.free(), 1000)
+        self.assertEqual(len(self.exchange.called("balance")), 1)
+
+        balances.mark_stream_alive(7, "futures")
+        self.snapshot_from_stream(age=0)
+        balances.invalidate_balance(7, "futures")
+        self.assertEqual(self.free(), 250)
+        balances.invalidate_balance(7, "futures", force=True)
+        self.assertEqual(self.free(), 1000)
+        self.assertEqual(len(self.exchange.called("balance")), 2)
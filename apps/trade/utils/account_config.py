@@ -0,0 +1,197 @@
+"""Cached futures account configuration (margin type, leverage, position mode).
+
+Margin type and leverage persist on Binance until changed, so they are only
+set when the last known state (process memory, then ``FuturesAccountConfig``)
+is missing or disagrees with what the order needs. A background job
+(``apps.trade.crons.preconfigure_futures``) reconciles every active symbol
+for every user ahead of signals, so the signal path normally makes no calls.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+import ccxt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from apps.trade.models import FutureOrder, FuturesAccountConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MARGIN_MODE = "crossed"
+DEFAULT_LEVERAGE = 5
+
+# Binance answers these when the requested setting is already in place
+NO_CHANGE_ERROR_CODES = ("-4046", "-4059")
+# Order rejections meaning the symbol's leverage/margin is not what was cached
+CONFIG_ERROR_CODES = ("-2027", "-2028")
+
+_memory = {}
+_lock = threading.Lock()
+
+
+def normalize_margin_type(margin_mode: str) -> str:
+    """Map ccxt/Binance spellings ("crossed", "cross", "isolated") to CROSSED/ISOLATED."""
+    return "ISOLATED" if margin_mode.lower().startswith("isolated") else "CROSSED"
+
+
+def is_no_change_error(error: Exception) -> bool:
+    return any(code in str(error) for code in NO_CHANGE_ERROR_CODES)
+
+
+def is_config_error(error: Exception) -> bool:
+    return any(code in str(error) for code in CONFIG_ERROR_CODES)
+
+
+def config_calls(market_id: str, wanted: tuple, current: tuple | None = None) -> list:
+    """``(method, params)`` Binance calls moving a symbol from ``current`` to ``wanted``."""
+    calls = []
+    if current is None or current[0] != wanted[0]:
+        calls.append(("fapiPrivatePostMarginType", {"symbol": market_id, "marginType": wanted[0]}))
+    if current is None or current[1] != wanted[1]:
+        calls.append(("fapiprivate_post_leverage", {"symbol": market_id, "leverage": wanted[1]}))
+    return calls
+
+
+def _call_failed(symbol: str, method: str, error: Exception) -> bool:
+    """Whether a failed config call leaves the symbol misconfigured; logs it if so."""
+    if is_no_change_error(error):
+        return False
+    logger.error(f"{method} for {symbol} failed: {error}")
+    return True
+
+
+def cached_config(user_id, market_id: str):
+    """Last known (margin_type, leverage) for a user's symbol, or None."""
+    key = (user_id, market_id)
+    with _lock:
+        state = _memory.get(key)
+    if state is not None:
+        return state
+    row = (
+        FuturesAccountConfig.objects.filter(user_id=user_id, symbol=market_id)
+        .values_list("margin_type", "leverage")
+        .first()
+    )
+    if row is not None:
+        with _lock:
+            _memory[key] = tuple(row)
+    return tuple(row) if row else None
+
+
+def record_config(user_id, market_id: str, margin_type: str, leverage: int, dual_side_position=None):
+    defaults = {"margin_type": margin_type, "leverage": int(leverage)}
+    if dual_side_position is not None:
+        defaults["dual_side_position"] = dual_side_position
+    FuturesAccountConfig.objects.update_or_create(
+        user_id=user_id, symbol=market_id, defaults=defaults
+    )
+    with _lock:
+        _memory[(user_id, market_id)] = (margin_type, int(leverage))
+
+
+def forget_config(user_id, market_id: str | None = None):
+    """Drop cached state, e.g. after an order failed because of margin or leverage."""
+    with _lock:
+        for key in [k for k in _memory if k[0] == user_id and market_id in (None, k[1])]:
+            del _memory[key]
+    qs = FuturesAccountConfig.objects.filter(user_id=user_id)
+    if market_id:
+        qs = qs.filter(symbol=market_id)
+    qs.delete()
+
+
+def ensure_futures_config(
+    exchange, user_id, symbol: str, margin_mode: str = DEFAULT_MARGIN_MODE, leverage: int = DEFAULT_LEVERAGE
+) -> bool:
+    """Make sure margin type and leverage match, calling Binance only when needed.
+
+    Returns True when the state is known to be correct afterwards.
+    """
+    market_id = exchange.market_id(symbol)
+    wanted = (normalize_margin_type(margin_mode), int(leverage))
+    if cached_config(user_id, market_id) == wanted:
+        return True
+
+    ok = True
+    for method, params in config_calls(market_id, wanted):
+        try:
+            getattr(exchange, method)(params)
+        except Exception as e:
+            if _call_failed(symbol, method, e):
+                ok = False
+    if ok:
+        record_config(user_id, market_id, *wanted)
+    return ok
+
+
+async def aensure_futures_config(
+    exchange, user_id, symbol: str, margin_mode: str = DEFAULT_MARGIN_MODE, leverage: int = DEFAULT_LEVERAGE
+) -> bool:
+    """``ensure_futures_config`` for ``ccxt.async_support`` clients."""
+    market_id = exchange.market_id(symbol)
+    wanted = (normalize_margin_type(margin_mode), int(leverage))
+    if await sync_to_async(cached_config)(user_id, market_id) == wanted:
+        return True
+
+    ok = True
+    for method, params in config_calls(market_id, wanted):
+        try:
+            await getattr(exchange, method)(params)
+        except Exception as e:
+            if _call_failed(symbol, method, e):
+                ok = False
+    if ok:
+        await sync_to_async(record_config)(user_id, market_id, *wanted)
+    return ok
+
+
+def active_futures_symbols(exchange) -> list:
+    """Market ids worth pre-configuring: configured ones plus recently traded ones."""
+    since = timezone.now() - timedelta(days=settings.FUTURES_PRECONFIGURE_LOOKBACK_DAYS)
+    symbols = set(settings.FUTURES_PRECONFIGURE_SYMBOLS)
+    for symbol in (
+        FutureOrder.objects.filter(created_at__gte=since)
+        .values_list("symbol", flat=True)
+        .distinct()
+    ):
+        try:
+            symbols.add(exchange.market_id(symbol))
+        except ccxt.BadSymbol:
+            continue
+    return sorted(symbols)
+
+
+def preconfigure_user(exchange, user_id, market_ids, margin_mode=DEFAULT_MARGIN_MODE, leverage=DEFAULT_LEVERAGE) -> int:
+    """Read every symbol's state with one positionRisk call and fix mismatches.
+
+    Returns how many symbols needed a change.
+    """
+    wanted = (normalize_margin_type(margin_mode), int(leverage))
+    dual = exchange.fapiprivate_get_positionside_dual().get("dualSidePosition")
+    if dual in (True, "true"):
+        logger.warning(f"User {user_id} is in hedge mode; reduce-only orders will be rejected")
+    risk = {row["symbol"]: row for row in exchange.fapiprivatev2_get_positionrisk()}
+
+    changed = 0
+    for market_id in market_ids:
+        row = risk.get(market_id)
+        current = (
+            (normalize_margin_type(row["marginType"]), int(row["leverage"])) if row else None
+        )
+        calls = config_calls(market_id, wanted, current)
+        if calls:
+            changed += 1
+        ok = True
+        for method, params in calls:
+            try:
+                getattr(exchange, method)(params)
+            except Exception as e:
+                if _call_failed(f"user {user_id} {market_id}", method, e):
+                    ok = False
+                    break
+        if ok:
+            record_config(user_id, market_id, *wanted, dual_side_position=dual in (True, "true"))
+    return changed
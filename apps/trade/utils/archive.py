@@ -0,0 +1,203 @@
+"""Cold archive of old closed orders as Parquet files.
+
+``archive_orders`` moves CLOSED/CANCELLED orders created more than
+``ORDER_ARCHIVE_AFTER_DAYS`` ago out of the order tables. Each user, market
+and month gets one zstd-compressed Parquet file, written through
+``default_storage`` (local media, or S3 in production). Futures
+take-profit legs travel with their order in a nested ``tps`` column.
+``ArchivedOrderFile`` rows are the manifest, so readers only open the files
+whose date range overlaps their filter.
+
+The daily_pnl rollup keeps the archived orders; ``backfill_daily_pnl``
+reads them back from the archive.
+"""
+
+import io
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.trade.models import ArchivedOrderFile, DailyPnl, FutureOrder, FutureTakeProfit, SpotOrder
+from apps.trade.utils.partitions import add_months
+
+logger = logging.getLogger(__name__)
+
+SPOT, FUTURES = DailyPnl.Market.SPOT, DailyPnl.Market.FUTURES
+MODELS = {SPOT: SpotOrder, FUTURES: FutureOrder}
+ARCHIVE_STATUSES = ("CLOSED", "CANCELLED")
+
+
+def _arrow_type(field):
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.ForeignKey)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+def _columns(model, exclude=()) -> list:
+    return [
+        (field.attname, _arrow_type(field))
+        for field in model._meta.concrete_fields
+        if field.name not in exclude
+    ]
+
+
+def _leg_columns() -> list:
+    return _columns(FutureTakeProfit, exclude=("order",))
+
+
+def archive_schema(market: str):
+    columns = _columns(MODELS[market])
+    if market == FUTURES:
+        columns.append(("tps", pa.list_(pa.struct(_leg_columns()))))
+    return pa.schema(columns)
+
+
+def archive_horizon():
+    """Orders created before this may have been moved to the archive."""
+    return timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def read_archive(entry, filters=None) -> list:
+    """Rows of one archived file as dicts, optionally filtered (pyarrow DNF filters)."""
+    with default_storage.open(entry.path, "rb") as f:
+        data = f.read()
+    return pq.read_table(pa.BufferReader(data), filters=filters).to_pylist()
+
+
+def archived_rows(user, market: str, start=None, end=None, status: str = "", symbol: str = ""):
+    """Archived orders of ``user`` in one market created within [start, end], by month then id."""
+    entries = ArchivedOrderFile.objects.filter(user=user, market=market)
+    filters = []
+    if start is not None:
+        entries = entries.filter(last_created_at__gte=start)
+        filters.append(("created_at", ">=", start))
+    if end is not None:
+        entries = entries.filter(first_created_at__lte=end)
+        filters.append(("created_at", "<=", end))
+    if status:
+        filters.append(("status", "=", status))
+    if symbol:
+        filters.append(("symbol", "=", symbol))
+    for entry in entries.order_by("month"):
+        yield from read_archive(entry, filters or None)
+
+
+def _delete_file(path: str):
+    try:
+        default_storage.delete(path)
+    except Exception as e:
+        logger.warning(f"Could not delete archive file {path}: {e}")
+
+
+def _archive_month(market: str, user_id: int, month, cutoff) -> int:
+    """Move one user's archivable orders of one month into its Parquet file."""
+    model = MODELS[market]
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    end = min(datetime.combine(add_months(month, 1), datetime.min.time(), dt_timezone.utc), cutoff)
+    qs = model.objects.filter(
+        user_id=user_id, status__in=ARCHIVE_STATUSES, created_at__gte=start, created_at__lt=end
+    )
+    names = [name for name, _ in _columns(model)]
+
+    with transaction.atomic():
+        entry = (
+            ArchivedOrderFile.objects.select_for_update()
+            .filter(user_id=user_id, market=market, month=month)
+            .first()
+        )
+        rows = list(qs.order_by("id").values(*names))
+        if not rows:
+            return 0
+        ids = [row["id"] for row in rows]
+        # Legs are created after their order, never in an earlier month
+        legs_qs = FutureTakeProfit.objects.filter(order_id__in=ids, created_at__gte=start)
+        if market == FUTURES:
+            legs = defaultdict(list)
+            leg_names = [name for name, _ in _leg_columns()]
+            for leg in legs_qs.order_by("id").values("order_id", *leg_names):
+                legs[leg.pop("order_id")].append(leg)
+            for row in rows:
+                row["tps"] = legs[row["id"]]
+        if entry is not None:
+            rows = read_archive(entry) + rows
+            rows.sort(key=lambda row: row["id"])
+
+        buffer = io.BytesIO()
+        table = pa.Table.from_pylist(rows, schema=archive_schema(market))
+        pq.write_table(table, buffer, compression="zstd")
+        name = f"{settings.ORDER_ARCHIVE_PREFIX}/{market}/{user_id}/{month:%Y-%m}-{int(time.time())}.parquet"
+        path = default_storage.save(name, ContentFile(buffer.getvalue()))
+        try:
+            ArchivedOrderFile.objects.update_or_create(
+                user_id=user_id,
+                market=market,
+                month=month,
+                defaults={
+                    "path": path,
+                    "row_count": len(rows),
+                    "size_bytes": buffer.tell(),
+                    "first_created_at": min(row["created_at"] for row in rows),
+                    "last_created_at": max(row["created_at"] for row in rows),
+                },
+            )
+            if market == FUTURES:
+                legs_qs.delete()
+            # QuerySet.delete skips PnlRollupMixin, so daily_pnl keeps these orders
+            qs.filter(id__in=ids).delete()
+        except Exception:
+            _delete_file(path)
+            raise
+        if entry is not None:
+            transaction.on_commit(partial(_delete_file, entry.path))
+    return len(ids)
+
+
+def archive_orders(older_than_days: int | None = None, user_ids=None) -> dict:
+    """Archive every CLOSED/CANCELLED order created more than ``older_than_days`` ago.
+
+    Returns the number of orders archived per market.
+    """
+    if older_than_days is None:
+        older_than_days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    archived = {}
+    for market, model in MODELS.items():
+        qs = model.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=cutoff, user__isnull=False)
+        if user_ids:
+            qs = qs.filter(user_id__in=user_ids)
+        groups = (
+            qs.annotate(month=TruncMonth("created_at", tzinfo=dt_timezone.utc))
+            .values("user_id", "month")
+            .annotate(count=Count("id"))
+            .order_by("user_id", "month")
+        )
+        archived[market] = 0
+        for group in groups:
+            try:
+                archived[market] += _archive_month(market, group["user_id"], group["month"].date(), cutoff)
+            except Exception as e:
+                logger.error(
+                    f"Failed to archive {market} orders of user {group['user_id']} "
+                    f"for {group['month']:%Y-%m}: {e}"
+                )
+    return archived
@@ -0,0 +1,194 @@
+"""Per-user free-balance snapshots so order sizing skips ``fetch_balance()``.
+
+Snapshots live in Redis (with an in-process copy) keyed by user and account
+type. The user-data stream keeps them current through
+``apply_account_update`` and advertises itself with a heartbeat key; while
+that key is alive a snapshot is trusted for ``BALANCE_STREAM_MAX_AGE``.
+Without a stream a snapshot older than ``BALANCE_CACHE_MAX_AGE`` is
+refreshed with a single lightweight REST call.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from apps.trade.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_local = {}
+_lock = threading.Lock()
+
+
+def _key(user_id, market: str) -> str:
+    return f"bal:{market}:{user_id}"
+
+
+def _stream_key(user_id, market: str) -> str:
+    return f"bal:stream:{market}:{user_id}"
+
+
+def mark_stream_alive(user_id, market: str):
+    """Heartbeat from the user-data stream: its balance pushes can be trusted."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.set(_stream_key(user_id, market), 1, ex=settings.USER_STREAM_HEARTBEAT_INTERVAL * 3)
+    except Exception as e:
+        logger.warning(f"Balance stream heartbeat failed for user {user_id} ({market}): {e}")
+
+
+def mark_stream_down(user_id, market: str):
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.delete(_stream_key(user_id, market))
+    except Exception as e:
+        logger.warning(f"Could not clear balance stream heartbeat for user {user_id}: {e}")
+
+
+def _stream_alive(r, user_id, market: str) -> bool:
+    try:
+        return bool(r.exists(_stream_key(user_id, market)))
+    except Exception:
+        return False
+
+
+def store_balances(user_id, market: str, free: dict, replace: bool = False):
+    """Record free balances per asset for a user/account type."""
+    now = time.time()
+    with _lock:
+        snapshot = {} if replace else dict(_local.get((user_id, market)) or {})
+        snapshot.update({asset: float(amount) for asset, amount in free.items()})
+        snapshot["ts"] = now
+        _local[(user_id, market)] = snapshot
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline()
+        if replace:
+            pipe.delete(_key(user_id, market))
+        pipe.hset(_key(user_id, market), mapping={**free, "ts": now})
+        pipe.expire(_key(user_id, market), settings.BALANCE_CACHE_KEY_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Balance cache write failed for user {user_id} ({market}): {e}")
+
+
+def invalidate_balance(user_id, market: str, force: bool = False):
+    """Forget a snapshot, e.g. right after this process placed an order.
+
+    While the user-data stream is alive the shared snapshot is kept: the
+    stream delivers the balance change itself. ``force`` drops it anyway.
+    """
+    with _lock:
+        _local.pop((user_id, market), None)
+    r = get_redis()
+    if r is None:
+        return
+    if not force and _stream_alive(r, user_id, market):
+        return
+    try:
+        r.delete(_key(user_id, market))
+    except Exception as e:
+        logger.warning(f"Balance cache invalidation failed for user {user_id}: {e}")
+
+
+def _read(user_id, market: str) -> tuple:
+    """``(snapshot or None, max age it may be used for)``."""
+    with _lock:
+        snapshot = _local.get((user_id, market))
+    if snapshot is not None and time.time() - snapshot["ts"] <= settings.BALANCE_CACHE_MAX_AGE:
+        return snapshot, settings.BALANCE_CACHE_MAX_AGE
+    r = get_redis()
+    if r is None:
+        return snapshot, settings.BALANCE_CACHE_MAX_AGE
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.hgetall(_key(user_id, market))
+        pipe.exists(_stream_key(user_id, market))
+        raw, streaming = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Balance cache read failed for user {user_id} ({market}): {e}")
+        return snapshot, settings.BALANCE_CACHE_MAX_AGE
+    max_age = settings.BALANCE_STREAM_MAX_AGE if streaming else settings.BALANCE_CACHE_MAX_AGE
+    if not raw:
+        return None, max_age
+    return {k.decode(): float(v) for k, v in raw.items()}, max_age
+
+
+def balance_request(market: str) -> tuple:
+    """``(method, params)`` of the cheapest REST call for free balances:
+    futures /fapi/v3/balance, spot /api/v3/account with non-zero assets only."""
+    if market == "futures":
+        return "fapiprivatev3_get_balance", {}
+    return "private_get_account", {"omitZeroBalances": "true"}
+
+
+def parse_free_balances(market: str, response) -> dict:
+    if market == "futures":
+        return {row["asset"]: float(row.get("availableBalance") or 0) for row in response}
+    return {row["asset"]: float(row.get("free") or 0) for row in response.get("balances", [])}
+
+
+def fetch_free_balances(exchange, market: str) -> dict:
+    method, params = balance_request(market)
+    return parse_free_balances(market, getattr(exchange, method)(params))
+
+
+def refresh_balances(exchange, user_id, market: str) -> dict:
+    free = fetch_free_balances(exchange, market)
+    store_balances(user_id, market, free, replace=True)
+    return free
+
+
+def cached_free_balance(user_id, market: str, asset: str = "USDT"):
+    """Free balance of one asset from a fresh snapshot, or None if there is none."""
+    snapshot, max_age = _read(user_id, market)
+    if snapshot is not None and time.time() - snapshot.get("ts", 0) <= max_age:
+        return float(snapshot.get(asset, 0))
+    return None
+
+
+def get_free_balance(exchange, user_id, market: str, asset: str = "USDT") -> float:
+    """Free balance of one asset, from the snapshot when fresh, else via REST."""
+    cached = cached_free_balance(user_id, market, asset)
+    if cached is not None:
+        return cached
+    return float(refresh_balances(exchange, user_id, market).get(asset, 0))
+
+
+async def aget_free_balance(exchange, user_id, market: str, asset: str = "USDT") -> float:
+    """``get_free_balance`` for ``ccxt.async_support`` clients."""
+    cached = await asyncio.to_thread(cached_free_balance, user_id, market, asset)
+    if cached is not None:
+        return cached
+    method, params = balance_request(market)
+    free = parse_free_balances(market, await getattr(exchange, method)(params))
+    await asyncio.to_thread(store_balances, user_id, market, free, True)
+    return float(free.get(asset, 0))
+
+
+def apply_account_update(user_id, market: str, event: dict) -> bool:
+    """Apply a user-data stream balance event.
+
+    Spot ``outboundAccountPosition`` carries free amounts and is applied
+    directly. Futures ``ACCOUNT_UPDATE`` only carries wallet balances, not the
+    available margin used for sizing, so False is returned to tell the
+    caller to refresh the snapshot over REST, off the hot path.
+    """
+    event_type = event.get("e")
+    if event_type == "outboundAccountPosition":
+        free = {row["a"]: float(row["f"]) for row in event.get("B", [])}
+        if free:
+            store_balances(user_id, market, free)
+        return True
+    if event_type == "ACCOUNT_UPDATE":
+        return False
+    return True
@@ -1,6 +1,8 @@
 from apps.accounts.models import User, UserKey
 from apps.trade.models import SpotOrder
-from apps.trade.utils.common import make_spot_exchange, get_symbol_last_price
+from apps.trade.utils.common import SPOT, get_spot_exchange, get_symbol_last_price
+from apps.trade.utils.balances import invalidate_balance
+from apps.trade.utils.filters import get_symbol_filters
 
 import ccxt
 import logging
@@ -16,9 +18,7 @@ def quick_close_spot_position(order: SpotOrder, user: User):
             return False
 
         user_binance_key = UserKey.objects.get(user=user, is_active=True)
-        exchange = make_spot_exchange(
-            api_key=user_binance_key.api_key, api_secret=user_binance_key.api_secret
-        )
+        exchange = get_spot_exchange(user_binance_key)
 
         symbol = order.symbol
         quantity = float(order.final_quantity)
@@ -44,12 +44,11 @@ def quick_close_spot_position(order: SpotOrder, user: User):
             return False
 
         # Check minimum order requirements
-        market = exchange.market(symbol)
-        min_amount = float(market["limits"]["amount"]["min"])
-        if quantity < min_amount:
-            logger.error(
-                f"Order quantity {quantity} is below minimum {min_amount} for {symbol}"
-            )
+        filters = get_symbol_filters(exchange, symbol)
+        quantity = filters.round_qty(quantity, market=True)
+        reject_reason = filters.check(quantity, current_price, market=True)
+        if reject_reason:
+            logger.error(f"Close order for {symbol} rejected by exchange filters: {reject_reason}")
             return False
 
         # Execute closing order
@@ -57,6 +56,8 @@ def quick_close_spot_position(order: SpotOrder, user: User):
             symbol=symbol, type="market", side=side, amount=quantity
         )
 
+        invalidate_balance(user.id, SPOT)
+
         # Update order status and details
         order.exit_price = close_order["average"]
         order.status = SpotOrder.TradeStatus.CLOSED
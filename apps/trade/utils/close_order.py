@@ -1,21 +1,55 @@
 from apps.accounts.models import User, UserKey
 from apps.trade.models import FutureOrder
-from apps.trade.utils.common import make_futures_exchange
+from apps.trade.utils.common import FUTURES, get_futures_exchange
+from apps.trade.utils.balances import invalidate_balance
+from apps.trade.utils.protective_orders import flatten_request
 
 import ccxt
 import logging
+from django.utils import timezone
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+
+
+def apply_futures_close(order: FutureOrder, close_order: dict):
+    """Mark a futures position closed from its market close fill and save it."""
+    quantity = order.order_quantity
+    exit_avg = float(close_order.get("average") or 0)
+
+    order.status = FutureOrder.TradeStatus.CLOSED
+    # Mark SL as cancelled if we closed manually via market
+    order.stop_loss_status = FutureOrder.TradeStatus.CANCELLED
+
+    # Fee info may be missing depending on exchange response
+    fee = close_order.get("fee") or {}
+    fee_cost = fee.get("cost", 0)
+    order.total_fee = float(order.total_fee or 0) + float(fee_cost)
+
+    if order.direction == FutureOrder.TradeDirection.LONG:
+        entry_price = float(order.entry_price)
+        pnl = float(exit_avg - entry_price) * float(quantity)
+        order.pnl = pnl
+    else:
+        entry_price = float(order.entry_price)
+        pnl = float(entry_price - exit_avg) * float(quantity)
+        order.pnl = pnl
+    order.pnl_percentage = (float(order.pnl) / float(order.entry_price)) * 100
+    order.closed_at = timezone.now()
+    order.save()
+
+
+def close_request(order: FutureOrder) -> dict:
+    """Reduce-only market order closing an order's whole position."""
+    entry_side = "buy" if order.direction == FutureOrder.TradeDirection.LONG else "sell"
+    return flatten_request(order.symbol, entry_side, order.order_quantity)
+
+
 def quick_close_position(order: FutureOrder, user: User):
     try:
         user_binance_key = UserKey.objects.get(user=user, is_active=True)
-        exchange = make_futures_exchange(
-            api_key=user_binance_key.api_key, api_secret=user_binance_key.api_secret
-        )
+        exchange = get_futures_exchange(user_binance_key)
         symbol = order.symbol
-        quantity = order.order_quantity
-        side = "sell" if order.direction == FutureOrder.TradeDirection.LONG else "buy"
 
         # Cancel any protective orders
         try:
@@ -27,34 +61,9 @@ def quick_close_position(order: FutureOrder, user: User):
         except Exception:
             pass
 
-        close_order = exchange.create_order(
-            symbol=symbol,
-            type="market",
-            side=side,
-            amount=quantity,
-            params={"reduceOnly": True},
-        )
-        exit_avg = float(close_order.get("average") or 0)
-
-        order.status = FutureOrder.TradeStatus.CLOSED
-        # Mark SL as cancelled if we closed manually via market
-        order.stop_loss_status = FutureOrder.TradeStatus.CANCELLED
-
-        # Fee info may be missing depending on exchange response
-        fee = close_order.get("fee") or {}
-        fee_cost = fee.get("cost", 0)
-        order.total_fee = float(order.total_fee or 0) + float(fee_cost)
-
-        if order.direction == FutureOrder.TradeDirection.LONG:
-            entry_price = float(order.entry_price)
-            pnl = float(exit_avg - entry_price) * float(quantity)
-            order.pnl = pnl
-        else:
-            entry_price = float(order.entry_price)
-            pnl = float(entry_price - exit_avg) * float(quantity)
-            order.pnl = pnl
-        order.pnl_percentage = (float(order.pnl) / float(order.entry_price)) * 100
-        order.save()
+        close_order = exchange.create_order(**close_request(order))
+        invalidate_balance(user.id, FUTURES)
+        apply_futures_close(order, close_order)
         return print(f"Order closed successfully for user {user.username}")
     except Exception as e:
         logger.error(
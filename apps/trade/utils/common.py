@@ -1,26 +1,157 @@
 import ccxt
 import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.trade.utils.market_cache import inject_markets, refresh_if_stale
+from apps.trade.utils.market_data import get_cached_price
+from apps.trade.utils.rate_limit import install_rate_limiter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SPOT = "spot"
+FUTURES = "futures"
+
 
 def make_spot_exchange(api_key: str, api_secret: str):
-    """Create a CCXT Binance spot exchange instance and load markets."""
+    """Create a CCXT Binance spot exchange instance with markets from the shared cache."""
     exchange = ccxt.binance({"apiKey": api_key, "secret": api_secret})
-    exchange.load_markets()
-    return exchange
+    install_rate_limiter(exchange, SPOT, api_key)
+    return inject_markets(exchange, SPOT)
 
 
 def make_futures_exchange(api_key: str, api_secret: str):
-    """Create a CCXT Binance USDM futures exchange instance and load markets."""
+    """Create a CCXT Binance USDM futures exchange instance with markets from the shared cache."""
     exchange = ccxt.binanceusdm({"apiKey": api_key, "secret": api_secret})
-    exchange.load_markets()
-    return exchange
+    install_rate_limiter(exchange, FUTURES, api_key)
+    return inject_markets(exchange, FUTURES)
+
+
+class ExchangeClientPool:
+    """Per-process LRU/TTL pool of warm CCXT clients keyed by (UserKey id, market).
+
+    ``UserKey.save()`` and ``delete()`` drop the row's clients in the saving
+    process. Entries also remember a fingerprint of the encrypted credentials,
+    so other processes give a re-keyed ``UserKey`` a fresh client on its next
+    lookup.
+    """
+
+    builders = {SPOT: make_spot_exchange, FUTURES: make_futures_exchange}
+
+    def __init__(self, max_size: int = 256, ttl: float = 900.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clients = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def fingerprint(user_key) -> tuple:
+        return (user_key._api_key, user_key._api_secret)
+
+    def get(self, user_key, market: str):
+        key = (user_key.pk, market)
+        fingerprint = self.fingerprint(user_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                exchange, entry_fingerprint, created = entry
+                if entry_fingerprint != fingerprint:
+                    self.refreshes += 1
+                    del self._clients[key]
+                elif now - created > self.ttl:
+                    self.evictions += 1
+                    del self._clients[key]
+                else:
+                    self.hits += 1
+                    self._clients.move_to_end(key)
+                    return refresh_if_stale(exchange, market)
+            self.misses += 1
+
+        # Build outside the lock so a slow load_markets() does not block other users
+        exchange = self.builders[market](
+            api_key=user_key.api_key, api_secret=user_key.api_secret
+        )
+        with self._lock:
+            self._clients[key] = (exchange, fingerprint, time.monotonic())
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return exchange
+
+    def invalidate(self, user_key_id=None, market: str | None = None):
+        """Drop pooled clients for one UserKey (optionally one market) or all of them."""
+        with self._lock:
+            if user_key_id is None:
+                self._clients.clear()
+                return
+            for m in [market] if market else list(self.builders):
+                self._clients.pop((user_key_id, m), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> ExchangeClientPool:
+    global _client_pool
+    if _client_pool is None:
+        with _client_pool_lock:
+            if _client_pool is None:
+                _client_pool = ExchangeClientPool(
+                    max_size=settings.EXCHANGE_CLIENT_POOL_SIZE,
+                    ttl=settings.EXCHANGE_CLIENT_TTL,
+                )
+    return _client_pool
+
+
+def get_spot_exchange(user_key):
+    """Return a pooled, markets-loaded Binance spot client for a UserKey."""
+    return get_client_pool().get(user_key, SPOT)
+
+
+def get_futures_exchange(user_key):
+    """Return a pooled, markets-loaded Binance USDM futures client for a UserKey."""
+    return get_client_pool().get(user_key, FUTURES)
+
+
+def invalidate_exchange_clients(user_key_id=None, market: str | None = None):
+    get_client_pool().invalidate(user_key_id, market)
+
+
+def exchange_pool_stats() -> dict:
+    return get_client_pool().stats()
 
 
-def get_symbol_last_price(exchange, symbol: str):
-    """Fetch last traded price for a symbol. Returns float or False on error."""
+def get_symbol_last_price(exchange, symbol: str, max_age: float | None = None):
+    """Last price for a symbol from the streamed cache, falling back to REST when
+    the cached quote is older than ``max_age`` seconds. Returns float or False on error."""
+    cached = get_cached_price(exchange, symbol, max_age)
+    if cached:
+        return cached
     try:
         ticker = exchange.fetch_ticker(symbol)
         return ticker.get("last")
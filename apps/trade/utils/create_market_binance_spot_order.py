@@ -1,10 +1,13 @@
 from apps.accounts.models import User, UserKey
 from apps.trade.models import SpotOrder
 from apps.trade.utils.common import (
-    make_spot_exchange,
+    SPOT,
+    get_spot_exchange,
     get_symbol_last_price,
     compute_default_sl,
 )
+from apps.trade.utils.filters import get_symbol_filters
+from apps.trade.utils.balances import get_free_balance, invalidate_balance
 
 import ccxt
 import logging
@@ -18,56 +21,38 @@ def create_binance_spot_order(side: str, symbol: str, user: User, *, sl: float |
         position = 100
 
         user_binance_key = UserKey.objects.get(user=user, is_active=True)
-        exchange = make_spot_exchange(
-            api_key=user_binance_key.api_key, api_secret=user_binance_key.api_secret
-        )
+        exchange = get_spot_exchange(user_binance_key)
 
-        # Get market info for minimum order quantity check
-        market = exchange.market(symbol)
+        # Precompiled exchange filters for sizing and minimum checks
+        filters = get_symbol_filters(exchange, symbol)
         current_price_of_symbol = get_symbol_last_price(exchange, symbol)
 
         if not current_price_of_symbol:
             logger.error(f"Could not fetch current price for {symbol}")
             return False
 
-        balance = exchange.fetch_balance()
-
         if side == "buy":
             # For buy orders, we use USDT balance
-            user_balance = balance["free"]["USDT"]
+            user_balance = get_free_balance(exchange, user.id, SPOT, "USDT")
             user_usable_balance = user_balance * position / 100
             quantity = user_usable_balance / current_price_of_symbol
         else:
             # For sell orders, we use the available crypto balance
             base_currency = symbol.split("/")[0]
-            user_balance = balance["free"].get(base_currency, 0)
+            user_balance = get_free_balance(exchange, user.id, SPOT, base_currency)
             quantity = user_balance * position / 100
 
-        # Check minimum order quantity
-        min_amount = float(market["limits"]["amount"]["min"])
-        if quantity < min_amount:
-            logger.error(
-                f"Order quantity {quantity} is below minimum {min_amount} for {symbol}"
-            )
-            return False
-
-        # Check minimum notional value (price * quantity)
-        min_notional = float(market["limits"]["cost"]["min"])
+        quantity = filters.round_qty(quantity, market=True)
         notional_value = quantity * current_price_of_symbol
-        if notional_value < min_notional:
-            logger.error(
-                f"Order notional value {notional_value} is below minimum {min_notional} for {symbol}"
-            )
-            return False
-
-        quantity = float(exchange.amountToPrecision(symbol, quantity))
 
-        # Check if we have sufficient balance
-        if quantity <= 0:
-            logger.error(f"Insufficient balance for {symbol} {side} order")
+        # Check minimum quantity and notional value (price * quantity)
+        reject_reason = filters.check(quantity, current_price_of_symbol, market=True)
+        if reject_reason:
+            logger.error(f"Order for {symbol} rejected by exchange filters: {reject_reason}")
             return False
 
         order = exchange.create_order(symbol=symbol, side=side, type="market", amount=quantity)
+        invalidate_balance(user.id, SPOT)
 
         # Extract detailed fee information
         fee_details = {
@@ -81,21 +66,27 @@ def create_binance_spot_order(side: str, symbol: str, user: User, *, sl: float |
             else SpotOrder.TradeDirection.SHORT
         )
 
-        created = SpotOrder.objects.create(
+        # get_or_create: order ids are only unique per monthly partition in the database
+        created, is_new = SpotOrder.objects.get_or_create(
             order_id=order["id"],
-            entry_price=order["average"],
-            direction=position_direction,
-            order_quantity=quantity,
-            final_quantity=float(quantity) - float(fee_details["cost"]),
-            entry_fee=fee_details["cost"],
-            entry_fee_currency=fee_details["currency"],
-            total_fee=float(order["average"]) * fee_details["cost"],
-            symbol=symbol,
-            is_spot=True,
-            total_cost=notional_value,
-            exchange="binance",
-            user=user,
+            defaults=dict(
+                entry_price=order["average"],
+                direction=position_direction,
+                order_quantity=quantity,
+                final_quantity=float(quantity) - float(fee_details["cost"]),
+                entry_fee=fee_details["cost"],
+                entry_fee_currency=fee_details["currency"],
+                total_fee=float(order["average"]) * fee_details["cost"],
+                symbol=symbol,
+                is_spot=True,
+                total_cost=notional_value,
+                exchange="binance",
+                user=user,
+            ),
         )
+        if not is_new:
+            logger.warning(f"Spot order {order['id']} is already recorded as {created.id}")
+            return True
 
         # Attempt to place a protective stop-loss order for spot
         try:
@@ -104,15 +95,21 @@ def create_binance_spot_order(side: str, symbol: str, user: User, *, sl: float |
                 amount = float(created.final_quantity) or float(quantity)
                 sl_price = float(sl) if sl else compute_default_sl(order["average"], side)
                 # Binance spot typically uses STOP_LOSS_LIMIT; set price equal to stopPrice (tight limit)
-                params = {"stopPrice": float(exchange.priceToPrecision(symbol, sl_price))}
+                params = {"stopPrice": filters.round_price(sl_price, sl_side)}
                 limit_price = params["stopPrice"]  # simple approximation
+                sl_amount = filters.round_qty(amount)
+                reject_reason = filters.check(
+                    sl_amount, limit_price, reference_price=current_price_of_symbol, side=sl_side
+                )
+                if reject_reason:
+                    raise ValueError(f"stop-loss rejected by exchange filters: {reject_reason}")
                 # Place protective stop as limit stop to increase acceptance on spot markets
                 sl_created = exchange.create_order(
                     symbol=symbol,
                     side=sl_side,
                     type="STOP_LOSS_LIMIT",
-                    amount=float(exchange.amountToPrecision(symbol, amount)),
-                    price=float(exchange.priceToPrecision(symbol, limit_price)),
+                    amount=sl_amount,
+                    price=limit_price,
                     params=params,
                 )
                 try:
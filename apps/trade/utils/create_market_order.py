@@ -1,10 +1,20 @@
 from apps.accounts.models import User, UserKey
 from apps.trade.models import FutureOrder, FutureTakeProfit
 from apps.trade.utils.common import (
-    make_futures_exchange,
+    FUTURES,
+    get_futures_exchange,
     get_symbol_last_price,
     compute_default_sl,
-    opposite_side,
+)
+from apps.trade.utils.filters import get_symbol_filters
+from apps.trade.utils.balances import get_free_balance, invalidate_balance
+from apps.trade.utils.account_config import ensure_futures_config, forget_config, is_config_error
+from apps.trade.utils.protective_orders import (
+    missing_stop,
+    place_protective_orders,
+    protective_requests,
+    split_results,
+    unwind_entry,
 )
 
 import ccxt
@@ -14,35 +24,123 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def set_margin_mode(exchange, symbol, margin_mode):
-    try:
-        info = exchange.fapiprivatev2_get_positionrisk(
-            {"symbol": exchange.market_id(symbol)}
-        )[0]
-        current_margin_mode = info["marginType"]
-        if margin_mode != current_margin_mode:
-            exchange.fapiPrivatePostMarginType(
-                {
-                    "symbol": exchange.market_id(symbol),
-                    "marginType": margin_mode.upper(),
-                }
+def plan_futures_entry(
+    filters,
+    side: str,
+    current_price: float,
+    user_balance: float,
+    *,
+    sl: float | None = None,
+    tp: float | None = None,
+    tps: list | None = None,
+    leverage: int = 5,
+    position_pct: float = 90.0,
+):
+    """Size a futures entry and validate SL/TP before anything is sent.
+
+    Returns ``(quantity, tp_legs, reject_reason)``; raises ValueError when a
+    manual SL/TP sits on the wrong side of the current price.
+    """
+    user_usable_balance = (user_balance * position_pct / 100) * leverage
+    quantity = filters.round_qty(user_usable_balance / current_price, market=True)
+    cur = float(current_price)
+    reject_reason = filters.check(quantity, cur, market=True)
+    if reject_reason:
+        return quantity, [], reject_reason
+
+    # Validate manual SL/TP against current price before anything is sent,
+    # so a bad signal never leaves an unprotected position behind
+    if sl is not None:
+        s = float(sl)
+        if (side == "buy" and s >= cur) or (side == "sell" and s <= cur):
+            raise ValueError("Invalid SL relative to current price")
+    if tp is not None:
+        t = float(tp)
+        if (side == "buy" and t <= cur) or (side == "sell" and t >= cur):
+            raise ValueError("Invalid TP relative to current price")
+    for tp_def in tps or []:
+        try:
+            p = float(tp_def.get("price"))
+        except Exception:
+            continue
+        if side == "buy" and p <= cur:
+            raise ValueError("TP must be above current for long")
+        if side == "sell" and p >= cur:
+            raise ValueError("TP must be below current for short")
+
+    # tps expected as list of dicts: {"price": float, "percent": float}
+    tp_legs = []
+    if tps:
+        tp_legs, rejected = filters.round_ladder(quantity, tps)
+        for tp_def, reason in rejected:
+            logger.info(f"Dropping TP leg {tp_def} for {filters.symbol}: {reason}")
+    return quantity, tp_legs, None
+
+
+def record_futures_entry(
+    user: User, symbol: str, side: str, quantity, order, sl_order, created_tps, *, leverage: int = 5
+) -> FutureOrder:
+    """Persist a filled futures entry with its SL and TP children.
+
+    A ``missing_stop`` SL is recorded with stop_loss_status FAILED, marking a
+    position left open on Binance without protection. An order id that is
+    already recorded returns the existing row: the database only rejects
+    duplicates within one monthly partition.
+    """
+    position_direction = (
+        FutureOrder.TradeDirection.LONG
+        if side == "buy"
+        else FutureOrder.TradeDirection.SHORT
+    )
+
+    fee = order.get("fee") or {}
+    entry_fee = fee.get("cost", 0)
+    entry_fee_currency = fee.get("currency", "USDT")
+    total_fee = fee.get("cost", 0)
+
+    stop_loss_price = (
+        sl_order.get("price")
+        or sl_order.get("stopPrice")
+        or sl_order.get("triggerPrice")
+    )
+
+    fobj, created = FutureOrder.objects.get_or_create(
+        order_id=order["id"],
+        defaults=dict(
+            symbol=symbol,
+            direction=position_direction,
+            leverage=leverage,
+            order_quantity=quantity,
+            entry_price=order["average"],
+            entry_fee=entry_fee,
+            entry_fee_currency=entry_fee_currency,
+            total_fee=total_fee,
+            stop_loss_order_id=sl_order["id"],
+            stop_loss_price=stop_loss_price,
+            stop_loss_status=(
+                FutureOrder.TradeStatus.FAILED
+                if sl_order.get("missing")
+                else FutureOrder.TradeStatus.POSITION
+            ),
+            user=user,
+        ),
+    )
+    if not created:
+        logger.warning(f"Futures order {order['id']} is already recorded as {fobj.id}")
+        return fobj
+
+    # Persist multiple TP children if any
+    if created_tps:
+        for item in created_tps:
+            FutureTakeProfit.objects.create(
+                order=fobj,
+                tp_order_id=item["id"],
+                price=item["price"],
+                percent=item["percent"],
+                quantity=item["qty"],
+                status=FutureTakeProfit.TradeStatus.POSITION,
             )
-    except Exception as e:
-        logger.error(f"Error setting margin mode for {symbol}: {e}")
-        return False
-
-
-def apply_leverage(exchange, symbol, leverage):
-    try:
-        exchange.fapiprivate_post_leverage(
-            {
-                "symbol": exchange.market_id(symbol),
-                "leverage": leverage,
-            }
-        )
-    except Exception as e:
-        logger.error(f"Error applying leverage for {symbol}: {e}")
-        return False
+    return fobj
 
 
 def create_binance_future_order(
@@ -62,169 +160,81 @@ def create_binance_future_order(
         position = position_pct
 
         user_binance_key = UserKey.objects.get(user=user, is_active=True)
-        exchange = make_futures_exchange(
-            api_key=user_binance_key.api_key, api_secret=user_binance_key.api_secret
-        )
+        exchange = get_futures_exchange(user_binance_key)
 
         current_price_of_symbol = get_symbol_last_price(exchange, symbol)
-        balance = exchange.fetch_balance()
-        user_balance = balance["free"]["USDT"]
-
-        user_usable_balance = (user_balance * position / 100) * leverage
-        print(user_usable_balance, current_price_of_symbol)
-        quantity = user_usable_balance / current_price_of_symbol
-        quantity = exchange.amountToPrecision(symbol, quantity)
+        user_balance = get_free_balance(exchange, user.id, FUTURES, "USDT")
 
-        set_margin_mode(exchange, symbol, margin_mode)
-        apply_leverage(exchange, symbol, leverage)
-
-        order = exchange.create_order(
-            symbol=symbol, side=side, type="market", amount=quantity
+        filters = get_symbol_filters(exchange, symbol)
+        logger.debug(
+            f"{symbol} futures entry: notional {(user_balance * position / 100) * leverage} "
+            f"at {current_price_of_symbol}"
+        )
+        quantity, tp_legs, reject_reason = plan_futures_entry(
+            filters,
+            side,
+            current_price_of_symbol,
+            user_balance,
+            sl=sl,
+            tp=tp,
+            tps=tps,
+            leverage=leverage,
+            position_pct=position,
         )
+        if reject_reason:
+            logger.warning(
+                f"Skipping futures {side} {symbol} for {user.username}: {reject_reason}"
+            )
+            return False
+
+        ensure_futures_config(exchange, user.id, symbol, margin_mode, leverage)
 
-        inv_side = opposite_side(side)
-        # Validate manual SL/TP against current price to avoid immediate triggers
-        cur = float(current_price_of_symbol)
-        if sl is not None:
-            s = float(sl)
-            if (side == "buy" and s >= cur) or (side == "sell" and s <= cur):
-                raise ValueError("Invalid SL relative to current price")
-        if tp is not None:
-            t = float(tp)
-            if (side == "buy" and t <= cur) or (side == "sell" and t >= cur):
-                raise ValueError("Invalid TP relative to current price")
+        try:
+            order = exchange.create_order(
+                symbol=symbol, side=side, type="market", amount=quantity
+            )
+        except ccxt.ExchangeError as e:
+            if is_config_error(e):
+                # Leverage/margin was changed outside the bot; re-check this symbol next time
+                forget_config(user.id, exchange.market_id(symbol))
+            raise
+        invalidate_balance(user.id, FUTURES)
 
         # Stop loss: provided or default 1%
         stop_price = (
             float(sl) if sl is not None else compute_default_sl(order["average"], side)
         )
-        sl_order = exchange.create_order(
-            symbol=symbol,
-            side=inv_side,
-            type="STOP_MARKET",
-            amount=quantity,
-            params={
-                "stopPrice": float(exchange.priceToPrecision(symbol, stop_price)),
-                "reduceOnly": True,
-            },
-        )
-
-        # Optional single TP or multiple TPs
-        tp_order = None
-        created_tps = []
-        base_qty = float(quantity)
-        if tps:
-            # tps expected as list of dicts: {"price": float, "percent": float}
-            market_info = exchange.market(symbol)
-            min_amount = float(
-                (market_info.get("limits") or {}).get("amount", {}).get("min") or 0
-            )
-            min_cost = float(
-                (market_info.get("limits") or {}).get("cost", {}).get("min") or 0
-            )
-            for tp_def in tps:
-                try:
-                    p = float(tp_def.get("price"))
-                    pct = float(tp_def.get("percent"))
-                except Exception:
-                    continue
-                if pct <= 0:
-                    continue
-                # Validate direction
-                if side == "buy" and p <= cur:
-                    raise ValueError("TP must be above current for long")
-                if side == "sell" and p >= cur:
-                    raise ValueError("TP must be below current for short")
-                part_qty = base_qty * (pct / 100.0)
-                part_qty_p = float(exchange.amountToPrecision(symbol, part_qty))
-                stop_p = float(exchange.priceToPrecision(symbol, p))
-                if part_qty_p <= 0:
-                    continue
-                if min_amount and part_qty_p < min_amount:
-                    continue
-                if min_cost and (part_qty_p * stop_p) < min_cost:
-                    continue
-                try:
-                    tp_o = exchange.create_order(
-                        symbol=symbol,
-                        side=inv_side,
-                        type="TAKE_PROFIT_MARKET",
-                        amount=part_qty_p,
-                        params={"stopPrice": stop_p, "reduceOnly": True},
-                    )
-                    created_tps.append(
-                        {
-                            "id": tp_o.get("id", ""),
-                            "price": stop_p,
-                            "percent": pct,
-                            "qty": part_qty_p,
-                        }
-                    )
-                except Exception:
-                    continue
-        elif tp is not None:
-            # Map single TP to a child TP covering 100%
-            tp_price = float(exchange.priceToPrecision(symbol, float(tp)))
-            tp_o = exchange.create_order(
-                symbol=symbol,
-                side=inv_side,
-                type="TAKE_PROFIT_MARKET",
-                amount=quantity,
-                params={"stopPrice": tp_price, "reduceOnly": True},
-            )
-            created_tps.append(
+        # Optional single TP maps to a child TP covering 100%
+        if not tps and tp is not None:
+            tp_legs = [
                 {
-                    "id": tp_o.get("id", ""),
-                    "price": tp_price,
+                    "price": filters.round_price(float(tp)),
                     "percent": 100.0,
                     "qty": float(quantity),
                 }
-            )
-
-        position_direction = (
-            FutureOrder.TradeDirection.LONG
-            if side == "buy"
-            else FutureOrder.TradeDirection.SHORT
-        )
-
-        fee = order.get("fee") or {}
-        entry_fee = fee.get("cost", 0)
-        entry_fee_currency = fee.get("currency", "USDT")
-        total_fee = fee.get("cost", 0)
+            ]
 
-        stop_loss_price = (
-            sl_order.get("price")
-            or sl_order.get("stopPrice")
-            or sl_order.get("triggerPrice")
+        # SL and TP ladder go out together in batches of up to 5
+        requests = protective_requests(
+            symbol, side, quantity, filters.round_price(stop_price), tp_legs
         )
-
-        fobj = FutureOrder.objects.create(
-            order_id=order["id"],
-            symbol=symbol,
-            direction=position_direction,
-            leverage=5,
-            order_quantity=quantity,
-            entry_price=order["average"],
-            entry_fee=entry_fee,
-            entry_fee_currency=entry_fee_currency,
-            total_fee=total_fee,
-            stop_loss_order_id=sl_order["id"],
-            stop_loss_price=stop_loss_price,
-            user=user,
+        results = place_protective_orders(exchange, requests)
+        sl_order, created_tps = split_results(requests, results)
+        if sl_order is None:
+            logger.error(
+                f"Stop loss for {symbol} was not placed for {user.username}, unwinding the entry"
+            )
+            closed = unwind_entry(exchange, symbol, side, quantity, created_tps)
+            invalidate_balance(user.id, FUTURES)
+            if closed is not None:
+                return False
+            # Still open on Binance: keep a record, flagged as unprotected
+            sl_order, created_tps = missing_stop(requests[0]), []
+
+        record_futures_entry(
+            user, symbol, side, quantity, order, sl_order, created_tps, leverage=leverage
         )
 
-        # Persist multiple TP children if any
-        if created_tps:
-            for item in created_tps:
-                FutureTakeProfit.objects.create(
-                    order=fobj,
-                    tp_order_id=item["id"],
-                    price=item["price"],
-                    percent=item["percent"],
-                    quantity=item["qty"],
-                    status=FutureTakeProfit.TradeStatus.POSITION,
-                )
-
         return True
 
     except Exception as e:
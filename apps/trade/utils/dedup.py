@@ -0,0 +1,100 @@
+"""Drop repeated webhook signals before anything is published.
+
+A signal is identified by its ``id``/``signal_id`` field when the alert
+carries one, otherwise by a hash of the canonical payload. The first
+sighting claims the key for ``SIGNAL_DEDUP_WINDOW`` seconds with Redis
+``SET NX EX``; without Redis an in-process table does the same job.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from apps.trade.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+DROPPED_KEY = "signals:dedup:dropped"
+
+_seen = {}
+_lock = threading.Lock()
+_stats = {"accepted": 0, "dropped": 0}
+
+
+def signal_key(payload: dict) -> str:
+    signal_id = payload.get("id") or payload.get("signal_id")
+    if signal_id:
+        return f"signals:dedup:id:{signal_id}"
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f"signals:dedup:hash:{hashlib.sha1(canonical.encode()).hexdigest()}"
+
+
+def _claim_local(key: str, window: int) -> bool:
+    now = time.monotonic()
+    with _lock:
+        if len(_seen) > 10000:
+            for k in [k for k, expires in _seen.items() if expires <= now]:
+                del _seen[k]
+        if _seen.get(key, 0) > now:
+            return False
+        _seen[key] = now + window
+        return True
+
+
+def claim_signal(payload: dict) -> bool:
+    """Return True the first time a signal is seen within the window, False for repeats."""
+    window = settings.SIGNAL_DEDUP_WINDOW
+    if window <= 0:
+        return True
+    key = signal_key(payload)
+    client = get_redis()
+    fresh = None
+    if client is not None:
+        try:
+            fresh = bool(client.set(key, 1, nx=True, ex=window))
+        except Exception as e:
+            logger.warning(f"Redis dedup unavailable, using local table: {e}")
+    if fresh is None:
+        fresh = _claim_local(key, window)
+
+    with _lock:
+        _stats["accepted" if fresh else "dropped"] += 1
+    if not fresh:
+        logger.warning(f"Dropped duplicate signal {key}")
+        if client is not None:
+            try:
+                client.incr(DROPPED_KEY)
+            except Exception:
+                pass
+    return fresh
+
+
+def release_signal(payload: dict):
+    """Forget a claim, so a retry of a signal that failed to publish is accepted."""
+    if settings.SIGNAL_DEDUP_WINDOW <= 0:
+        return
+    key = signal_key(payload)
+    with _lock:
+        _seen.pop(key, None)
+    client = get_redis()
+    if client is not None:
+        try:
+            client.delete(key)
+        except Exception as e:
+            logger.warning(f"Could not release dedup key {key}: {e}")
+
+
+def dedup_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    client = get_redis()
+    if client is not None:
+        try:
+            stats["dropped_total"] = int(client.get(DROPPED_KEY) or 0)
+        except Exception:
+            pass
+    return stats
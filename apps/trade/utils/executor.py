@@ -0,0 +1,245 @@
+"""Asyncio futures signal executor.
+
+A long-running process (``manage.py run_executor``) keeps a warm
+``ccxt.async_support`` client for every active UserKey, pops signals from a
+Redis list and runs the open/close/flip decision for all users of a signal
+concurrently under a bounded semaphore. The decision is the same
+``decide_futures_signal`` used by the Celery path. Requests are built and
+answers interpreted by the same helpers (``plan_futures_entry``,
+``config_calls``, ``balance_request``, ``close_request``, the protective
+order batches), and results are written through the same model helpers.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+import ccxt.async_support as ccxt_async
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.accounts.models import UserKey
+from apps.trade.models import FutureOrder
+from apps.trade.task import decide_futures_signal, handle_futures_signal_controller
+from apps.trade.utils.account_config import aensure_futures_config, forget_config, is_config_error
+from apps.trade.utils.balances import aget_free_balance, invalidate_balance
+from apps.trade.utils.close_order import apply_futures_close, close_request
+from apps.trade.utils.common import FUTURES, compute_default_sl
+from apps.trade.utils.create_market_order import plan_futures_entry, record_futures_entry
+from apps.trade.utils.filters import get_symbol_filters
+from apps.trade.utils.market_cache import get_snapshot
+from apps.trade.utils.market_data import get_cached_price
+from apps.trade.utils.rate_limit import install_rate_limiter
+from apps.trade.utils.protective_orders import (
+    aplace_protective_orders,
+    aunwind_entry,
+    missing_stop,
+    protective_requests,
+    split_results,
+)
+from apps.trade.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# All ORM work of the executor runs on sync_to_async's single thread
+_close_old_connections = sync_to_async(close_old_connections)
+
+
+def enqueue_signal(side, symbol, sl=None, tp=None, tps=None):
+    """Hand a futures signal to the executor process (used by the webhook)."""
+    client = get_redis()
+    if client is None:
+        # The executor reads its queue from Redis; without it use the Celery path
+        logger.warning("SIGNAL_EXECUTION_MODE=executor needs REDIS_URL, publishing to Celery instead")
+        handle_futures_signal_controller.delay(side, symbol, sl, tp, tps)
+        return
+    payload = {"side": side, "symbol": symbol, "sl": sl, "tp": tp, "tps": tps}
+    client.rpush(settings.EXECUTOR_QUEUE, json.dumps(payload))
+
+
+@sync_to_async
+def _load_active_keys():
+    return list(UserKey.objects.filter(is_active=True).select_related("user"))
+
+
+@sync_to_async
+def _load_open_orders(symbol, user_ids):
+    open_by_user = {}
+    for order in FutureOrder.objects.filter(
+        user_id__in=user_ids,
+        symbol=symbol,
+        status=FutureOrder.TradeStatus.POSITION,
+    ).order_by("-created_at"):
+        open_by_user.setdefault(order.user_id, []).append(order)
+    return open_by_user
+
+
+class AsyncClientPool:
+    """Warm async futures clients for every active UserKey, keyed by user id."""
+
+    def __init__(self):
+        self.clients = {}
+        self.users = {}
+        self._fingerprints = {}
+
+    async def refresh(self):
+        snapshot = await asyncio.to_thread(get_snapshot, FUTURES)
+        active = {key.user_id: key for key in await _load_active_keys()}
+
+        for user_id in set(self.clients) - set(active):
+            await self.clients.pop(user_id).close()
+            self._fingerprints.pop(user_id, None)
+            self.users.pop(user_id, None)
+
+        for user_id, key in active.items():
+            fingerprint = (key._api_key, key._api_secret)
+            exchange = self.clients.get(user_id)
+            if exchange is None or self._fingerprints.get(user_id) != fingerprint:
+                if exchange is not None:
+                    await exchange.close()
+                exchange = ccxt_async.binanceusdm(
+                    {"apiKey": key.api_key, "secret": key.api_secret}
+                )
+                install_rate_limiter(exchange, FUTURES, key.api_key)
+                self.clients[user_id] = exchange
+                self._fingerprints[user_id] = fingerprint
+            if getattr(exchange, "market_snapshot_version", None) != snapshot["version"]:
+                exchange.set_markets(snapshot["markets"], snapshot["currencies"] or None)
+                exchange.market_snapshot_version = snapshot["version"]
+            self.users[user_id] = key.user
+
+    async def close(self):
+        await asyncio.gather(*(ex.close() for ex in self.clients.values()), return_exceptions=True)
+        self.clients.clear()
+
+
+class SignalExecutor:
+    def __init__(self, concurrency: int | None = None, pool: AsyncClientPool | None = None):
+        self.pool = pool or AsyncClientPool()
+        self.semaphore = asyncio.Semaphore(concurrency or settings.EXECUTOR_CONCURRENCY)
+
+    async def _last_price(self, exchange, symbol):
+        cached = await asyncio.to_thread(get_cached_price, exchange, symbol)
+        if cached:
+            return cached
+        ticker = await exchange.fetch_ticker(symbol)
+        return ticker.get("last")
+
+    async def close_position(self, exchange, user, order):
+        if order.stop_loss_order_id:
+            try:
+                await exchange.cancel_order(id=order.stop_loss_order_id, symbol=order.symbol)
+            except Exception:
+                pass
+        close_order = await exchange.create_order(**close_request(order))
+        await asyncio.to_thread(invalidate_balance, user.id, FUTURES)
+        await sync_to_async(apply_futures_close)(order, close_order)
+
+    async def open_position(self, exchange, user, side, symbol, sl=None, tp=None, tps=None, leverage=5):
+        current_price, user_balance = await asyncio.gather(
+            self._last_price(exchange, symbol), aget_free_balance(exchange, user.id, FUTURES, "USDT")
+        )
+        filters = get_symbol_filters(exchange, symbol)
+        quantity, tp_legs, reject_reason = plan_futures_entry(
+            filters, side, current_price, user_balance, sl=sl, tp=tp, tps=tps, leverage=leverage
+        )
+        if reject_reason:
+            logger.warning(f"Skipping futures {side} {symbol} for {user.username}: {reject_reason}")
+            return False
+
+        await aensure_futures_config(exchange, user.id, symbol, leverage=leverage)
+        try:
+            order = await exchange.create_order(symbol=symbol, side=side, type="market", amount=quantity)
+        except ccxt_async.ExchangeError as e:
+            if is_config_error(e):
+                # Leverage/margin was changed outside the bot; re-check this symbol next time
+                await sync_to_async(forget_config)(user.id, exchange.market_id(symbol))
+            raise
+        await asyncio.to_thread(invalidate_balance, user.id, FUTURES)
+
+        stop_price = float(sl) if sl is not None else compute_default_sl(order["average"], side)
+        if not tps and tp is not None:
+            tp_legs = [{"price": filters.round_price(float(tp)), "percent": 100.0, "qty": float(quantity)}]
+        requests = protective_requests(symbol, side, quantity, filters.round_price(stop_price), tp_legs)
+        results = await aplace_protective_orders(exchange, requests)
+        sl_order, created_tps = split_results(requests, results)
+        if sl_order is None:
+            logger.error(f"Stop loss for {symbol} was not placed for {user.username}, unwinding the entry")
+            closed = await aunwind_entry(exchange, symbol, side, quantity, created_tps)
+            await asyncio.to_thread(invalidate_balance, user.id, FUTURES)
+            if closed is not None:
+                return False
+            # Still open on Binance: keep a record, flagged as unprotected
+            sl_order, created_tps = missing_stop(requests[0]), []
+
+        await sync_to_async(record_futures_entry)(
+            user, symbol, side, quantity, order, sl_order, created_tps, leverage=leverage
+        )
+        return True
+
+    async def _run_user(self, user_id, side, symbol, open_orders, sl, tp, tps):
+        exchange = self.pool.clients[user_id]
+        user = self.pool.users[user_id]
+        async with self.semaphore:
+            try:
+                action = decide_futures_signal(side, open_orders)
+                if action == "flip":
+                    await self.close_position(exchange, user, open_orders[0])
+                if action in ("open", "flip"):
+                    if not await self.open_position(exchange, user, side, symbol, sl=sl, tp=tp, tps=tps):
+                        return "failed"
+                return action
+            except Exception as e:
+                logger.error(f"Executor failed futures {side} {symbol} for {user.username}: {e}", exc_info=True)
+                return "error"
+
+    async def execute(self, signal: dict):
+        side = signal["side"].lower()
+        symbol = signal["symbol"]
+        started = time.perf_counter()
+        user_ids = list(self.pool.clients)
+        open_by_user = await _load_open_orders(symbol, user_ids)
+        results = await asyncio.gather(
+            *(
+                self._run_user(
+                    user_id, side, symbol, open_by_user.get(user_id, []),
+                    signal.get("sl"), signal.get("tp"), signal.get("tps"),
+                )
+                for user_id in user_ids
+            )
+        )
+        summary = {action: results.count(action) for action in set(results)}
+        logger.info(
+            f"Executed {side} {symbol} for {len(user_ids)} users in "
+            f"{(time.perf_counter() - started) * 1000:.0f}ms: {summary}"
+        )
+        return summary
+
+    async def run(self, stop_event: asyncio.Event | None = None):
+        stop_event = stop_event or asyncio.Event()
+        redis_conn = aioredis.Redis.from_url(settings.REDIS_URL)
+        await self.pool.refresh()
+        last_refresh = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                # Long-running process: drop connections the server closed or
+                # that outlived CONN_MAX_AGE, as Django does around each request
+                await _close_old_connections()
+                if time.monotonic() - last_refresh > settings.EXECUTOR_CLIENT_REFRESH_INTERVAL:
+                    await self.pool.refresh()
+                    last_refresh = time.monotonic()
+                item = await redis_conn.blpop(settings.EXECUTOR_QUEUE, timeout=1)
+                if item is None:
+                    continue
+                try:
+                    signal = json.loads(item[1])
+                except ValueError:
+                    logger.error(f"Dropping malformed executor signal: {item[1]!r}")
+                    continue
+                await self.execute(signal)
+        finally:
+            await redis_conn.aclose()
+            await self.pool.close()
@@ -0,0 +1,153 @@
+"""Streaming trade-history export (CSV or NDJSON).
+
+Rows are read with ``QuerySet.iterator()``, which uses a server-side
+cursor on Postgres. Futures take-profit legs come from a second cursor
+ordered by parent and are merged alongside their orders, so memory stays
+flat however many rows are exported. Archived orders are read back from
+their Parquet files one month at a time.
+"""
+
+import csv
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+
+from apps.trade.models import FutureTakeProfit
+
+FIELDS = (
+    "market", "id", "parent_id", "order_id", "symbol", "direction", "status",
+    "quantity", "percent", "entry_price", "exit_price", "pnl", "pnl_percentage",
+    "total_fee", "stop_loss_price", "stop_loss_status", "created_at", "closed_at",
+)
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+CHUNK_SIZE = 2000
+
+_ORDER_COLUMNS = (
+    "id", "order_id", "symbol", "direction", "status", "entry_price", "pnl",
+    "pnl_percentage", "total_fee", "stop_loss_price", "stop_loss_status",
+    "created_at", "closed_at",
+)
+
+
+def _spot_row(o: dict) -> dict:
+    row = {column: o[column] for column in _ORDER_COLUMNS + ("exit_price",)}
+    row["quantity"] = o["final_quantity"] or o["order_quantity"]
+    return {"market": "spot", **row}
+
+
+def _spot_rows(spot_qs):
+    columns = _ORDER_COLUMNS + ("order_quantity", "final_quantity", "exit_price")
+    for o in spot_qs.order_by("id").values(*columns).iterator(chunk_size=CHUNK_SIZE):
+        yield _spot_row(o)
+
+
+def _futures_row(o: dict) -> dict:
+    row = {column: o[column] for column in _ORDER_COLUMNS}
+    row["quantity"] = o["order_quantity"]
+    return {"market": "futures", **row}
+
+
+def _leg_row(o: dict, leg: dict) -> dict:
+    return {
+        "market": "futures_tp",
+        "id": leg["id"],
+        "parent_id": o["id"],
+        "order_id": leg["tp_order_id"],
+        "symbol": o["symbol"],
+        "status": leg["status"],
+        "quantity": leg["quantity"],
+        "percent": leg["percent"],
+        "exit_price": leg["price"],
+        "total_fee": leg["fee"],
+        "created_at": leg["created_at"],
+    }
+
+
+def _futures_rows(fut_qs):
+    orders = fut_qs.order_by("id").values(*_ORDER_COLUMNS, "order_quantity")
+    legs = (
+        FutureTakeProfit.objects.filter(order__in=fut_qs.order_by().values("id"))
+        .order_by("order_id", "id")
+        .values("id", "order_id", "tp_order_id", "price", "percent", "quantity", "status", "fee", "created_at")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    leg = next(legs, None)
+    for o in orders.iterator(chunk_size=CHUNK_SIZE):
+        yield _futures_row(o)
+        # Both cursors are ordered by parent id: emit this order's legs
+        while leg is not None and leg["order_id"] <= o["id"]:
+            if leg["order_id"] == o["id"]:
+                yield _leg_row(o, leg)
+            leg = next(legs, None)
+
+
+def export_rows(spot_qs, fut_qs, archived=((), ())):
+    """Spot orders, then futures orders each followed by their TP legs.
+
+    ``archived`` is the ``(spot, futures)`` pair from
+    ``apps.trade.utils.history.archived_history``; those rows come first in
+    each market, since they are the oldest.
+    """
+    archived_spot, archived_futures = archived
+    for o in archived_spot:
+        yield _spot_row(o)
+    yield from _spot_rows(spot_qs)
+    for o in archived_futures:
+        yield _futures_row(o)
+        for leg in o["tps"]:
+            yield _leg_row(o, leg)
+    yield from _futures_rows(fut_qs)
+
+
+def _value(value):
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render_rows(rows, fmt: str = "csv"):
+    """Encode rows as CSV (with header) or NDJSON lines."""
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps({field: _value(row.get(field)) for field in FIELDS}) + "\n"
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([_value(row.get(field)) for field in FIELDS])
+
+
+def _take(iterator, size: int) -> list:
+    chunk = []
+    for part in iterator:
+        chunk.append(part)
+        if len(chunk) >= size:
+            break
+    return chunk
+
+
+async def stream_async(parts, batch: int = 500):
+    """Feed a blocking iterator to an ASGI response a batch at a time.
+
+    StreamingHttpResponse would otherwise buffer a sync iterator in full
+    under ASGI. All batches run on the same sync thread, so the server-side
+    cursor stays on its connection.
+    """
+    iterator = iter(parts)
+    take = sync_to_async(_take, thread_sensitive=True)
+    while True:
+        chunk = await take(iterator, batch)
+        if not chunk:
+            return
+        for part in chunk:
+            yield part
@@ -0,0 +1,217 @@
+"""Local copy of Binance symbol filters for sizing orders without CCXT helpers.
+
+Each symbol's PRICE_FILTER, LOT_SIZE, MARKET_LOT_SIZE, (MIN_)NOTIONAL and
+PERCENT_PRICE(_BY_SIDE) filters are compiled once into integer fixed-point
+units, so rounding a TP ladder or a batch of per-user quantities is plain
+integer arithmetic and anything the exchange would reject is dropped before
+it is sent.
+"""
+
+import threading
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_EVEN
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _dec(value) -> Decimal:
+    if value in (None, ""):
+        return Decimal(0)
+    return Decimal(str(value)).normalize()
+
+
+def _exponent(value: Decimal) -> int:
+    return max(0, -value.as_tuple().exponent) if value else 0
+
+
+@dataclass(frozen=True)
+class SymbolFilters:
+    symbol: str
+    scale: int
+    tick: int
+    step: int
+    market_step: int
+    min_price: int
+    max_price: int
+    min_qty: int
+    max_qty: int
+    market_min_qty: int
+    market_max_qty: int
+    min_notional: Decimal
+    # (down, up) multipliers of the reference price for buy (bid) and sell (ask)
+    # orders; PERCENT_PRICE sets both the same, PERCENT_PRICE_BY_SIDE separately
+    bid_band: tuple
+    ask_band: tuple
+
+    @property
+    def unit(self) -> int:
+        return 10**self.scale
+
+    def _to_units(self, value, rounding) -> int:
+        return int((Decimal(str(value)) * self.unit).to_integral_value(rounding=rounding))
+
+    def _from_units(self, units: int) -> float:
+        return float(Decimal(units) / self.unit)
+
+    def percent_band(self, side: str | None = None) -> tuple:
+        """``(down, up)`` percent-price multipliers for a buy or sell order.
+
+        Without a side the band must hold for both, so the tighter one is used.
+        """
+        if side == "buy":
+            return self.bid_band
+        if side == "sell":
+            return self.ask_band
+        return (max(self.bid_band[0], self.ask_band[0]), min(self.bid_band[1], self.ask_band[1]))
+
+    def round_price(self, price, side: str | None = None) -> float:
+        """Round a price to the nearest tick, as priceToPrecision does.
+
+        With a ``side``, buys round down and sells round up, so rounding never
+        pushes a price past the aggressive edge of that side's band.
+        """
+        rounding = {"buy": ROUND_FLOOR, "sell": ROUND_CEILING}.get(side, ROUND_HALF_EVEN)
+        if not self.tick:
+            return self._from_units(self._to_units(price, rounding))
+        ticks = (Decimal(str(price)) * self.unit / self.tick).to_integral_value(rounding=rounding)
+        return self._from_units(int(ticks) * self.tick)
+
+    def round_qty(self, qty, market: bool = False) -> float:
+        """Truncate a quantity down to the (market) lot step, as amountToPrecision does."""
+        step = (self.market_step or self.step) if market else self.step
+        if not step:
+            return self._from_units(self._to_units(qty, ROUND_DOWN))
+        steps = (Decimal(str(qty)) * self.unit / step).to_integral_value(rounding=ROUND_DOWN)
+        return self._from_units(int(steps) * step)
+
+    def check(
+        self, qty: float, price: float, reference_price: float | None = None, market: bool = False,
+        side: str | None = None,
+    ):
+        """Return why the exchange would reject (qty, price), or None if it is acceptable.
+
+        ``side`` selects the percent-price band; see ``percent_band``.
+        """
+        qty_units = self._to_units(qty, ROUND_DOWN)
+        price_units = self._to_units(price, ROUND_HALF_EVEN)
+        min_qty = max(self.min_qty, self.market_min_qty) if market else self.min_qty
+        max_qty = self.market_max_qty if market and self.market_max_qty else self.max_qty
+        if qty_units <= 0:
+            return "quantity is zero after rounding"
+        if min_qty and qty_units < min_qty:
+            return f"quantity {qty} below min {self._from_units(min_qty)}"
+        if max_qty and qty_units > max_qty:
+            return f"quantity {qty} above max {self._from_units(max_qty)}"
+        if not market:
+            if self.min_price and price_units < self.min_price:
+                return f"price {price} below min {self._from_units(self.min_price)}"
+            if self.max_price and price_units > self.max_price:
+                return f"price {price} above max {self._from_units(self.max_price)}"
+        if self.min_notional and Decimal(str(qty)) * Decimal(str(price)) < self.min_notional:
+            return f"notional {float(qty) * float(price):.4f} below min {self.min_notional:f}"
+        down, up = self.percent_band(side)
+        if not market and reference_price and up:
+            ref = Decimal(str(reference_price))
+            if Decimal(str(price)) > ref * up or Decimal(str(price)) < ref * down:
+                band = f"{side} percent-price" if side else "percent-price"
+                return f"price {price} outside {band} band around {reference_price}"
+        return None
+
+    def round_ladder(
+        self, base_qty: float, legs: list, reference_price: float | None = None, limit: bool = False,
+        side: str | None = None,
+    ):
+        """Round and validate a whole TP ladder in one pass.
+
+        ``legs`` is a list of ``{"price": .., "percent": ..}`` and ``side`` the
+        side of the exit orders, if known. Returns
+        ``(accepted, rejected)`` where accepted items carry rounded ``price``,
+        ``qty`` and ``percent`` and rejected items are ``(leg, reason)``.
+        """
+        accepted, rejected = [], []
+        for leg in legs:
+            try:
+                price = float(leg.get("price"))
+                percent = float(leg.get("percent"))
+            except (TypeError, ValueError):
+                rejected.append((leg, "invalid price/percent"))
+                continue
+            if percent <= 0:
+                rejected.append((leg, "non-positive percent"))
+                continue
+            qty = self.round_qty(float(base_qty) * (percent / 100.0))
+            price = self.round_price(price, side)
+            reason = self.check(qty, price, reference_price if limit else None, side=side)
+            if reason:
+                rejected.append((leg, reason))
+                continue
+            accepted.append({"price": price, "percent": percent, "qty": qty})
+        return accepted, rejected
+
+    def size_batch(self, quantities: list, price: float, market: bool = True) -> list:
+        """Round a batch of quantities at one price; rejected entries become None."""
+        sized = []
+        for qty in quantities:
+            rounded = self.round_qty(qty, market=market)
+            sized.append(None if self.check(rounded, price, market=market) else rounded)
+        return sized
+
+
+def compile_filters(market: dict) -> SymbolFilters:
+    """Build SymbolFilters from a CCXT market, preferring Binance's raw filters."""
+    raw = {f.get("filterType"): f for f in (market.get("info") or {}).get("filters") or []}
+    precision = market.get("precision") or {}
+    limits = market.get("limits") or {}
+    price_f = raw.get("PRICE_FILTER", {})
+    lot = raw.get("LOT_SIZE", {})
+    market_lot = raw.get("MARKET_LOT_SIZE", {})
+    notional = raw.get("NOTIONAL") or raw.get("MIN_NOTIONAL") or {}
+    percent = raw.get("PERCENT_PRICE") or {}
+    by_side = raw.get("PERCENT_PRICE_BY_SIDE") or {}
+
+    tick = _dec(price_f.get("tickSize") or precision.get("price"))
+    step = _dec(lot.get("stepSize") or precision.get("amount"))
+    market_step = _dec(market_lot.get("stepSize"))
+    values = {
+        "min_price": _dec(price_f.get("minPrice") or (limits.get("price") or {}).get("min")),
+        "max_price": _dec(price_f.get("maxPrice") or (limits.get("price") or {}).get("max")),
+        "min_qty": _dec(lot.get("minQty") or (limits.get("amount") or {}).get("min")),
+        "max_qty": _dec(lot.get("maxQty") or (limits.get("amount") or {}).get("max")),
+        "market_min_qty": _dec(market_lot.get("minQty")),
+        "market_max_qty": _dec(market_lot.get("maxQty")),
+    }
+    scale = max(_exponent(v) for v in [tick, step, market_step, *values.values()])
+    unit = 10**scale
+
+    if by_side:
+        bid_band = (_dec(by_side.get("bidMultiplierDown")), _dec(by_side.get("bidMultiplierUp")))
+        ask_band = (_dec(by_side.get("askMultiplierDown")), _dec(by_side.get("askMultiplierUp")))
+    else:
+        bid_band = ask_band = (_dec(percent.get("multiplierDown")), _dec(percent.get("multiplierUp")))
+    return SymbolFilters(
+        symbol=market.get("symbol"),
+        scale=scale,
+        tick=int(tick * unit),
+        step=int(step * unit),
+        market_step=int(market_step * unit),
+        min_notional=_dec(
+            notional.get("minNotional")
+            or notional.get("notional")
+            or (limits.get("cost") or {}).get("min")
+        ),
+        bid_band=bid_band,
+        ask_band=ask_band,
+        **{k: int(v * unit) for k, v in values.items()},
+    )
+
+
+def get_symbol_filters(exchange, symbol: str) -> SymbolFilters:
+    """Compiled filters for a symbol, cached per exchange type and market snapshot."""
+    key = (exchange.id, symbol, getattr(exchange, "market_snapshot_version", None))
+    filters = _cache.get(key)
+    if filters is None:
+        filters = compile_filters(exchange.market(symbol))
+        with _cache_lock:
+            _cache[key] = filters
+    return filters
@@ -0,0 +1,183 @@
+"""Merged spot + futures trade history, ordered and paginated in the database.
+
+Both order tables are filtered the same way, projected to one column set
+and combined with UNION ALL, newest first. Pages are addressed by a keyset
+cursor over ``(created_at, market, id)`` rather than an offset, so every
+page costs the same however far back the user scrolls.
+
+When a date filter reaches back past the archive horizon, rows from the
+Parquet archive (see ``apps.trade.utils.archive``) are merged into the
+page under the same ordering.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import DecimalField, F, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from apps.trade.models import DailyPnl, FutureOrder, SpotOrder
+from apps.trade.utils.archive import archive_horizon, archived_rows
+
+SPOT, FUTURES = "Spot", "Futures"
+COLUMNS = (
+    "id", "symbol", "direction", "status", "pnl", "pnl_percentage", "entry_price",
+    "stop_loss_price", "stop_loss_status", "ignore_opposite_signal", "created_at", "closed_at",
+)
+ORDERING = ("-created_at", "-market", "-id")
+_QUANTITY = DecimalField(max_digits=20, decimal_places=10)
+
+
+def _parse_datetime(value: str):
+    parsed = datetime.fromisoformat(value)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _date_bounds(params) -> tuple:
+    """``(from, to)`` of the date filter; a missing or unparsable bound is None."""
+    bounds = []
+    for param in ("from", "to"):
+        try:
+            bounds.append(_parse_datetime(params[param]) if params.get(param) else None)
+        except ValueError:
+            bounds.append(None)
+    return tuple(bounds)
+
+def filter_history(user, params) -> tuple:
+    """Spot and futures querysets for the history filters in ``params`` (a QueryDict)."""
+    market = params.get("market", "both")
+    status_val = params.get("status", "")
+    symbol = params.get("symbol", "")
+
+    spot_qs = SpotOrder.objects.filter(user=user)
+    fut_qs = FutureOrder.objects.filter(user=user)
+
+    if market == "spot":
+        fut_qs = FutureOrder.objects.none()
+    elif market == "futures":
+        spot_qs = SpotOrder.objects.none()
+
+    if status_val:
+        spot_qs = spot_qs.filter(status=status_val)
+        fut_qs = fut_qs.filter(status=status_val)
+    if symbol:
+        spot_qs = spot_qs.filter(symbol=symbol)
+        fut_qs = fut_qs.filter(symbol=symbol)
+
+    start, end = _date_bounds(params)
+    if start is not None:
+        spot_qs = spot_qs.filter(created_at__gte=start)
+        fut_qs = fut_qs.filter(created_at__gte=start)
+    if end is not None:
+        spot_qs = spot_qs.filter(created_at__lte=end)
+        fut_qs = fut_qs.filter(created_at__lte=end)
+    return spot_qs, fut_qs
+
+
+def archived_history(user, params, since=None, until=None) -> tuple:
+    """Archived spot and futures rows matching the history filters in ``params``.
+
+    The archive is only read when a date filter reaches back past
+    ``archive_horizon()``; otherwise both are empty. ``since``/``until``
+    narrow the range further. Rows are read lazily.
+    """
+    start, end = _date_bounds(params)
+    if start is None and end is None:
+        return (), ()
+    if start is not None and start >= archive_horizon():
+        return (), ()
+    if since is not None:
+        start = since if start is None else max(start, since)
+    if until is not None:
+        end = until if end is None else min(end, until)
+
+    market = params.get("market", "both")
+    filters = {"status": params.get("status", ""), "symbol": params.get("symbol", "")}
+    spot = archived_rows(user, DailyPnl.Market.SPOT, start, end, **filters) if market != "futures" else ()
+    futures = archived_rows(user, DailyPnl.Market.FUTURES, start, end, **filters) if market != "spot" else ()
+    return spot, futures
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"].isoformat(), row["market"], row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Returns ``(created_at, market, id)`` or None for a missing/garbled cursor."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, market, pk = json.loads(raw)
+        return _parse_datetime(created_at), str(market), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def _after(qs, market: str, cursor):
+    """Rows of one market that sort after ``cursor`` in ORDERING."""
+    created_at, cursor_market, pk = cursor
+    if market < cursor_market:
+        return qs.filter(created_at__lte=created_at)
+    if market == cursor_market:
+        return qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return qs.filter(created_at__lt=created_at)
+
+
+def _project(qs, market: str, quantity):
+    return qs.order_by().values(*COLUMNS, market=Value(market), quantity=quantity)
+
+
+def _key(row) -> tuple:
+    return row["created_at"], row["market"], row["id"]
+
+
+def _project_archived(row: dict, market: str) -> dict:
+    projected = {column: row[column] for column in COLUMNS}
+    projected["market"] = market
+    if market == SPOT:
+        projected["quantity"] = row["final_quantity"] or row["order_quantity"]
+    else:
+        projected["quantity"] = row["order_quantity"]
+        projected["tps"] = row["tps"]
+    return projected
+
+
+def history_page(spot_qs, fut_qs, cursor=None, page_size: int = 100, archived=None) -> tuple:
+    """One page of merged history rows and the cursor of the next page (or None).
+
+    ``archived(since=, until=)`` returns archived spot and futures rows (see
+    ``archived_history``) to merge into the page; archived futures rows carry
+    their take-profit legs under ``tps``.
+    """
+    branches = [
+        (SPOT, spot_qs, Coalesce(NullIf("final_quantity", 0), "order_quantity", output_field=_QUANTITY)),
+        (FUTURES, fut_qs, F("order_quantity")),
+    ]
+    parts = []
+    for market, qs, quantity in branches:
+        if cursor is not None:
+            qs = _after(qs, market, cursor)
+        qs = _project(qs, market, quantity)
+        if connection.features.supports_slicing_ordering_in_compound:
+            # Let each table stop after one page instead of merging full scans
+            qs = qs.order_by("-created_at", "-id")[: page_size + 1]
+        parts.append(qs)
+
+    rows = list(parts[0].union(parts[1], all=True).order_by(*ORDERING)[: page_size + 1])
+    if archived is not None:
+        # Archived rows older than a full page's last row cannot make the page
+        since = rows[-1]["created_at"] if len(rows) > page_size else None
+        spot_rows, fut_rows = archived(since=since, until=cursor[0] if cursor else None)
+        extra = [_project_archived(row, SPOT) for row in spot_rows]
+        extra += [_project_archived(row, FUTURES) for row in fut_rows]
+        if cursor is not None:
+            extra = [row for row in extra if _key(row) < tuple(cursor)]
+        if extra:
+            rows = sorted(rows + extra, key=_key, reverse=True)[: page_size + 1]
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
@@ -0,0 +1,213 @@
+"""Shared snapshot of Binance market metadata.
+
+Markets, precision and limits are the same for every user, so one process
+downloads them and publishes a compressed snapshot to Redis (or a local file
+when Redis is unavailable). Every CCXT client is then injected from that
+snapshot with ``set_markets()`` instead of calling ``load_markets()``.
+
+Workers warm the snapshot at startup (``warm_market_cache``). Only when
+nothing has been published yet does a lookup download markets itself,
+synchronously and once per process; concurrent callers wait for that
+download instead of starting their own.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+import ccxt
+from django.conf import settings
+
+from apps.trade.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_CLASSES = {"spot": ccxt.binance, "futures": ccxt.binanceusdm}
+
+_snapshots = {}
+_last_checked = {}
+_lock = threading.Lock()
+_download_lock = threading.Lock()
+
+
+def _redis_key(market: str, suffix: str) -> str:
+    return f"markets:{market}:{suffix}"
+
+
+def _file_path(market: str) -> str:
+    return os.path.join(settings.MARKET_CACHE_DIR, f"{market}.json.z")
+
+
+def markets_version(markets: dict) -> str:
+    """Fingerprint of the trading filters; changes whenever precision/limits change."""
+    filters = {
+        symbol: [m.get("active"), m.get("precision"), m.get("limits")]
+        for symbol, m in sorted(markets.items())
+    }
+    raw = json.dumps(filters, sort_keys=True, default=str).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _encode(snapshot: dict) -> bytes:
+    return zlib.compress(json.dumps(snapshot).encode(), 6)
+
+
+def _decode(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+def _read_remote_meta(market: str) -> tuple:
+    """``(version, fetched_at)`` of the published snapshot, either may be None."""
+    r = get_redis()
+    if r is not None:
+        try:
+            version, fetched_at = r.mget(_redis_key(market, "version"), _redis_key(market, "fetched_at"))
+            return (
+                version.decode() if version else None,
+                float(fetched_at) if fetched_at else None,
+            )
+        except Exception as e:
+            logger.warning(f"Market cache version lookup failed for {market}: {e}")
+    try:
+        with open(_file_path(market) + ".version") as fh:
+            lines = fh.read().split()
+    except OSError:
+        return None, None
+    try:
+        fetched_at = float(lines[1]) if len(lines) > 1 else None
+    except ValueError:
+        fetched_at = None
+    return (lines[0] if lines else None), fetched_at
+
+
+def _read_snapshot(market: str):
+    r = get_redis()
+    if r is not None:
+        try:
+            blob = r.get(_redis_key(market, "snapshot"))
+            if blob:
+                return _decode(blob)
+        except Exception as e:
+            logger.warning(f"Market cache read from Redis failed for {market}: {e}")
+    try:
+        with open(_file_path(market), "rb") as fh:
+            return _decode(fh.read())
+    except (OSError, ValueError, zlib.error):
+        return None
+
+
+def publish_snapshot(market: str, markets: dict, currencies: dict | None = None) -> dict:
+    """Store a markets snapshot in Redis and on local disk and return it."""
+    snapshot = {
+        "version": markets_version(markets),
+        "fetched_at": time.time(),
+        "markets": markets,
+        "currencies": currencies or {},
+    }
+    blob = _encode(snapshot)
+    r = get_redis()
+    if r is not None:
+        try:
+            pipe = r.pipeline()
+            pipe.set(_redis_key(market, "snapshot"), blob)
+            pipe.set(_redis_key(market, "version"), snapshot["version"])
+            pipe.set(_redis_key(market, "fetched_at"), snapshot["fetched_at"])
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Market cache write to Redis failed for {market}: {e}")
+    try:
+        os.makedirs(settings.MARKET_CACHE_DIR, exist_ok=True)
+        path = _file_path(market)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(blob)
+        os.replace(tmp, path)
+        with open(tmp, "w") as fh:
+            fh.write(f"{snapshot['version']}\n{snapshot['fetched_at']}")
+        os.replace(tmp, path + ".version")
+    except OSError as e:
+        logger.warning(f"Market cache write to disk failed for {market}: {e}")
+    with _lock:
+        _snapshots[market] = snapshot
+        _last_checked[market] = time.monotonic()
+    return snapshot
+
+
+def fetch_and_publish(market: str) -> dict:
+    """Download markets with a keyless client and publish them."""
+    exchange = EXCHANGE_CLASSES[market]()
+    exchange.load_markets()
+    return publish_snapshot(market, exchange.markets, exchange.currencies)
+
+
+def _download_cold(market: str) -> dict:
+    """Nothing published anywhere yet: download once, other callers reuse the result."""
+    with _download_lock:
+        with _lock:
+            snapshot = _snapshots.get(market)
+        if snapshot is not None:
+            return snapshot
+        logger.info(f"Market cache for {market} missing, downloading")
+        return fetch_and_publish(market)
+
+
+def get_snapshot(market: str) -> dict:
+    """Return the current snapshot, hitting Redis at most once per check interval.
+
+    A cold cache blocks the caller on a full ``load_markets()`` download.
+    """
+    now = time.monotonic()
+    with _lock:
+        snapshot = _snapshots.get(market)
+        fresh_check = now - _last_checked.get(market, 0) < settings.MARKET_CACHE_CHECK_INTERVAL
+    if snapshot is not None and fresh_check:
+        return snapshot
+
+    remote_version, remote_fetched_at = _read_remote_meta(market)
+    if snapshot is None or remote_version != snapshot["version"]:
+        loaded = _read_snapshot(market)
+        if loaded is not None:
+            snapshot = loaded
+    elif remote_fetched_at and remote_fetched_at > snapshot["fetched_at"]:
+        # The cron republished the same filters; the copy we hold is that fresh
+        snapshot = {**snapshot, "fetched_at": remote_fetched_at}
+    if snapshot is None:
+        return _download_cold(market)
+    if time.time() - snapshot["fetched_at"] > settings.MARKET_CACHE_MAX_AGE:
+        # Downloads belong to the refresh_markets cron, not the signal path
+        logger.warning(f"Market cache for {market} is older than MARKET_CACHE_MAX_AGE, is the cron running?")
+
+    with _lock:
+        _snapshots[market] = snapshot
+        _last_checked[market] = now
+    return snapshot
+
+
+def inject_markets(exchange, market: str):
+    """Load markets into a CCXT client from the shared snapshot."""
+    snapshot = get_snapshot(market)
+    exchange.set_markets(snapshot["markets"], snapshot["currencies"] or None)
+    exchange.market_snapshot_version = snapshot["version"]
+    return exchange
+
+
+def refresh_if_stale(exchange, market: str):
+    """Re-inject markets into a long-lived client if the filters changed since."""
+    snapshot = get_snapshot(market)
+    if getattr(exchange, "market_snapshot_version", None) != snapshot["version"]:
+        exchange.set_markets(snapshot["markets"], snapshot["currencies"] or None)
+        exchange.market_snapshot_version = snapshot["version"]
+    return exchange
+
+
+def warm_market_cache():
+    """Populate the in-process snapshot for both markets; safe to call at startup."""
+    for market in EXCHANGE_CLASSES:
+        try:
+            get_snapshot(market)
+        except Exception as e:
+            logger.warning(f"Could not warm market cache for {market}: {e}")
@@ -0,0 +1,235 @@
+"""Shared last/bid/ask/mark price cache fed by Binance market streams.
+
+``MarketDataService`` (run via ``manage.py run_market_data``) subscribes to
+``<symbol>@bookTicker`` and, for futures, ``<symbol>@markPrice@1s`` for every
+active symbol and writes the latest quote per symbol to Redis. Workers and
+views read it through ``get_cached_price``; callers fall back to REST when the
+quote is older than ``MARKET_DATA_MAX_AGE``.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.trade.utils.redis_client import get_redis
+from apps.trade.utils.ws import AiohttpTransport
+
+logger = logging.getLogger(__name__)
+
+STREAM_URLS = {
+    "spot": "wss://stream.binance.com:9443/stream?streams=",
+    "futures": "wss://fstream.binance.com/stream?streams=",
+}
+EXCHANGE_MARKETS = {"binance": "spot", "binanceusdm": "futures"}
+PRICE_FIELDS = ("last", "bid", "ask", "mark", "ts")
+
+
+def _quote_key(market: str, symbol_id: str) -> str:
+    return f"md:{market}:quote:{symbol_id}"
+
+
+def _active_key(market: str) -> str:
+    return f"md:{market}:active"
+
+
+class PriceCache:
+    """Latest quote per (market, symbol id) in Redis, with an in-process copy."""
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def set_many(self, market: str, quotes: dict):
+        with self._lock:
+            for symbol_id, quote in quotes.items():
+                self._local[(market, symbol_id)] = dict(quote)
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            pipe = r.pipeline(transaction=False)
+            for symbol_id, quote in quotes.items():
+                key = _quote_key(market, symbol_id)
+                pipe.hset(key, mapping={k: v for k, v in quote.items() if v is not None})
+                pipe.expire(key, settings.MARKET_DATA_KEY_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Price cache write failed for {market}: {e}")
+
+    def get(self, market: str, symbol_id: str):
+        with self._lock:
+            quote = self._local.get((market, symbol_id))
+        if quote is not None and time.time() - quote["ts"] <= settings.MARKET_DATA_MAX_AGE:
+            return quote
+        r = get_redis()
+        if r is None:
+            return quote
+        try:
+            raw = r.hgetall(_quote_key(market, symbol_id))
+        except Exception as e:
+            logger.warning(f"Price cache read failed for {market}:{symbol_id}: {e}")
+            return quote
+        if not raw:
+            return quote
+        return {k.decode(): float(v) for k, v in raw.items() if k.decode() in PRICE_FIELDS}
+
+
+price_cache = PriceCache()
+
+
+def mark_symbol_active(market: str, symbol_id: str):
+    """Ask the market-data service to stream a symbol (idempotent)."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.sadd(_active_key(market), symbol_id)
+    except Exception as e:
+        logger.warning(f"Could not mark {symbol_id} active for {market}: {e}")
+
+
+def get_cached_price(exchange, symbol: str, max_age: float | None = None):
+    """Return the streamed last price for a symbol if fresh enough, else None."""
+    market = EXCHANGE_MARKETS.get(exchange.id)
+    if market is None:
+        return None
+    try:
+        symbol_id = exchange.market_id(symbol)
+    except Exception:
+        return None
+    quote = price_cache.get(market, symbol_id)
+    max_age = settings.MARKET_DATA_MAX_AGE if max_age is None else max_age
+    if not quote or not quote.get("last") or time.time() - quote.get("ts", 0) > max_age:
+        mark_symbol_active(market, symbol_id)
+        return None
+    return quote["last"]
+
+
+def parse_stream_message(raw: str):
+    """Turn a combined-stream frame into (symbol_id, fields) or None."""
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        return None
+    data = payload.get("data", payload)
+    symbol_id = data.get("s")
+    if not symbol_id:
+        return None
+    event = data.get("e")
+    if event == "markPriceUpdate":
+        return symbol_id, {"mark": float(data["p"])}
+    if "b" in data and "a" in data:
+        bid, ask = float(data["b"]), float(data["a"])
+        # bookTicker carries no trade price; the mid is within half a spread of it
+        return symbol_id, {"bid": bid, "ask": ask, "last": (bid + ask) / 2}
+    return None
+
+
+class MarketDataService:
+    """Keeps the price cache current for the active symbols of one market."""
+
+    def __init__(self, market: str, transport=None, cache: PriceCache | None = None, symbols=None):
+        self.market = market
+        self.transport = transport or AiohttpTransport()
+        self.cache = cache or price_cache
+        self.static_symbols = {s.upper() for s in symbols or []}
+        self.symbols = set()
+        self._pending = {}
+        self._quotes = {}
+
+    def stream_url(self, symbols) -> str:
+        streams = []
+        for symbol_id in sorted(symbols):
+            streams.append(f"{symbol_id.lower()}@bookTicker")
+            if self.market == "futures":
+                streams.append(f"{symbol_id.lower()}@markPrice@1s")
+        return STREAM_URLS[self.market] + "/".join(streams)
+
+    def active_symbols(self) -> set:
+        """Configured symbols, symbols flagged by readers and symbols with open positions."""
+        from apps.trade.models import FutureOrder, SpotOrder
+
+        symbols = set(self.static_symbols)
+        r = get_redis()
+        if r is not None:
+            try:
+                symbols |= {s.decode() for s in r.smembers(_active_key(self.market))}
+            except Exception as e:
+                logger.warning(f"Could not read active symbols for {self.market}: {e}")
+        model = FutureOrder if self.market == "futures" else SpotOrder
+        # Long-running process: drop connections the server closed or that
+        # outlived CONN_MAX_AGE, as Django does around each request
+        close_old_connections()
+        try:
+            open_symbols = list(
+                model.objects.filter(status=model.TradeStatus.POSITION)
+                .values_list("symbol", flat=True)
+                .distinct()
+            )
+        finally:
+            close_old_connections()
+        for symbol in open_symbols:
+            symbols.add(symbol.split(":")[0].replace("/", "").upper())
+        return symbols
+
+    def handle(self, raw: str):
+        parsed = parse_stream_message(raw)
+        if parsed is None:
+            return
+        symbol_id, fields = parsed
+        quote = self._quotes.setdefault(symbol_id, {})
+        quote.update(fields)
+        quote["ts"] = time.time()
+        self._pending[symbol_id] = quote
+
+    def flush(self):
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            self.cache.set_many(self.market, pending)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.MARKET_DATA_FLUSH_INTERVAL)
+            await asyncio.to_thread(self.flush)
+
+    async def _consume(self, url: str):
+        async for raw in self.transport.messages(url):
+            self.handle(raw)
+
+    async def run(self, stop_event: asyncio.Event | None = None):
+        stop_event = stop_event or asyncio.Event()
+        flusher = asyncio.create_task(self._flush_loop())
+        try:
+            while not stop_event.is_set():
+                self.symbols = await asyncio.to_thread(self.active_symbols)
+                if not self.symbols:
+                    await asyncio.sleep(settings.MARKET_DATA_RESUBSCRIBE_INTERVAL)
+                    continue
+                url = self.stream_url(self.symbols)
+                logger.info(f"Streaming {len(self.symbols)} {self.market} symbols")
+                consumer = asyncio.create_task(self._consume(url))
+                # Reconnect when the active set changes, the socket drops or we are stopped
+                while not consumer.done() and not stop_event.is_set():
+                    await asyncio.wait(
+                        [consumer], timeout=settings.MARKET_DATA_RESUBSCRIBE_INTERVAL
+                    )
+                    if consumer.done():
+                        break
+                    if await asyncio.to_thread(self.active_symbols) != self.symbols:
+                        break
+                consumer.cancel()
+                try:
+                    await consumer
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"{self.market} market stream error: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            flusher.cancel()
+            self.flush()
@@ -0,0 +1,135 @@
+"""Monthly range partitions of the order tables (Postgres only).
+
+``spot_orders``, ``future_orders`` and ``future_take_profits`` are
+partitioned by ``created_at`` into ``<table>_pYYYYMM`` children plus a
+``<table>_default`` catch-all (see migration 0017). ``ensure_partitions``
+keeps ``PARTITION_MONTHS_AHEAD`` months created ahead of time, so new rows
+never land in the default partition. Each partition gets its own unique
+indexes on the exchange order ids (``UNIQUE_COLUMNS``, see migration 0019).
+``detach_partitions`` drops whole months out of the tables for cheap
+retention.
+
+On other databases, or before the migration has run, every function is a
+no-op.
+"""
+
+import logging
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("spot_orders", "future_orders", "future_take_profits")
+# Postgres cannot enforce these table-wide without created_at; blank ids may repeat
+UNIQUE_COLUMNS = {"spot_orders": ("order_id",), "future_orders": ("order_id", "stop_loss_order_id")}
+_MONTH_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(table: str) -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table: str) -> list:
+    """``(name, month)`` of the monthly partitions of ``table``, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = _MONTH_SUFFIX.search(name)
+        if match:
+            months.append((name, date(int(match[1]), int(match[2]), 1)))
+    return sorted(months, key=lambda item: item[1])
+
+
+def create_partition(table: str, month: date) -> bool:
+    """Create the partition of ``table`` for ``month``; False if it existed."""
+    name = partition_name(table, month)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        for column in UNIQUE_COLUMNS.get(table, ()):
+            cursor.execute(
+                f'CREATE UNIQUE INDEX "{name}_{column}_uniq" '
+                f'ON "{name}" ("{column}") WHERE "{column}" <> \'\''
+            )
+    return True
+
+
+def ensure_partitions(start: date | None = None, months_ahead: int | None = None) -> list:
+    """Create any missing partitions from ``start`` (this month) to ``months_ahead`` months on."""
+    if months_ahead is None:
+        months_ahead = settings.PARTITION_MONTHS_AHEAD
+    today = timezone.now().date()
+    first = month_start(start or today)
+    last = add_months(month_start(today), months_ahead)
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            continue
+        month = first
+        while month <= last:
+            try:
+                if create_partition(table, month):
+                    created.append(partition_name(table, month))
+            except Exception as e:
+                # Usually rows for that month already sit in the default partition
+                logger.error(f"Could not create partition {partition_name(table, month)}: {e}")
+            month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(before: date, drop: bool = False) -> list:
+    """Detach (and optionally drop) every monthly partition that ends on or before ``before``.
+
+    Postgres refuses ``DETACH ... CONCURRENTLY`` while a DEFAULT partition
+    exists, so each detach briefly takes an exclusive lock on the parent.
+    It is a catalog change and does not scan the data.
+    """
+    detached = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            continue
+        for name, month in list_partitions(table):
+            if add_months(month, 1) > before:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+            logger.info(f"{'Dropped' if drop else 'Detached'} partition {name}")
+            detached.append(name)
+    return detached
@@ -0,0 +1,189 @@
+"""Submit a position's SL and TP ladder through Binance futures batchOrders.
+
+Each request carries its own ``clientOrderId`` so per-leg results can be
+matched back even though Binance answers a batch with a mix of orders and
+``{"code", "msg"}`` errors. Legs missing from a batch answer are retried
+one by one with the same client id, which Binance refuses to duplicate.
+
+If the stop loss still cannot be placed, ``unwind_entry`` cancels the TP
+legs that were and flattens the entry, so no position is left on Binance
+without a stop.
+"""
+
+import logging
+import uuid
+
+from apps.trade.utils.common import opposite_side
+
+logger = logging.getLogger(__name__)
+
+# fapi/v1/batchOrders accepts at most 5 orders per request
+BATCH_LIMIT = 5
+
+
+def protective_requests(symbol: str, side: str, quantity, stop_price=None, tp_legs=()) -> list:
+    """Order requests closing a ``side`` entry: an optional STOP_MARKET, then each TP leg.
+
+    ``tp_legs`` items are ``{"price", "qty", ...}`` as returned by
+    ``SymbolFilters.round_ladder``; extra keys are kept on the request under
+    ``"leg"`` so callers can persist them.
+    """
+    inv_side = opposite_side(side)
+    tag = uuid.uuid4().hex[:20]
+    requests = []
+    if stop_price is not None:
+        requests.append(
+            {
+                "symbol": symbol,
+                "type": "STOP_MARKET",
+                "side": inv_side,
+                "amount": quantity,
+                "params": {"stopPrice": stop_price, "reduceOnly": True, "clientOrderId": f"sl-{tag}"},
+            }
+        )
+    for i, leg in enumerate(tp_legs):
+        requests.append(
+            {
+                "symbol": symbol,
+                "type": "TAKE_PROFIT_MARKET",
+                "side": inv_side,
+                "amount": leg["qty"],
+                "params": {"stopPrice": leg["price"], "reduceOnly": True, "clientOrderId": f"tp{i}-{tag}"},
+                "leg": leg,
+            }
+        )
+    return requests
+
+
+def flatten_request(symbol: str, side: str, quantity) -> dict:
+    """Reduce-only market order closing a ``side`` entry."""
+    return {
+        "symbol": symbol,
+        "type": "market",
+        "side": opposite_side(side),
+        "amount": quantity,
+        "params": {"reduceOnly": True},
+    }
+
+
+def missing_stop(request) -> dict:
+    """Stand-in for a stop loss that could not be placed, keyed by its client id."""
+    return {"id": request["params"]["clientOrderId"], "stopPrice": request["params"]["stopPrice"], "missing": True}
+
+
+def _batches(requests):
+    for i in range(0, len(requests), BATCH_LIMIT):
+        yield [{k: v for k, v in r.items() if k != "leg"} for r in requests[i : i + BATCH_LIMIT]]
+
+
+def _match(batch, orders) -> list:
+    placed = {o.get("clientOrderId"): o for o in orders or [] if o.get("id")}
+    return [placed.get(r["params"]["clientOrderId"]) for r in batch]
+
+
+def _single_args(request):
+    return dict(
+        symbol=request["symbol"],
+        type=request["type"],
+        side=request["side"],
+        amount=request["amount"],
+        params=request["params"],
+    )
+
+
+def _lookup_args(request):
+    return dict(symbol=request["symbol"], params={"origClientOrderId": request["params"]["clientOrderId"]})
+
+
+def place_protective_orders(exchange, requests) -> list:
+    """Place requests in batches; returns one order dict (or None if it failed) per request."""
+    results = []
+    for batch in _batches(requests):
+        try:
+            orders = exchange.create_orders(batch) if len(batch) > 1 else []
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch)} orders failed, retrying individually: {e}")
+            orders = []
+        results.extend(_match(batch, orders))
+
+    for i, request in enumerate(requests):
+        if results[i] is not None:
+            continue
+        try:
+            results[i] = exchange.create_order(**_single_args(request))
+        except Exception as e:
+            # The batch may have placed it after all; Binance rejects duplicate client ids
+            try:
+                results[i] = exchange.fetch_order(None, **_lookup_args(request))
+            except Exception:
+                logger.error(f"Failed to place {request['type']} for {request['symbol']}: {e}")
+    return results
+
+
+async def aplace_protective_orders(exchange, requests) -> list:
+    """``place_protective_orders`` for ``ccxt.async_support`` clients."""
+    results = []
+    for batch in _batches(requests):
+        try:
+            orders = await exchange.create_orders(batch) if len(batch) > 1 else []
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch)} orders failed, retrying individually: {e}")
+            orders = []
+        results.extend(_match(batch, orders))
+
+    for i, request in enumerate(requests):
+        if results[i] is not None:
+            continue
+        try:
+            results[i] = await exchange.create_order(**_single_args(request))
+        except Exception as e:
+            try:
+                results[i] = await exchange.fetch_order(None, **_lookup_args(request))
+            except Exception:
+                logger.error(f"Failed to place {request['type']} for {request['symbol']}: {e}")
+    return results
+
+
+def unwind_entry(exchange, symbol: str, side: str, quantity, created_tps) -> dict | None:
+    """Cancel the placed TP legs and close an entry whose stop loss failed.
+
+    Returns the close order, or None when the position could not be flattened.
+    """
+    for tp in created_tps:
+        try:
+            exchange.cancel_order(tp["id"], symbol)
+        except Exception as e:
+            logger.warning(f"Could not cancel TP {tp['id']} for {symbol}: {e}")
+    try:
+        return exchange.create_order(**_single_args(flatten_request(symbol, side, quantity)))
+    except Exception as e:
+        logger.error(f"Could not flatten unprotected {symbol} position: {e}")
+        return None
+
+
+async def aunwind_entry(exchange, symbol: str, side: str, quantity, created_tps) -> dict | None:
+    """``unwind_entry`` for ``ccxt.async_support`` clients."""
+    for tp in created_tps:
+        try:
+            await exchange.cancel_order(tp["id"], symbol)
+        except Exception as e:
+            logger.warning(f"Could not cancel TP {tp['id']} for {symbol}: {e}")
+    try:
+        return await exchange.create_order(**_single_args(flatten_request(symbol, side, quantity)))
+    except Exception as e:
+        logger.error(f"Could not flatten unprotected {symbol} position: {e}")
+        return None
+
+
+def split_results(requests, results, has_stop: bool = True):
+    """Split placement results into ``(sl_order, created_tps)``.
+
+    ``created_tps`` holds ``{"id", "price", "percent", "qty"}`` for each TP
+    leg that was placed, ready for ``record_futures_entry``.
+    """
+    sl_order = results[0] if has_stop else None
+    created_tps = []
+    for request, order in list(zip(requests, results))[1 if has_stop else 0 :]:
+        if order is not None:
+            created_tps.append({"id": order.get("id", ""), **request["leg"]})
+    return sl_order, created_tps
@@ -0,0 +1,218 @@
+"""Redis token buckets shared by every process that talks to Binance.
+
+Every CCXT client built in ``apps.trade.utils.common`` has its ``fetch2``
+wrapped so each REST call first takes tokens from:
+
+* the per-IP weight bucket of its market, measured in CCXT's own endpoint
+  costs (``calculate_rate_limiter_cost``), sized to
+  ``60000 / exchange.rateLimit`` units a minute times ``RATE_LIMIT_HEADROOM``;
+* a per-API-key order-count bucket for order placement
+  (Binance's 10-second order limits).
+
+All buckets for a call are checked and debited atomically in one Lua script.
+A 429/418 answer blocks the market's IP bucket for Binance's Retry-After so
+every worker backs off together.
+
+Callers choose what happens when tokens are short with ``rate_limit_mode``:
+``wait`` (default) sleeps up to ``RATE_LIMIT_MAX_WAIT``, ``shed`` raises
+immediately, and ``priority="low"`` leaves ``RATE_LIMIT_LOW_PRIORITY_RESERVE``
+of each bucket to normal traffic. Without Redis the limiter is a no-op and
+CCXT's per-client throttle still applies.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import ccxt
+from django.conf import settings
+
+from apps.trade.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Binance order-count limits per account: (orders, seconds)
+ORDER_LIMITS = {"futures": (300, 10), "spot": (100, 10)}
+ORDER_PATHS = ("order", "batchOrders", "orderList", "order/oco", "sor/order")
+
+_mode = contextvars.ContextVar("rate_limit_mode", default=("wait", "normal"))
+
+_ACQUIRE = """
+local block = redis.call('PTTL', KEYS[1])
+if block > 0 then return block end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local n = #KEYS - 1
+local levels = {}
+local wait = 0
+for i = 1, n do
+  local base = (i - 1) * 4
+  local cap = tonumber(ARGV[base + 1])
+  local rate = tonumber(ARGV[base + 2])
+  local cost = math.min(tonumber(ARGV[base + 3]), cap)
+  local reserve = tonumber(ARGV[base + 4])
+  local state = redis.call('HMGET', KEYS[i + 1], 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or cap
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(cap, tokens + math.max(0, now - ts) * rate)
+  levels[i] = tokens
+  if tokens < cost + reserve then
+    wait = math.max(wait, math.ceil((cost + reserve - tokens) / rate))
+  end
+end
+if wait > 0 then return wait end
+for i = 1, n do
+  local base = (i - 1) * 4
+  local cap = tonumber(ARGV[base + 1])
+  local rate = tonumber(ARGV[base + 2])
+  local cost = math.min(tonumber(ARGV[base + 3]), cap)
+  redis.call('HSET', KEYS[i + 1], 'tokens', levels[i] - cost, 'ts', now)
+  redis.call('PEXPIRE', KEYS[i + 1], math.ceil(cap / rate) + 1000)
+end
+return 0
+"""
+
+_script = None
+_stats = {"acquired": 0, "waited_ms": 0, "shed": 0, "blocked": 0}
+# Reconcile workers and to_thread calls from the executor update it concurrently
+_stats_lock = threading.Lock()
+
+
+def _count(field: str, amount: int = 1):
+    with _stats_lock:
+        _stats[field] += amount
+
+
+class RateLimitShed(ccxt.RateLimitExceeded):
+    """Raised instead of waiting when the shared budget is exhausted."""
+
+
+@contextmanager
+def rate_limit_mode(mode: str = "wait", priority: str = "normal"):
+    """Choose ``wait``/``shed`` and ``normal``/``low`` priority for calls in this block."""
+    token = _mode.set((mode, priority))
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def account_id(api_key: str) -> str:
+    return hashlib.sha1(api_key.encode()).hexdigest()[:16]
+
+
+def order_count(path: str, method: str, params: dict) -> int:
+    if method != "POST" or path not in ORDER_PATHS:
+        return 0
+    batch = params.get("batchOrders")
+    if isinstance(batch, str):
+        try:
+            batch = json.loads(batch)
+        except ValueError:
+            batch = None
+    return len(batch) if isinstance(batch, list) else 1
+
+
+def _buckets(exchange, market: str, account: str, cost: float, orders: int, reserve: float):
+    per_minute = 60000 / exchange.rateLimit * settings.RATE_LIMIT_HEADROOM
+    keys = [f"rl:{market}:ip:weight"]
+    args = [per_minute, per_minute / 60000, cost, per_minute * reserve]
+    if orders:
+        limit, seconds = ORDER_LIMITS[market]
+        capacity = limit * settings.RATE_LIMIT_HEADROOM
+        keys.append(f"rl:{market}:key:{account}:orders")
+        args += [capacity, capacity / (seconds * 1000), orders, capacity * reserve]
+    return keys, args
+
+
+def acquire(exchange, market: str, account: str, cost: float, orders: int = 0):
+    """Take tokens for one request, sleeping or raising per the current mode."""
+    global _script
+    client = get_redis()
+    if client is None:
+        return
+    mode, priority = _mode.get()
+    reserve = settings.RATE_LIMIT_LOW_PRIORITY_RESERVE if priority == "low" else 0.0
+    keys, args = _buckets(exchange, market, account, cost, orders, reserve)
+    keys.insert(0, f"rl:{market}:ip:block")
+    deadline = time.monotonic() + settings.RATE_LIMIT_MAX_WAIT
+    while True:
+        try:
+            if _script is None:
+                _script = client.register_script(_ACQUIRE)
+            wait_ms = int(_script(keys=keys, args=args))
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, continuing without it: {e}")
+            return
+        if wait_ms <= 0:
+            _count("acquired")
+            return
+        if mode == "shed" or time.monotonic() + wait_ms / 1000 > deadline:
+            _count("shed")
+            raise RateLimitShed(f"{market} request budget exhausted, retry in {wait_ms}ms")
+        _count("waited_ms", wait_ms)
+        time.sleep(wait_ms / 1000)
+
+
+def block_market(exchange, market: str):
+    """Stop every worker from calling a market after Binance answered 429/418."""
+    headers = {k.lower(): v for k, v in (getattr(exchange, "last_response_headers", None) or {}).items()}
+    try:
+        retry_after = int(headers.get("retry-after") or 60)
+    except ValueError:
+        retry_after = 60
+    _count("blocked")
+    logger.error(f"Binance rate limit hit on {market}, blocking all calls for {retry_after}s")
+    client = get_redis()
+    if client is not None:
+        try:
+            client.set(f"rl:{market}:ip:block", 1, px=retry_after * 1000)
+        except Exception:
+            pass
+
+
+def install_rate_limiter(exchange, market: str, api_key: str = ""):
+    """Wrap ``exchange.fetch2`` (sync or async CCXT) with the shared limiter."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return exchange
+    account = account_id(api_key or "")
+    original = exchange.fetch2
+
+    def _cost(path, api, method, params, config):
+        cost = exchange.calculate_rate_limiter_cost(api, method, path, params, config)
+        return cost, order_count(path, method, params)
+
+    if asyncio.iscoroutinefunction(original):
+
+        async def fetch2(path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+            cost, orders = _cost(path, api, method, params, config)
+            await asyncio.to_thread(acquire, exchange, market, account, cost, orders)
+            try:
+                return await original(path, api, method, params, headers, body, config)
+            except ccxt.DDoSProtection:
+                await asyncio.to_thread(block_market, exchange, market)
+                raise
+
+    else:
+
+        def fetch2(path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+            cost, orders = _cost(path, api, method, params, config)
+            acquire(exchange, market, account, cost, orders)
+            try:
+                return original(path, api, method, params, headers, body, config)
+            except ccxt.DDoSProtection:
+                block_market(exchange, market)
+                raise
+
+    exchange.fetch2 = fetch2
+    return exchange
+
+
+def rate_limit_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
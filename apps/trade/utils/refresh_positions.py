@@ -1,6 +1,6 @@
 from apps.accounts.models import UserKey
 from apps.trade.models import FutureOrder, SpotOrder, FutureTakeProfit
-from apps.trade.utils.common import make_futures_exchange, make_spot_exchange
+from apps.trade.utils.common import get_futures_exchange, get_spot_exchange
 
 import logging
 from django.utils import timezone
@@ -9,46 +9,124 @@ from decimal import Decimal
 logger = logging.getLogger(__name__)
 
 
+def is_filled(info: dict) -> bool:
+    return info.get("remaining") == 0 and info.get("status") == "closed"
+
+
+def apply_sl_fill(order: FutureOrder, sl_info: dict) -> bool:
+    """Close a position from its filled stop-loss order and save it.
+
+    The POSITION -> CLOSED transition is claimed with a conditional update so
+    the stream listener and the reconciliation cron never both apply a fill.
+    """
+    claimed = FutureOrder.objects.filter(
+        pk=order.pk, status=FutureOrder.TradeStatus.POSITION
+    ).update(status=FutureOrder.TradeStatus.CLOSED)
+    if not claimed:
+        return False
+    qty = float(order.order_quantity)
+    exit_avg = float(sl_info.get("average") or sl_info.get("price") or 0)
+    order.status = FutureOrder.TradeStatus.CLOSED
+    order.stop_loss_price = exit_avg
+    order.stop_loss_status = FutureOrder.TradeStatus.CLOSED
+    fee = sl_info.get("fee") or {}
+    fee_cost = float(fee.get("cost", 0))
+    order.stop_loss_fee = fee_cost
+    order.total_fee = float(order.total_fee or 0) + fee_cost
+    entry = float(order.entry_price)
+    if order.direction == FutureOrder.TradeDirection.LONG:
+        order.pnl = (exit_avg - entry) * qty
+    else:
+        order.pnl = (entry - exit_avg) * qty
+    order.pnl_percentage = (float(order.pnl) / entry) * 100
+    order.closed_at = timezone.now()
+    order.save()
+    return True
+
+
+def apply_tp_fill(order: FutureOrder, child: FutureTakeProfit, info: dict) -> bool:
+    """Mark a TP leg filled and accumulate its fee and realized PnL on the parent (unsaved).
+
+    Returns False when the leg had already been applied elsewhere.
+    """
+    exit_avg = float(info.get("average") or info.get("price") or 0)
+    fee = info.get("fee") or {}
+    child.fee = float(fee.get("cost", 0))
+    claimed = (
+        FutureTakeProfit.objects.filter(pk=child.pk)
+        .exclude(status=FutureTakeProfit.TradeStatus.CLOSED)
+        .update(status=FutureTakeProfit.TradeStatus.CLOSED, fee=child.fee)
+    )
+    child.status = FutureTakeProfit.TradeStatus.CLOSED
+    if not claimed:
+        return False
+    order.total_fee = float(order.total_fee or 0) + float(child.fee)
+    # Realized PnL accumulation for this filled TP leg
+    entry = float(order.entry_price)
+    qty_leg = float(child.quantity)
+    pnl_leg = (
+        (exit_avg - entry) * qty_leg
+        if order.direction == FutureOrder.TradeDirection.LONG
+        else (entry - exit_avg) * qty_leg
+    )
+    order.pnl = float(order.pnl or 0) + pnl_leg
+    notional = entry * float(order.order_quantity or 0)
+    if notional:
+        order.pnl_percentage = (float(order.pnl) / notional) * 100
+    return True
+
+
+def close_if_ladder_filled(order: FutureOrder, children) -> bool:
+    """Close the parent (unsaved) once filled TP legs cover the whole quantity."""
+    closed_qty = sum(float(c.quantity) for c in children if c.status == FutureTakeProfit.TradeStatus.CLOSED)
+    if closed_qty >= float(order.order_quantity) and order.status == FutureOrder.TradeStatus.POSITION:
+        order.status = FutureOrder.TradeStatus.CLOSED
+        order.stop_loss_status = FutureOrder.TradeStatus.CANCELLED
+        order.closed_at = timezone.now()
+        return True
+    return False
+
+
+def recompute_realized_pnl(order: FutureOrder, children=None):
+    """Ensure realized PnL reflects any already-closed TP legs."""
+    if children is None:
+        children = FutureTakeProfit.objects.filter(order=order)
+    closed_children = [c for c in children if c.status == FutureTakeProfit.TradeStatus.CLOSED]
+    if not closed_children:
+        return
+    entry = Decimal(str(order.entry_price))
+    total_qty = Decimal(str(order.order_quantity)) if order.order_quantity else Decimal("0")
+    realized = Decimal("0")
+    for child in closed_children:
+        exit_avg = Decimal(str(child.price))
+        qty_leg = Decimal(str(child.quantity))
+        if order.direction == FutureOrder.TradeDirection.LONG:
+            realized += (exit_avg - entry) * qty_leg
+        else:
+            realized += (entry - exit_avg) * qty_leg
+    order.pnl = realized
+    if total_qty and entry:
+        notional = entry * total_qty
+        order.pnl_percentage = (realized / notional) * Decimal("100")
+    order.save(update_fields=["pnl", "pnl_percentage"])
+
+
 def refresh_futures_order(order: FutureOrder) -> bool:
     """Check remote TP/SL orders and sync local order. Returns True if updated."""
     try:
         user_key = UserKey.objects.get(user=order.user, is_active=True)
-        ex = make_futures_exchange(api_key=user_key.api_key, api_secret=user_key.api_secret)
+        ex = get_futures_exchange(user_key)
         symbol = order.symbol
-        qty = float(order.order_quantity)
-
-        updated = False
 
         # Check SL
         if order.stop_loss_order_id:
             try:
                 sl_info = ex.fetch_order(id=order.stop_loss_order_id, symbol=symbol)
-                if sl_info.get("remaining") == 0 and sl_info.get("status") == "closed":
-                    exit_avg = float(sl_info.get("average") or sl_info.get("price") or 0)
-                    # mark as SL closed
-                    order.status = FutureOrder.TradeStatus.CLOSED
-                    order.stop_loss_price = exit_avg
-                    order.stop_loss_status = FutureOrder.TradeStatus.CLOSED
-                    fee = sl_info.get("fee") or {}
-                    fee_cost = float(fee.get("cost", 0))
-                    order.stop_loss_fee = fee_cost
-                    order.total_fee = float(order.total_fee or 0) + fee_cost
-                    if order.direction == FutureOrder.TradeDirection.LONG:
-                        entry = float(order.entry_price)
-                        order.pnl = (exit_avg - entry) * qty
-                    else:
-                        entry = float(order.entry_price)
-                        order.pnl = (entry - exit_avg) * qty
-                    order.pnl_percentage = (float(order.pnl) / float(order.entry_price)) * 100
-                    order.closed_at = timezone.now()
-                    order.save()
-                    updated = True
-                    return updated
+                if is_filled(sl_info) and apply_sl_fill(order, sl_info):
+                    return True
             except Exception:
                 pass
 
-        # Legacy parent TP removed
-
         # Check multiple TPs (children). Do not close parent unless all filled.
         children = list(FutureTakeProfit.objects.filter(order=order))
         if children:
@@ -58,75 +136,71 @@ def refresh_futures_order(order: FutureOrder) -> bool:
                     continue
                 try:
                     info = ex.fetch_order(id=child.tp_order_id, symbol=symbol)
-                    if info.get("remaining") == 0 and info.get("status") == "closed":
-                        exit_avg = float(info.get("average") or info.get("price") or 0)
-                        fee = info.get("fee") or {}
-                        child.status = FutureTakeProfit.TradeStatus.CLOSED
-                        child.fee = float(fee.get("cost", 0))
-                        child.save()
-                        # Optionally accumulate fees/pnl on parent
-                        order.total_fee = float(order.total_fee or 0) + float(child.fee)
-                        # Realized PnL accumulation for this filled TP leg
-                        entry = float(order.entry_price)
-                        qty_leg = float(child.quantity)
-                        pnl_leg = (
-                            (exit_avg - entry) * qty_leg
-                            if order.direction == FutureOrder.TradeDirection.LONG
-                            else (entry - exit_avg) * qty_leg
-                        )
-                        order.pnl = float(order.pnl or 0) + pnl_leg
-                        notional = entry * float(order.order_quantity or 0)
-                        if notional:
-                            order.pnl_percentage = (float(order.pnl) / notional) * 100
+                    if is_filled(info) and apply_tp_fill(order, child, info):
                         any_updated = True
                 except Exception:
                     pass
 
             if any_updated:
-                # If all TP children closed and no SL closed and not parent TP, we can consider parent closed if sum qty equals order qty.
-                closed_qty = sum(float(c.quantity) for c in children if c.status == FutureTakeProfit.TradeStatus.CLOSED)
-                total_qty = float(order.order_quantity)
-                if closed_qty >= total_qty and order.status == FutureOrder.TradeStatus.POSITION:
-                    order.status = FutureOrder.TradeStatus.CLOSED
-                    order.stop_loss_status = FutureOrder.TradeStatus.CANCELLED
-                    order.closed_at = timezone.now()
+                close_if_ladder_filled(order, children)
                 order.save()
                 return True
 
         # Fallback: ensure realized PnL reflects any already-closed TP legs
         try:
-            closed_children = list(FutureTakeProfit.objects.filter(order=order, status=FutureTakeProfit.TradeStatus.CLOSED))
-            if closed_children:
-                entry = Decimal(str(order.entry_price))
-                total_qty = Decimal(str(order.order_quantity)) if order.order_quantity else Decimal("0")
-                realized = Decimal("0")
-                for child in closed_children:
-                    exit_avg = Decimal(str(child.price))
-                    qty_leg = Decimal(str(child.quantity))
-                    if order.direction == FutureOrder.TradeDirection.LONG:
-                        realized += (exit_avg - entry) * qty_leg
-                    else:
-                        realized += (entry - exit_avg) * qty_leg
-                order.pnl = realized
-                if total_qty and entry:
-                    notional = entry * total_qty
-                    order.pnl_percentage = (realized / notional) * Decimal("100")
-                order.save(update_fields=["pnl", "pnl_percentage"])
+            recompute_realized_pnl(order, children)
         except Exception:
             pass
-        return updated
+        return False
     except Exception as e:
         logger.error(f"Failed to refresh futures order {order.id}: {e}")
         return False
 
 
+def apply_spot_exit(order: SpotOrder, info: dict, stop_loss: bool = False) -> bool:
+    """Close a spot position from a filled exit (or stop-loss) order and save it.
+
+    Claimed like ``apply_sl_fill``; returns False when the stream listener or
+    the refresh cron already applied the fill.
+    """
+    claimed = SpotOrder.objects.filter(
+        pk=order.pk, status=SpotOrder.TradeStatus.POSITION
+    ).update(status=SpotOrder.TradeStatus.CLOSED)
+    if not claimed:
+        return False
+    avg = float(info.get("average") or info.get("price") or 0)
+    qty = float(order.final_quantity or order.order_quantity)
+    order.exit_price = avg
+    order.status = SpotOrder.TradeStatus.CLOSED
+    if stop_loss:
+        order.stop_loss_status = SpotOrder.TradeStatus.CLOSED
+    order.closed_at = timezone.now()
+    entry_val = float(order.entry_price) * qty
+    exit_val = avg * qty
+    if order.direction == SpotOrder.TradeDirection.LONG:
+        order.pnl = exit_val - entry_val
+    else:
+        order.pnl = entry_val - exit_val
+    order.pnl_percentage = (float(order.pnl) / entry_val) * 100 if entry_val else 0
+    fee = info.get("fee") or {}
+    if fee:
+        try:
+            order.exit_fee = float(fee.get("cost", 0))
+            order.exit_fee_currency = fee.get("currency", order.entry_fee_currency)
+            order.total_fee = float(order.total_fee or 0) + float(fee.get("cost", 0))
+        except Exception:
+            pass
+    order.save()
+    return True
+
+
 def refresh_spot_order(order: SpotOrder) -> bool:
     """Best-effort: check for opposite-side closed orders after creation and close locally.
     This is heuristic because we don't persist the stop order id for spot.
     """
     try:
         user_key = UserKey.objects.get(user=order.user, is_active=True)
-        ex = make_spot_exchange(api_key=user_key.api_key, api_secret=user_key.api_secret)
+        ex = get_spot_exchange(user_key)
         symbol = order.symbol
         side = "sell" if order.direction == SpotOrder.TradeDirection.LONG else "buy"
 
@@ -134,30 +208,8 @@ def refresh_spot_order(order: SpotOrder) -> bool:
         if order.stop_loss_order_id:
             try:
                 sl_info = ex.fetch_order(id=order.stop_loss_order_id, symbol=symbol)
-                if sl_info.get("remaining") == 0 and sl_info.get("status") == "closed":
-                    avg = float(sl_info.get("average") or sl_info.get("price") or 0)
-                    qty = float(order.final_quantity or order.order_quantity)
-                    order.exit_price = avg
-                    order.status = SpotOrder.TradeStatus.CLOSED
-                    order.stop_loss_status = SpotOrder.TradeStatus.CLOSED
-                    order.closed_at = timezone.now()
-                    entry_val = float(order.entry_price) * qty
-                    exit_val = avg * qty
-                    if order.direction == SpotOrder.TradeDirection.LONG:
-                        order.pnl = exit_val - entry_val
-                    else:
-                        order.pnl = entry_val - exit_val
-                    order.pnl_percentage = (float(order.pnl) / entry_val) * 100 if entry_val else 0
-                    fee = sl_info.get("fee") or {}
-                    if fee:
-                        try:
-                            order.exit_fee = float(fee.get("cost", 0))
-                            order.exit_fee_currency = fee.get("currency", order.entry_fee_currency)
-                            order.total_fee = float(order.total_fee or 0) + float(fee.get("cost", 0))
-                        except Exception:
-                            pass
-                    order.save()
-                    return True
+                if is_filled(sl_info):
+                    return apply_spot_exit(order, sl_info, stop_loss=True)
             except Exception:
                 pass
 
@@ -167,28 +219,7 @@ def refresh_spot_order(order: SpotOrder) -> bool:
             closed = ex.fetch_closed_orders(symbol, since)
             for co in closed or []:
                 if (co.get("side") == side) and co.get("status") == "closed":
-                    avg = float(co.get("average") or co.get("price") or 0)
-                    qty = float(order.final_quantity or order.order_quantity)
-                    order.exit_price = avg
-                    order.status = SpotOrder.TradeStatus.CLOSED
-                    order.closed_at = timezone.now()
-                    entry_val = float(order.entry_price) * qty
-                    exit_val = avg * qty
-                    if order.direction == SpotOrder.TradeDirection.LONG:
-                        order.pnl = exit_val - entry_val
-                    else:
-                        order.pnl = entry_val - exit_val
-                    order.pnl_percentage = (float(order.pnl) / entry_val) * 100 if entry_val else 0
-                    fee = co.get("fee") or {}
-                    if fee:
-                        try:
-                            order.exit_fee = float(fee.get("cost", 0))
-                            order.exit_fee_currency = fee.get("currency", order.entry_fee_currency)
-                            order.total_fee = float(order.total_fee or 0) + float(fee.get("cost", 0))
-                        except Exception:
-                            pass
-                    order.save()
-                    return True
+                    return apply_spot_exit(order, co)
         except Exception:
             pass
 
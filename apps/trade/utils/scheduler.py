@@ -0,0 +1,129 @@
+"""Bounded, weight-aware thread pool for per-user exchange jobs.
+
+Jobs run concurrently up to a global cap, at most ``per_key`` at a time for
+the same API key, and only until a wall-clock deadline: jobs that have not
+started by then are skipped, and jobs still running when it passes are
+reported as overrun and left behind rather than waited on. After each job the pool reads
+Binance's ``X-MBX-USED-WEIGHT-1M`` header from the job's client. When the
+IP-wide weight nears the limit, new jobs wait for the next minute window.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_HEADER = "x-mbx-used-weight-1m"
+# Lets jobs that give up at the deadline (slot or weight wait) report themselves as skipped
+DEADLINE_GRACE = 1.0
+
+
+class WeightMonitor:
+    """Follows the used-weight header and throttles near the per-minute limit."""
+
+    def __init__(self, limit: int, headroom: float = 0.8):
+        self.threshold = limit * headroom
+        self.peak = 0
+        self.consumed = 0
+        self._minute = None
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def observe(self, headers):
+        value = None
+        for name, raw in (headers or {}).items():
+            if name.lower() == WEIGHT_HEADER:
+                try:
+                    value = int(raw)
+                except (TypeError, ValueError):
+                    return
+                break
+        if value is None:
+            return
+        minute = int(time.time() // 60)
+        with self._lock:
+            if minute != self._minute:
+                self._minute, self._last = minute, 0
+            if value > self._last:
+                self.consumed += value - self._last
+                self._last = value
+            self.peak = max(self.peak, value)
+
+    def wait(self, deadline: float):
+        """Block until there is weight headroom or the deadline passes."""
+        while True:
+            with self._lock:
+                saturated = self._minute == int(time.time() // 60) and self._last >= self.threshold
+            if not saturated or time.monotonic() >= deadline:
+                return
+            pause = min(60 - time.time() % 60 + 0.5, max(0.0, deadline - time.monotonic()))
+            logger.info(f"Used weight {self._last} near limit, pausing {pause:.1f}s")
+            time.sleep(pause)
+
+
+def run_bounded(jobs, *, max_workers: int, per_key: int, deadline: float, monitor: WeightMonitor) -> dict:
+    """Run ``jobs`` as ``(key, label, fn)`` where ``fn()`` returns ``(exchange, result)``.
+
+    Returns counts of processed, failed, skipped and overrun jobs plus the
+    list of results from jobs that finished. Returns by the deadline even if
+    a job hangs; its worker thread is abandoned and its result dropped.
+    """
+    key_slots = defaultdict(lambda: threading.BoundedSemaphore(per_key))
+    slots_lock = threading.Lock()
+    stats = {"processed": 0, "failed": 0, "skipped": 0, "overrun": 0, "results": []}
+    stats_lock = threading.Lock()
+    finished = threading.Event()
+
+    def _count(field, result=None):
+        with stats_lock:
+            if finished.is_set():
+                # Reported as overrun already
+                return
+            stats[field] += 1
+            if result is not None:
+                stats["results"].append(result)
+
+    def _run(key, label, fn):
+        monitor.wait(deadline)
+        with slots_lock:
+            slot = key_slots[key]
+        if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            _count("skipped")
+            return
+        try:
+            if time.monotonic() >= deadline:
+                _count("skipped")
+                return
+            exchange, result = fn()
+            monitor.observe(getattr(exchange, "last_response_headers", None))
+            _count("processed", result)
+        except Exception as e:
+            logger.error(f"Job for {label} failed: {e}")
+            _count("failed")
+        finally:
+            slot.release()
+            # Worker threads each hold their own DB connection
+            connection.close()
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reconcile")
+    futures = {}
+    try:
+        for key, label, fn in jobs:
+            futures[pool.submit(_run, key, label, fn)] = label
+        _, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()) + DEADLINE_GRACE)
+        with stats_lock:
+            finished.set()
+            for future in pending:
+                if future.cancel():
+                    stats["skipped"] += 1
+                else:
+                    stats["overrun"] += 1
+                    logger.error(f"Job for {futures[future]} still running at the deadline")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return stats
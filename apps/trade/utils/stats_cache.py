@@ -0,0 +1,81 @@
+"""Per-user cache of computed stats pages, invalidated by order changes.
+
+Each user has a version counter that order saves and deletes bump (see
+``PnlRollupMixin``). Cached results are keyed by that version, so the
+first read after a change misses and recomputes, and the old entries
+simply expire. The cache key also includes today's date, because the
+``days`` window moves at midnight.
+
+Bumps only reach readers through a cache shared by every process, so
+``STATS_CACHE_TTL`` defaults to 0 (no caching) without ``REDIS_URL``.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_stats = {"hits": 0, "misses": 0, "errors": 0, "disabled": 0}
+
+
+def _version_key(user_id) -> str:
+    return f"stats:ver:{user_id}"
+
+
+def _initial_version() -> int:
+    # Time-based so a counter lost to eviction never reuses old entries
+    return int(time.time() * 1000)
+
+
+def stats_version(user_id) -> int:
+    return cache.get_or_set(_version_key(user_id), _initial_version, timeout=None)
+
+
+def bump_stats_version(user_id):
+    """Invalidate every cached stats result of a user."""
+    if user_id is None:
+        return
+    key = _version_key(user_id)
+    try:
+        if not cache.add(key, _initial_version(), timeout=None):
+            cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Could not bump stats version for user {user_id}: {e}")
+        # Still make sure stale entries go away
+        try:
+            cache.delete(key)
+        except Exception:
+            pass
+
+
+def cached_stats(user_id, params: tuple, compute):
+    """Return ``compute()`` cached per user, version, date and ``params``."""
+    if settings.STATS_CACHE_TTL <= 0:
+        _stats["disabled"] += 1
+        return compute()
+    try:
+        version = stats_version(user_id)
+        key = f"stats:{user_id}:{version}:{timezone.localdate():%Y%m%d}:" + ":".join(map(str, params))
+        result = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Stats cache unavailable for user {user_id}: {e}")
+        _stats["errors"] += 1
+        return compute()
+    if result is not None:
+        _stats["hits"] += 1
+        return result
+    _stats["misses"] += 1
+    result = compute()
+    try:
+        cache.set(key, result, timeout=settings.STATS_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Could not cache stats for user {user_id}: {e}")
+    return result
+
+
+def stats_cache_stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,239 @@
+"""Binance user data streams: order fills and balances pushed, not polled.
+
+``UserDataStreamService`` keeps one listenKey and one WebSocket per active
+UserKey for a market. Keys are created on connect, kept alive every
+``USER_STREAM_KEEPALIVE_INTERVAL`` seconds and renewed after a
+``listenKeyExpired`` event, a failed keepalive or a dropped socket.
+
+Futures ``ORDER_TRADE_UPDATE`` and spot ``executionReport`` fills go through
+the same helpers as the reconciliation cron. The cron stays as a safety
+net, and the conditional updates in those helpers make sure a fill is
+applied once. Balance events go to ``apps.trade.utils.balances``.
+"""
+
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.accounts.models import UserKey
+from apps.trade.models import FutureOrder, FutureTakeProfit, SpotOrder
+from apps.trade.utils.balances import (
+    apply_account_update,
+    invalidate_balance,
+    mark_stream_alive,
+    mark_stream_down,
+    refresh_balances,
+)
+from apps.trade.utils.common import FUTURES, SPOT, get_futures_exchange, get_spot_exchange
+from apps.trade.utils.refresh_positions import (
+    apply_sl_fill,
+    apply_spot_exit,
+    apply_tp_fill,
+    close_if_ladder_filled,
+)
+from apps.trade.utils.ws import AiohttpTransport
+
+logger = logging.getLogger(__name__)
+
+STREAM_URLS = {
+    FUTURES: "wss://fstream.binance.com/ws/",
+    SPOT: "wss://stream.binance.com:9443/ws/",
+}
+
+
+def create_listen_key(exchange, market: str) -> str:
+    if market == FUTURES:
+        return exchange.fapiPrivatePostListenKey()["listenKey"]
+    return exchange.publicPostUserDataStream()["listenKey"]
+
+
+def keepalive_listen_key(exchange, market: str, listen_key: str):
+    if market == FUTURES:
+        exchange.fapiPrivatePutListenKey()
+    else:
+        exchange.publicPutUserDataStream({"listenKey": listen_key})
+
+
+def apply_futures_order_update(user_id, update: dict, fee: float) -> str | None:
+    """Apply a FILLED ``ORDER_TRADE_UPDATE`` payload; returns "sl", "tp" or None."""
+    order_id = str(update["i"])
+    info = {
+        "average": float(update.get("ap") or 0) or float(update.get("L") or 0),
+        "fee": {"cost": fee, "currency": update.get("N")},
+    }
+    order = FutureOrder.objects.filter(
+        user_id=user_id, stop_loss_order_id=order_id, status=FutureOrder.TradeStatus.POSITION
+    ).first()
+    if order is not None:
+        return "sl" if apply_sl_fill(order, info) else None
+
+    child = (
+        FutureTakeProfit.objects.select_related("order")
+        .filter(order__user_id=user_id, tp_order_id=order_id)
+        .exclude(status=FutureTakeProfit.TradeStatus.CLOSED)
+        .first()
+    )
+    if child is None or child.order.status != FutureOrder.TradeStatus.POSITION:
+        return None
+    order = child.order
+    if not apply_tp_fill(order, child, info):
+        return None
+    close_if_ladder_filled(order, list(order.tps.all()))
+    order.save()
+    return "tp"
+
+
+def apply_spot_execution_report(user_id, report: dict, fee: float) -> str | None:
+    """Apply a FILLED ``executionReport`` for a stored spot stop-loss."""
+    order = SpotOrder.objects.filter(
+        user_id=user_id, stop_loss_order_id=str(report["i"]), status=SpotOrder.TradeStatus.POSITION
+    ).first()
+    if order is None:
+        return None
+    filled = float(report.get("z") or 0)
+    info = {
+        "average": float(report.get("Z") or 0) / filled if filled else float(report.get("L") or 0),
+        "fee": {"cost": fee, "currency": report.get("N")},
+    }
+    return "sl" if apply_spot_exit(order, info, stop_loss=True) else None
+
+
+class UserDataStreamService:
+    """Listens to the user data stream of every active UserKey for one market."""
+
+    def __init__(self, market: str, transport=None):
+        self.market = market
+        self.transport = transport or AiohttpTransport()
+        self.applied = {"sl": 0, "tp": 0}
+        # Commission is reported per trade; sum it until the order is done
+        self._fees = {}
+
+    def active_keys(self) -> dict:
+        close_old_connections()
+        try:
+            return {key.user_id: key for key in UserKey.objects.filter(is_active=True)}
+        finally:
+            close_old_connections()
+
+    def exchange_for(self, user_key):
+        return get_futures_exchange(user_key) if self.market == FUTURES else get_spot_exchange(user_key)
+
+    def _order_event(self, user_id, order: dict):
+        order_id = str(order.get("i"))
+        if order.get("x") == "TRADE":
+            self._fees[order_id] = self._fees.get(order_id, 0.0) + float(order.get("n") or 0)
+        status = order.get("X")
+        if status not in ("FILLED", "CANCELED", "EXPIRED", "REJECTED", "EXPIRED_IN_MATCH"):
+            return None
+        fee = self._fees.pop(order_id, 0.0)
+        if status != "FILLED":
+            return None
+        if self.market == FUTURES:
+            return apply_futures_order_update(user_id, order, fee)
+        return apply_spot_execution_report(user_id, order, fee)
+
+    def handle(self, user_id, exchange, raw: str) -> str | None:
+        """Apply one stream frame; returns the event type."""
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return None
+        event_type = event.get("e")
+        # Long-running process: drop connections the server closed or that
+        # outlived CONN_MAX_AGE, as Django does around each request
+        close_old_connections()
+        try:
+            if event_type == "ORDER_TRADE_UPDATE":
+                applied = self._order_event(user_id, event.get("o") or {})
+            elif event_type == "executionReport":
+                applied = self._order_event(user_id, event)
+            elif event_type in ("ACCOUNT_UPDATE", "outboundAccountPosition"):
+                applied = None
+                if not apply_account_update(user_id, self.market, event):
+                    try:
+                        refresh_balances(exchange, user_id, self.market)
+                    except Exception:
+                        # Readers trust the stream's snapshot; do not leave a stale one
+                        invalidate_balance(user_id, self.market, force=True)
+                        raise
+            else:
+                applied = None
+            if applied:
+                self.applied[applied] += 1
+                logger.info(f"Applied {applied} fill from {self.market} stream for user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to apply {event_type} for user {user_id}: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+        return event_type
+
+    async def _keepalive(self, exchange, listen_key: str):
+        while True:
+            await asyncio.sleep(settings.USER_STREAM_KEEPALIVE_INTERVAL)
+            try:
+                await asyncio.to_thread(keepalive_listen_key, exchange, self.market, listen_key)
+            except Exception as e:
+                logger.warning(f"listenKey keepalive failed, renewing: {e}")
+                return
+
+    async def _heartbeat(self, user_id):
+        while True:
+            await asyncio.to_thread(mark_stream_alive, user_id, self.market)
+            await asyncio.sleep(settings.USER_STREAM_HEARTBEAT_INTERVAL)
+
+    async def _consume(self, user_id, exchange, url: str):
+        async for raw in self.transport.messages(url):
+            if await asyncio.to_thread(self.handle, user_id, exchange, raw) == "listenKeyExpired":
+                return
+
+    async def stream_user(self, user_key):
+        """Connect, consume and renew one user's stream until cancelled."""
+        backoff = 1
+        while True:
+            try:
+                exchange = await asyncio.to_thread(self.exchange_for, user_key)
+                listen_key = await asyncio.to_thread(create_listen_key, exchange, self.market)
+            except Exception as e:
+                logger.warning(f"Could not open {self.market} user stream for user {user_key.user_id}: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+                continue
+            backoff = 1
+            consumer = asyncio.create_task(self._consume(user_key.user_id, exchange, STREAM_URLS[self.market] + listen_key))
+            keepalive = asyncio.create_task(self._keepalive(exchange, listen_key))
+            heartbeat = asyncio.create_task(self._heartbeat(user_key.user_id))
+            try:
+                await asyncio.wait([consumer, keepalive], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in (consumer, keepalive, heartbeat):
+                    task.cancel()
+                await asyncio.gather(consumer, keepalive, heartbeat, return_exceptions=True)
+                # Until we reconnect, balance snapshots fall back to the short TTL
+                await asyncio.to_thread(mark_stream_down, user_key.user_id, self.market)
+            await asyncio.sleep(1)
+
+    async def run(self, stop_event: asyncio.Event | None = None):
+        stop_event = stop_event or asyncio.Event()
+        tasks, fingerprints = {}, {}
+        try:
+            while not stop_event.is_set():
+                keys = await asyncio.to_thread(self.active_keys)
+                for user_id in list(tasks):
+                    key = keys.get(user_id)
+                    if key is None or fingerprints[user_id] != (key._api_key, key._api_secret):
+                        tasks.pop(user_id).cancel()
+                for user_id, key in keys.items():
+                    if user_id not in tasks or tasks[user_id].done():
+                        tasks[user_id] = asyncio.create_task(self.stream_user(key))
+                        fingerprints[user_id] = (key._api_key, key._api_secret)
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=settings.USER_STREAM_REFRESH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
@@ -0,0 +1,137 @@
+"""Webhook signal parsing, validation and publishing.
+
+Kept free of request objects so the async webhook view only awaits one
+worker-thread hop for the (blocking) dedup check and broker publish.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from apps.trade.task import (
+    close_order_of_user_controller,
+    create_order_of_user_controller,
+    handle_futures_signal_controller,
+)
+from apps.trade.utils.dedup import claim_signal, release_signal
+from apps.trade.utils.executor import enqueue_signal
+
+try:
+    import orjson
+
+    loads = orjson.loads
+    DecodeError = orjson.JSONDecodeError
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    import json
+
+    loads = json.loads
+    DecodeError = json.JSONDecodeError
+
+logger = logging.getLogger(__name__)
+
+SIDES = frozenset(("buy", "sell"))
+_NUMBER_TYPES = (int, float, str)
+
+
+class InvalidSignal(ValueError):
+    pass
+
+
+def _number(payload: dict, field: str):
+    value = payload.get(field)
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not isinstance(value, _NUMBER_TYPES):
+        raise InvalidSignal(f"{field} must be a number")
+    try:
+        float(value)
+    except ValueError:
+        raise InvalidSignal(f"{field} must be a number")
+    return value
+
+
+def parse_signal(body: bytes) -> dict:
+    """Decode and validate a TradingView alert body.
+
+    Raises DecodeError for malformed JSON and InvalidSignal for a payload
+    the bot cannot act on. Unknown keys are kept for de-duplication.
+    """
+    payload = loads(body)
+    if not isinstance(payload, dict):
+        raise InvalidSignal("Payload must be an object")
+    symbol = payload.get("symbol")
+    if not symbol or not isinstance(symbol, str):
+        raise InvalidSignal("Missing/invalid params")
+    if payload.get("side") not in SIDES:
+        raise InvalidSignal("Missing/invalid params")
+    market = payload.get("market")
+    if market is not None and not isinstance(market, str):
+        raise InvalidSignal("market must be a string")
+    _number(payload, "sl")
+    _number(payload, "tp")
+    tps = payload.get("tps")
+    if tps is not None:
+        if not isinstance(tps, list) or not all(isinstance(leg, dict) for leg in tps):
+            raise InvalidSignal("tps must be a list of {price, percent}")
+        for leg in tps:
+            _number(leg, "price")
+            _number(leg, "percent")
+    return payload
+
+
+def dispatch_signal(payload: dict) -> bool:
+    """Publish a validated signal; returns False when it was a duplicate."""
+    # TradingView retries alerts; drop repeats before fanning out to users
+    if not claim_signal(payload):
+        return False
+
+    side = payload["side"]
+    symbol = payload["symbol"]
+    market = payload.get("market")
+    sl, tp, tps = payload.get("sl"), payload.get("tp"), payload.get("tps")
+    try:
+        if market == "futures":
+            # Single orchestrator handles open/close/new per user
+            if settings.SIGNAL_EXECUTION_MODE == "executor":
+                enqueue_signal(side, symbol, sl, tp, tps)
+            else:
+                handle_futures_signal_controller.delay(side, symbol, sl, tp, tps)
+        else:
+            if side == "buy":
+                create_order_of_user_controller.delay(side, symbol, market, sl, tp)
+            else:
+                close_order_of_user_controller.delay(side, symbol, market)
+    except Exception:
+        # Let the sender's retry through instead of dropping it as a duplicate
+        release_signal(payload)
+        raise
+    return True
+
+
+class LatencyRecorder:
+    """Rolling window of request latencies in milliseconds."""
+
+    def __init__(self, size: int = 2048):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, started: float):
+        with self._lock:
+            self._samples.append((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+
+        return {"count": len(samples), "p50_ms": pct(0.50), "p99_ms": pct(0.99), "max_ms": round(samples[-1], 3)}
+
+
+webhook_latency = LatencyRecorder()
@@ -0,0 +1,66 @@
+"""Pluggable WebSocket transports for the streaming services.
+
+Services only depend on ``transport.messages(url)``, an async iterator of raw
+text frames, so tests and local runs can swap the Binance connection for a
+``LocalTransport`` that is fed by hand.
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+
+import aiohttp
+
+
+class AiohttpTransport:
+    """Real WebSocket connection using aiohttp (already a ccxt dependency)."""
+
+    def __init__(self, heartbeat: float = 20.0):
+        self.heartbeat = heartbeat
+
+    async def messages(self, url: str):
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(url, heartbeat=self.heartbeat) as ws:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        yield msg.data
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+
+
+class LocalTransport:
+    """In-memory stand-in for a WebSocket server.
+
+    ``push()`` queues a frame (dicts are JSON-encoded), ``disconnect()`` ends
+    the current connection and ``urls`` records every URL a service connected to.
+    With ``per_url=True`` each URL gets its own queue, for services that hold
+    several connections at once; pass ``url=`` to ``push``/``disconnect``.
+    """
+
+    _DISCONNECT = object()
+
+    def __init__(self, per_url: bool = False):
+        self.per_url = per_url
+        self.queue = asyncio.Queue()
+        self.queues = defaultdict(asyncio.Queue)
+        self.urls = []
+
+    def _queue(self, url):
+        return self.queues[url] if self.per_url else self.queue
+
+    def push(self, message, url: str | None = None):
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        self._queue(url).put_nowait(message)
+
+    def disconnect(self, url: str | None = None):
+        self._queue(url).put_nowait(self._DISCONNECT)
+
+    async def messages(self, url: str):
+        self.urls.append(url)
+        queue = self._queue(url)
+        while True:
+            message = await queue.get()
+            if message is self._DISCONNECT:
+                return
+            yield message
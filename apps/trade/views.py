@@ -2,62 +2,65 @@ from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 
-import json
+import time
 
-from apps.trade.task import (
-    create_order_of_user_controller,
-    close_order_of_user_controller,
-    handle_futures_signal_controller,
-)
+from asgiref.sync import sync_to_async
 
 from apps.trade.models import FutureOrder, FutureTakeProfit
 from apps.accounts.models import UserKey
 from apps.trade.utils.common import (
-    make_futures_exchange,
-    make_spot_exchange,
+    get_futures_exchange,
+    exchange_pool_stats,
+    get_spot_exchange,
     get_symbol_last_price,
 )
+from apps.trade.utils.dedup import dedup_stats
+from apps.trade.utils.filters import get_symbol_filters
+from apps.trade.utils.rate_limit import rate_limit_stats
+from apps.trade.utils.stats_cache import stats_cache_stats
+from apps.trade.utils.protective_orders import (
+    place_protective_orders,
+    protective_requests,
+    split_results,
+)
 from apps.trade.utils.close_order import quick_close_position
 from apps.trade.utils.close_market_order_spot import quick_close_spot_position
 from apps.trade.utils.refresh_positions import refresh_futures_order, refresh_spot_order
 from apps.trade.models import SpotOrder
+from apps.trade.utils.webhook import (
+    DecodeError,
+    InvalidSignal,
+    dispatch_signal,
+    parse_signal,
+    webhook_latency,
+)
 
 
 @csrf_exempt
-def trading_view_webhook(request):
+async def trading_view_webhook(request):
+    started = time.perf_counter()
     if request.method != "POST":
         return JsonResponse(
             {"status": "error", "message": "Only POST requests are allowed"}, status=405
         )
     try:
-        payload = json.loads(request.body)
-        symbol = payload.get("symbol")
-        side = payload.get("side")
-        market = payload.get("market", None)
-        tp = payload.get("tp")
-        tps = payload.get("tps")  # optional list of {price, percent}
-        sl = payload.get("sl")
-
-        if not symbol or side not in ("buy", "sell"):
-            return JsonResponse(
-                {"status": "error", "message": "Missing/invalid params"}, status=400
-            )
-
-        if market == "futures":
-            # Single orchestrator handles open/close/new per user
-            handle_futures_signal_controller.delay(side, symbol, sl, tp, tps)
-        else:
-            if side == "buy":
-                create_order_of_user_controller.delay(side, symbol, market, sl, tp)
-            else:
-                close_order_of_user_controller.delay(side, symbol, market)
-        return JsonResponse({"status": "success", "message": "Webhook received"})
-    except json.JSONDecodeError:
+        payload = parse_signal(request.body)
+    except DecodeError:
         return JsonResponse(
             {"status": "error", "message": "Invalid JSON payload"}, status=400
         )
+    except InvalidSignal as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    # Dedup and broker publish block, so run them off the event loop
+    published = await sync_to_async(dispatch_signal, thread_sensitive=False)(payload)
+    webhook_latency.record(started)
+    if not published:
+        return JsonResponse({"status": "success", "message": "Duplicate ignored"})
+    return JsonResponse({"status": "success", "message": "Webhook received"})
 
 
 @login_required
@@ -83,9 +86,7 @@ def update_futures_tp_sl(request):
 
     try:
         user_key = UserKey.objects.get(user=request.user, is_active=True)
-        ex = make_futures_exchange(
-            api_key=user_key.api_key, api_secret=user_key.api_secret
-        )
+        ex = get_futures_exchange(user_key)
         symbol = order.symbol
         qty = order.order_quantity
         inv_side = (
@@ -116,7 +117,7 @@ def update_futures_tp_sl(request):
                         ex.cancel_order(id=order.stop_loss_order_id, symbol=symbol)
                     except Exception:
                         pass
-                sl_price = float(ex.priceToPrecision(symbol, float(sl)))
+                sl_price = get_symbol_filters(ex, symbol).round_price(float(sl))
                 sl_o = ex.create_order(
                     symbol=symbol,
                     side=inv_side,
@@ -166,7 +167,7 @@ def update_futures_tp_sl(request):
                             child.delete()
                 except Exception:
                     pass
-                tp_price = float(ex.priceToPrecision(symbol, float(tp)))
+                tp_price = get_symbol_filters(ex, symbol).round_price(float(tp))
                 tp_o = ex.create_order(
                     symbol=symbol,
                     side=inv_side,
@@ -226,7 +227,7 @@ def update_spot_sl(request):
 
     try:
         user_key = UserKey.objects.get(user=request.user, is_active=True)
-        ex = make_spot_exchange(api_key=user_key.api_key, api_secret=user_key.api_secret)
+        ex = get_spot_exchange(user_key)
         symbol = order.symbol
 
         inv_side = (
@@ -255,8 +256,13 @@ def update_spot_sl(request):
                 except Exception:
                     pass
 
-            stop_p = float(ex.priceToPrecision(symbol, sl_val))
-            amt_p = float(ex.amountToPrecision(symbol, amount))
+            filters = get_symbol_filters(ex, symbol)
+            stop_p = filters.round_price(sl_val, inv_side)
+            amt_p = filters.round_qty(amount)
+            reject_reason = filters.check(amt_p, stop_p, reference_price=current, side=inv_side)
+            if reject_reason:
+                messages.error(request, f"SL rejected by exchange filters: {reject_reason}")
+                return redirect("accounts:history")
             # Binance spot commonly expects STOP_LOSS_LIMIT for stop protection
             sl_o = ex.create_order(
                 symbol=symbol,
@@ -332,13 +338,8 @@ def update_futures_multi_tp(request):
 
     try:
         user_key = UserKey.objects.get(user=request.user, is_active=True)
-        ex = make_futures_exchange(
-            api_key=user_key.api_key, api_secret=user_key.api_secret
-        )
+        ex = get_futures_exchange(user_key)
         symbol = order.symbol
-        inv_side = (
-            "sell" if order.direction == FutureOrder.TradeDirection.LONG else "buy"
-        )
         cur = float(get_symbol_last_price(ex, symbol) or 0)
 
         # Cancel existing OPEN/POSITION TP(s); keep CLOSED ones
@@ -355,52 +356,38 @@ def update_futures_multi_tp(request):
             pass
 
         base_qty = float(order.order_quantity)
-        market_info = ex.market(symbol)
-        min_amount = float(
-            (market_info.get("limits") or {}).get("amount", {}).get("min") or 0
-        )
-        min_cost = float(
-            (market_info.get("limits") or {}).get("cost", {}).get("min") or 0
-        )
-        # Create new multi-TPs
-        placed = 0
+        filters = get_symbol_filters(ex, symbol)
         for tp_def in defs:
             price = float(tp_def["price"])
-            percent = float(tp_def["percent"])
             if order.direction == FutureOrder.TradeDirection.LONG and price <= cur:
                 messages.error(request, "Each TP must be above current for long")
                 return redirect("accounts:history")
             if order.direction == FutureOrder.TradeDirection.SHORT and price >= cur:
                 messages.error(request, "Each TP must be below current for short")
                 return redirect("accounts:history")
-            qty = base_qty * (percent / 100.0)
-            qty_p = float(ex.amountToPrecision(symbol, qty))
-            stop_p = float(ex.priceToPrecision(symbol, price))
-            # Enforce minimum amount and notional if available
-            if min_amount and qty_p < min_amount:
-                continue
-            if min_cost and (qty_p * stop_p) < min_cost:
-                continue
-            try:
-                tp_o = ex.create_order(
-                    symbol=symbol,
-                    side=inv_side,
-                    type="TAKE_PROFIT_MARKET",
-                    amount=qty_p,
-                    params={"stopPrice": stop_p, "reduceOnly": True},
-                )
-                FutureTakeProfit.objects.create(
+        # Round the whole ladder and drop legs below min size/notional up front
+        legs, _rejected = filters.round_ladder(base_qty, defs)
+        # Create new multi-TPs, batched up to 5 per request
+        direction_side = (
+            "buy" if order.direction == FutureOrder.TradeDirection.LONG else "sell"
+        )
+        tp_requests = protective_requests(symbol, direction_side, base_qty, tp_legs=legs)
+        results = place_protective_orders(ex, tp_requests)
+        _sl, created_tps = split_results(tp_requests, results, has_stop=False)
+        FutureTakeProfit.objects.bulk_create(
+            [
+                FutureTakeProfit(
                     order=order,
-                    tp_order_id=tp_o.get("id", ""),
-                    price=stop_p,
-                    percent=percent,
-                    quantity=qty_p,
+                    tp_order_id=item["id"],
+                    price=item["price"],
+                    percent=item["percent"],
+                    quantity=item["qty"],
                     status=FutureTakeProfit.TradeStatus.POSITION,
                 )
-                placed += 1
-            except Exception as e:
-                # skip failing leg and continue placing others
-                continue
+                for item in created_tps
+            ]
+        )
+        placed = len(created_tps)
         order.save()
         if placed == 0:
             messages.error(
@@ -511,3 +498,16 @@ def toggle_ignore_signal(request):
     except Exception as e:
         messages.error(request, f"Toggle failed: {e}")
     return redirect("accounts:history")
+
+
+@staff_member_required
+def trade_metrics(request):
+    return JsonResponse(
+        {
+            "signals": dedup_stats(),
+            "webhook_latency": webhook_latency.stats(),
+            "exchange_clients": exchange_pool_stats(),
+            "rate_limit": rate_limit_stats(),
+            "stats_cache": stats_cache_stats(),
+        }
+    )
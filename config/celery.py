@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
 from django.conf import settings
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
@@ -14,3 +15,11 @@ app.conf.update(
     broker_url=settings.CELERY_BROKER_URL,
     broker_connection_retry_on_startup=True,
 )
+
+
+@worker_init.connect
+def warm_worker_caches(**kwargs):
+    # Load the shared market snapshot once; prefork children inherit it
+    from apps.trade.utils.market_cache import warm_market_cache
+
+    warm_market_cache()
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -158,6 +158,24 @@ AUTH_USER_MODEL = "accounts.User"
 
 
 CELERY_BROKER_URL = config("CELERY_BROKER_URL")
+REDIS_URL = config(
+    "REDIS_URL",
+    default=CELERY_BROKER_URL if CELERY_BROKER_URL.startswith(("redis://", "rediss://")) else "",
+)
+REDIS_SOCKET_TIMEOUT = config("REDIS_SOCKET_TIMEOUT", default=2.0, cast=float)
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "cache",
+            "OPTIONS": {
+                "socket_timeout": REDIS_SOCKET_TIMEOUT,
+                "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+            },
+        }
+    }
 FERNET_SECRET_KEY = config("FERNET_SECRET_KEY")
 
 LOGIN_URL = "/login/"
@@ -168,5 +186,103 @@ CRONJOBS = [
         "*/5 * * * *",
         "apps.trade.crons.refresh_stop_loss.refresh_orders",
         ">> /tmp/refresh_stop_loss.log",
-    )
+    ),
+    (
+        "*/15 * * * *",
+        "apps.trade.crons.refresh_markets.refresh_market_snapshots",
+        ">> /tmp/refresh_markets.log",
+    ),
+    (
+        "*/30 * * * *",
+        "apps.trade.crons.preconfigure_futures.preconfigure_futures_accounts",
+        ">> /tmp/preconfigure_futures.log",
+    ),
+    (
+        "0 3 * * *",
+        "apps.trade.crons.order_partitions.ensure_order_partitions",
+        ">> /tmp/order_partitions.log",
+    ),
+    (
+        "0 4 * * 0",
+        "apps.trade.crons.order_archive.archive_old_orders",
+        ">> /tmp/order_archive.log",
+    ),
 ]
+
+# Per-process pool of warm CCXT clients (see apps.trade.utils.common)
+EXCHANGE_CLIENT_POOL_SIZE = config("EXCHANGE_CLIENT_POOL_SIZE", default=256, cast=int)
+EXCHANGE_CLIENT_TTL = config("EXCHANGE_CLIENT_TTL", default=900, cast=int)
+
+# Shared market metadata snapshot (see apps.trade.utils.market_cache)
+MARKET_CACHE_DIR = config("MARKET_CACHE_DIR", default="/tmp/market-cache")
+MARKET_CACHE_MAX_AGE = config("MARKET_CACHE_MAX_AGE", default=6 * 60 * 60, cast=int)
+MARKET_CACHE_CHECK_INTERVAL = config("MARKET_CACHE_CHECK_INTERVAL", default=60, cast=int)
+
+# Streamed price cache (see apps.trade.utils.market_data)
+MARKET_DATA_MAX_AGE = config("MARKET_DATA_MAX_AGE", default=3.0, cast=float)
+MARKET_DATA_KEY_TTL = config("MARKET_DATA_KEY_TTL", default=300, cast=int)
+MARKET_DATA_FLUSH_INTERVAL = config("MARKET_DATA_FLUSH_INTERVAL", default=0.25, cast=float)
+MARKET_DATA_RESUBSCRIBE_INTERVAL = config("MARKET_DATA_RESUBSCRIBE_INTERVAL", default=30, cast=int)
+
+# Per-user balance snapshots (see apps.trade.utils.balances)
+BALANCE_CACHE_MAX_AGE = config("BALANCE_CACHE_MAX_AGE", default=30, cast=int)
+# Used instead while the user-data stream for that account is alive
+BALANCE_STREAM_MAX_AGE = config("BALANCE_STREAM_MAX_AGE", default=15 * 60, cast=int)
+BALANCE_CACHE_KEY_TTL = config("BALANCE_CACHE_KEY_TTL", default=3600, cast=int)
+
+# Signal fan-out: "chunked" publishes one Celery group of chunk tasks,
+# "per_user" publishes one task per user
+SIGNAL_FANOUT_MODE = config("SIGNAL_FANOUT_MODE", default="chunked")
+SIGNAL_FANOUT_CHUNK_SIZE = config("SIGNAL_FANOUT_CHUNK_SIZE", default=25, cast=int)
+# Users of one chunk run concurrently (greenlets under the gevent worker)
+SIGNAL_FANOUT_CHUNK_CONCURRENCY = config("SIGNAL_FANOUT_CHUNK_CONCURRENCY", default=25, cast=int)
+
+# Futures signal execution: "celery" fans out tasks, "executor" hands signals
+# to the asyncio daemon started with `manage.py run_executor`
+SIGNAL_EXECUTION_MODE = config("SIGNAL_EXECUTION_MODE", default="celery")
+EXECUTOR_QUEUE = config("EXECUTOR_QUEUE", default="executor:signals")
+EXECUTOR_CONCURRENCY = config("EXECUTOR_CONCURRENCY", default=100, cast=int)
+EXECUTOR_CLIENT_REFRESH_INTERVAL = config("EXECUTOR_CLIENT_REFRESH_INTERVAL", default=60, cast=int)
+
+# Futures margin type / leverage pre-configuration (see apps.trade.utils.account_config)
+FUTURES_PRECONFIGURE_SYMBOLS = config("FUTURES_PRECONFIGURE_SYMBOLS", default="", cast=Csv())
+FUTURES_PRECONFIGURE_LOOKBACK_DAYS = config("FUTURES_PRECONFIGURE_LOOKBACK_DAYS", default=7, cast=int)
+
+# Webhook de-duplication window in seconds, 0 disables (see apps.trade.utils.dedup)
+SIGNAL_DEDUP_WINDOW = config("SIGNAL_DEDUP_WINDOW", default=15, cast=int)
+
+# Futures reconciliation cron (see apps.trade.crons.refresh_stop_loss)
+RECONCILE_MAX_WORKERS = config("RECONCILE_MAX_WORKERS", default=8, cast=int)
+RECONCILE_PER_KEY_CONCURRENCY = config("RECONCILE_PER_KEY_CONCURRENCY", default=1, cast=int)
+RECONCILE_DEADLINE = config("RECONCILE_DEADLINE", default=240, cast=int)
+RECONCILE_WEIGHT_LIMIT = config("RECONCILE_WEIGHT_LIMIT", default=2400, cast=int)
+RECONCILE_WEIGHT_HEADROOM = config("RECONCILE_WEIGHT_HEADROOM", default=0.8, cast=float)
+
+# Binance user data streams (see apps.trade.utils.user_stream)
+USER_STREAM_KEEPALIVE_INTERVAL = config("USER_STREAM_KEEPALIVE_INTERVAL", default=30 * 60, cast=int)
+USER_STREAM_REFRESH_INTERVAL = config("USER_STREAM_REFRESH_INTERVAL", default=60, cast=int)
+USER_STREAM_HEARTBEAT_INTERVAL = config("USER_STREAM_HEARTBEAT_INTERVAL", default=15, cast=int)
+
+# Shared Binance request budget (see apps.trade.utils.rate_limit)
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_HEADROOM = config("RATE_LIMIT_HEADROOM", default=0.8, cast=float)
+RATE_LIMIT_MAX_WAIT = config("RATE_LIMIT_MAX_WAIT", default=10.0, cast=float)
+RATE_LIMIT_LOW_PRIORITY_RESERVE = config("RATE_LIMIT_LOW_PRIORITY_RESERVE", default=0.3, cast=float)
+
+# Seconds decrypted API credentials stay in process memory (see apps.accounts.utils.credentials)
+CREDENTIAL_CACHE_TTL = config("CREDENTIAL_CACHE_TTL", default=300, cast=int)
+
+# Rows per page of the trade history (see apps.trade.utils.history)
+HISTORY_PAGE_SIZE = config("HISTORY_PAGE_SIZE", default=100, cast=int)
+
+# Seconds a computed stats page stays cached, 0 disables it (see apps.trade.utils.stats_cache).
+# Invalidation happens in whichever process saved the order, so caching is
+# only on by default when the cache is the shared Redis one.
+STATS_CACHE_TTL = config("STATS_CACHE_TTL", default=60 * 60 if REDIS_URL else 0, cast=int)
+
+# Monthly order-table partitions kept created ahead of time (see apps.trade.utils.partitions)
+PARTITION_MONTHS_AHEAD = config("PARTITION_MONTHS_AHEAD", default=3, cast=int)
+
+# Closed/cancelled orders older than this move to Parquet files in default storage (see apps.trade.utils.archive)
+ORDER_ARCHIVE_AFTER_DAYS = config("ORDER_ARCHIVE_AFTER_DAYS", default=365, cast=int)
+ORDER_ARCHIVE_PREFIX = config("ORDER_ARCHIVE_PREFIX", default="order-archive")
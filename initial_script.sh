@@ -9,4 +9,16 @@ python manage.py crontab add
 # Start Celery worker in the background
 # celery -A config worker -l info -P gevent -c 500 
 
-gunicorn config.wsgi:application -b 0.0.0.0:80 --workers 3
\ No newline at end of file
+# Stream prices for active symbols into the shared cache
+# python manage.py run_market_data &
+
+# Apply SL/TP fills from the Binance user data streams as they happen
+# python manage.py run_user_streams &
+
+# Execute futures signals for all users from one asyncio process
+# (requires SIGNAL_EXECUTION_MODE=executor)
+# python manage.py run_executor &
+
+# ASGI workers serve the async webhook on the event loop, so alert bursts
+# do not queue behind dashboard requests
+gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker -b 0.0.0.0:80 --workers 3
\ No newline at end of file